@@ -1,26 +1,92 @@
 # app.py
-from  flask import Flask, render_template, request, send_file, url_for, jsonify
+from  flask import Flask, render_template, request, send_file, url_for, jsonify, Response, stream_with_context
 import os
-import shutil
-from src.tarifas_processor import TarifasElectricasProcessor
+import time
+import uuid
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from utils.csv_to_json_converter import CSVToJSONConverter
+from src.worker import Trabajador, AUTO
+from utils.progreso import ETAPAS_FINALES, formatear_sse
+from utils.zip_stream import ZipEnStreaming
+from utils.comparativo import ComparativoTarifas
+from utils.almacenamiento import AlmacenArtefactos
+from utils.enrutador_modelos import obtener_enrutador
+from utils.circuito import obtener_circuito
+from utils.registro_instrucciones import obtener_registro
+from utils.cola_trabajos import obtener_cola
+from config.config import ALMACENAMIENTO_CONFIG, COLA_CONFIG, PERFILADO_CONFIG
 
 # Cargar variables de entorno
 load_dotenv(os.path.join('private', '.env'))
 API_KEY = os.getenv('ANTHROPIC_API_KEY')
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['UPLOAD_FOLDER'] = ALMACENAMIENTO_CONFIG['directorio']
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-COMERCIALIZADORES = ["VATIA", "ENELX", "QI", "ENERTOTAL", "NEU", "ENERBIT"]
+# Configuración e instrucciones de los comercializadores, validadas al arrancar
+registro_instrucciones = obtener_registro()
+
+comparativo = ComparativoTarifas()
+almacen = AlmacenArtefactos(app.config['UPLOAD_FOLDER'])
+
+# La aplicación solo encola; el procesamiento lo hacen los workers de la
+# cola, ya sea en este proceso o en otros (python -m src.worker)
+cola = obtener_cola()
+trabajadores = []
+
+def iniciar():
+    """
+    Arranca el barrido del almacén y los workers locales. Solo debe llamarlo
+    el proceso que sirve la aplicación: importar este módulo no consume la
+    cola (benchmarks, pruebas, proceso vigilante del recargador de Flask).
+    """
+    if trabajadores:
+        return
+    almacen.iniciar_limpieza()
+    for i in range(COLA_CONFIG["trabajadores_locales"]):
+        trabajador = Trabajador(cola, almacen, API_KEY, f"web-{os.getpid()}-{i}", comparativo)
+        trabajador.iniciar()
+        trabajadores.append(trabajador)
 
 @app.route('/')
 def index():
-    return render_template('index.html', comercializadores=COMERCIALIZADORES)
+    return render_template('index.html', comercializadores=registro_instrucciones.codigos(), auto=AUTO)
+
+def pide_perfil():
+    """La petición pide perfilar sus trabajos (cabecera X-Perfilar: 1 o ?perfilar=1)"""
+    pedido = request.headers.get('X-Perfilar', request.args.get('perfilar', '0'))
+    return PERFILADO_CONFIG["permitido"] and pedido.lower() in ('1', 'true', 'si')
+
+def encolar_archivo(job_id, archivo, comercializador, perfilar=False):
+    """Guarda un archivo subido en el almacén y encola su procesamiento"""
+    original_name = secure_filename(archivo.filename)
+    original_path, hash_archivo = almacen.guardar_subida(job_id, original_name, archivo.stream)
+    # Desde aquí el trabajo lo protege el worker que lo reserve
+    almacen.soltar_trabajo(job_id)
+    cola.encolar(job_id, {
+        "original_path": original_path,
+        "original_name": original_name,
+        "comercializador": comercializador,
+        "hash_archivo": hash_archivo,
+        "perfilar": perfilar
+    })
+    return original_name
+
+def con_urls(job_id, evento):
+    """Agrega las URLs de descarga al evento final que emiten los workers"""
+    if evento and evento["etapa"] == "completado":
+        evento = dict(evento,
+                      csv_url=url_for('download_csv', job_id=job_id, filename=evento["csv"]),
+                      json_url=url_for('download_json', job_id=job_id, filename=evento["json"]))
+        if evento.get("perfil"):
+            evento.update(perfil_url=url_for('download_perfil', job_id=job_id, filename=evento["perfil"]))
+        # Sin perfil de CPU (otro trabajo se estaba perfilando) solo hay informe
+        if evento.get("perfil_binario"):
+            evento.update(perfil_binario_url=url_for('download_perfil', job_id=job_id,
+                                                     filename=evento["perfil_binario"]))
+    return evento
 
 @app.route('/procesar', methods=['POST'])
 def procesar():
@@ -29,69 +95,219 @@ def procesar():
 
     if not archivo or archivo.filename == '':
         return 'No se seleccionó ningún archivo', 400
-    if not comercializador:
-        return 'No se seleccionó ningún comercializador', 400
+    comercializador = comercializador or AUTO
 
-    original_name = secure_filename(archivo.filename)
-    original_path = os.path.join(app.config['UPLOAD_FOLDER'], original_name)
-    archivo.save(original_path)
-
-    try:
-        processor = TarifasElectricasProcessor(api_key=API_KEY)
-        # 1) Procesar CSV u otros formatos
-        if original_name.lower().endswith('.csv'):
-            csv_path = processor.procesar_csv(original_path, comercializador)
-        else:
-            csv_path, _ = processor.procesar_archivo(original_path, comercializador)
-
-        # Validar salida CSV
-        if not csv_path or not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
-            return "El archivo CSV de salida no se generó correctamente", 500
-
-        # 2) Convertir ese CSV procesado a JSON
-        converter = CSVToJSONConverter()
-        json_path = converter.convertir_csv_a_json(csv_path)
-        if not json_path or not os.path.exists(json_path):
-            return "Error al generar el archivo JSON", 500
-
-        # 3) Mover ambos archivos a UPLOAD_FOLDER para que download_xxx los encuentre
-        csv_name = secure_filename(os.path.basename(csv_path))
-        target_csv = os.path.join(app.config['UPLOAD_FOLDER'], csv_name)
-        if csv_path != target_csv:
-            shutil.move(csv_path, target_csv)
-
-        json_name = secure_filename(os.path.basename(json_path))
-        target_json = os.path.join(app.config['UPLOAD_FOLDER'], json_name)
-        if json_path != target_json:
-            shutil.move(json_path, target_json)
-
-        # 4) Devolver URLs en JSON
-        return jsonify({
-            'csv_url': url_for('download_csv', filename=csv_name),
-            'json_url': url_for('download_json', filename=json_name)
-        })
-
-    except Exception as e:
-        return f'Error al procesar el archivo: {str(e)}', 500
-
-    finally:
-        # Sólo eliminamos el archivo original subido
-        if os.path.exists(original_path):
-            os.remove(original_path)
-
-@app.route('/download/csv/<filename>')
-def download_csv(filename):
-    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if not os.path.exists(path):
-        return 'Archivo no encontrado', 404
-    return send_file(path, as_attachment=True, download_name=filename, mimetype='text/csv')
+    # El procesamiento corre en un worker; el cliente sigue el avance
+    # por /progreso/<job_id> en lugar de mantener abierta esta petición
+    job_id = uuid.uuid4().hex
+    encolar_archivo(job_id, archivo, comercializador, pide_perfil())
+
+    return jsonify({
+        'job_id': job_id,
+        'progreso_url': url_for('progreso_trabajo', job_id=job_id),
+        'estado_url': url_for('estado_trabajo', job_id=job_id)
+    }), 202
+
+@app.route('/procesar_lote', methods=['POST'])
+def procesar_lote():
+    """
+    Procesa varios archivos en paralelo y devuelve un ZIP con los CSV y JSON
+    generados, construido a medida que terminan. El archivo estado.json del
+    ZIP indica el resultado de cada archivo.
+    """
+    archivos = [a for a in request.files.getlist('archivos') if a and a.filename]
+    if not archivos:
+        return 'No se seleccionó ningún archivo', 400
+
+    # Un comercializador por archivo (en el mismo orden) o uno común para todos;
+    # si falta o es AUTO se detecta a partir del contenido de cada archivo
+    comercializadores = request.form.getlist('comercializadores')
+    comercializador_comun = request.form.get('comercializador') or AUTO
+
+    lote_id = uuid.uuid4().hex
+    perfilar = pide_perfil()
+    tareas = {}
+    for i, archivo in enumerate(archivos):
+        # Cada archivo es un trabajo con su propio directorio, así que los
+        # nombres repetidos no colisionan; los workers los procesan en paralelo
+        tarea_id = f"{lote_id}_{i}"
+        comercializador = comercializadores[i] if i < len(comercializadores) and comercializadores[i] else comercializador_comun
+        original_name = encolar_archivo(tarea_id, archivo, comercializador, perfilar)
+        tareas[tarea_id] = (i, original_name, comercializador)
+
+    def generar():
+        zip_stream = ZipEnStreaming()
+        estados = []
+        pendientes = dict(tareas)
+        try:
+            while pendientes:
+                terminados = []
+                for tarea_id in pendientes:
+                    final = [e for e in cola.eventos(tarea_id) if e["etapa"] in ETAPAS_FINALES]
+                    if final:
+                        terminados.append((tarea_id, final[-1]))
+                if not terminados:
+                    time.sleep(COLA_CONFIG["sondeo"])
+                    continue
+
+                for tarea_id, evento in terminados:
+                    i, original_name, comercializador = pendientes.pop(tarea_id)
+                    base_name = os.path.splitext(original_name)[0]
+                    estado = {"archivo": original_name, "comercializador": evento.get("comercializador", comercializador)}
+                    try:
+                        if evento["etapa"] != "completado":
+                            raise ValueError(evento.get("mensaje", "Error al procesar el archivo"))
+                        # El prefijo con el índice evita colisiones entre archivos con el mismo nombre
+                        perfiles = [evento[c] for c in ("perfil", "perfil_binario") if evento.get(c)]
+                        for nombre_archivo in (evento["csv"], evento["json"], *perfiles):
+                            ruta, _ = almacen.resolver(tarea_id, nombre_archivo)
+                            yield zip_stream.agregar_archivo(ruta, f"{i + 1:02d}_{base_name}/{nombre_archivo}")
+                        estado["estado"] = "ok"
+                    except Exception as e:
+                        estado.update(estado="error", mensaje=str(e))
+                    finally:
+                        # Los resultados ya van en el ZIP; no hace falta conservarlos
+                        almacen.eliminar_trabajo(tarea_id)
+                    estados.append(estado)
+
+            estados.sort(key=lambda e: e["archivo"])
+            yield zip_stream.agregar_json("estado.json", {"lote_id": lote_id, "archivos": estados})
+            yield zip_stream.cerrar()
+        finally:
+            # Si el cliente se desconecta, los archivos que ningún worker tomó no se procesan
+            for tarea_id in pendientes:
+                if cola.cancelar(tarea_id):
+                    almacen.eliminar_trabajo(tarea_id)
+
+    return Response(
+        stream_with_context(generar()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename=resultados_{lote_id[:8]}.zip'}
+    )
 
-@app.route('/download/json/<filename>')
-def download_json(filename):
-    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if not os.path.exists(path):
+@app.route('/progreso/<job_id>')
+def progreso_trabajo(job_id):
+    """Canal de Server-Sent Events con el avance de un trabajo"""
+    if not cola.existe(job_id):
+        return 'Trabajo no encontrado', 404
+    progreso = cola.canal(job_id)
+
+    # Permite reanudar desde el último evento recibido tras una reconexión
+    desde = request.headers.get('Last-Event-ID', request.args.get('desde', '0'))
+    desde = int(desde) if str(desde).isdigit() else 0
+
+    def generar():
+        for evento in progreso.suscribir(desde=desde):
+            yield formatear_sse(con_urls(job_id, evento))
+
+    return Response(
+        stream_with_context(generar()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/estado/<job_id>')
+def estado_trabajo(job_id):
+    """Último evento de un trabajo, para clientes sin soporte de SSE"""
+    if not cola.existe(job_id):
+        return 'Trabajo no encontrado', 404
+    progreso = cola.canal(job_id)
+    return jsonify({'job_id': job_id, 'terminado': progreso.terminado, 'ultimo': con_urls(job_id, progreso.ultimo)})
+
+@app.route('/cola/resumen')
+def resumen_cola():
+    """Trabajos de la cola compartida por estado"""
+    return jsonify(cola.resumen())
+
+@app.route('/comparativo')
+def ver_comparativo():
+    """Tabla mercado × nivel × comercializador con el CU + COT, filtrable por mercado y nivel"""
+    filas = comparativo.como_filas(request.args.get('mercado'), request.args.get('nivel'))
+    return jsonify({'filas': filas})
+
+@app.route('/comparativo/mas_barato')
+def comparativo_mas_barato():
+    mercado = request.args.get('mercado')
+    if not mercado:
+        return 'Debe indicar el mercado', 400
+    resultado = comparativo.mas_barato(mercado, request.args.get('nivel'))
+    if not resultado:
+        return 'No hay tarifas para ese mercado', 404
+    return jsonify(resultado)
+
+@app.route('/comparativo/exportar')
+def exportar_comparativo():
+    return Response(
+        comparativo.exportar_csv(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=comparativo.csv'}
+    )
+
+@app.route('/modelos/estadisticas')
+def estadisticas_modelos():
+    """Tasa de éxito y latencias por modelo, para ajustar los umbrales del enrutamiento"""
+    return jsonify(obtener_enrutador().estadisticas.resumen())
+
+@app.route('/comercializadores')
+def ver_comercializadores():
+    """Versión de instrucciones y problemas de validación de cada comercializador"""
+    return jsonify(registro_instrucciones.resumen())
+
+@app.route('/circuito')
+def estado_circuito():
+    """Estado del cortacircuitos de Claude de los workers de este proceso"""
+    return jsonify(obtener_circuito().resumen())
+
+def enviar_resultado(job_id, filename, mimetype):
+    """
+    Envía un resultado del almacén con la variante precomprimida que acepte
+    el cliente (brotli o gzip), ETag derivado del hash del contenido y
+    soporte de peticiones condicionales y por rangos.
+    """
+    resultado = almacen.resolver(job_id, filename)
+    if not resultado:
         return 'Archivo no encontrado', 404
-    return send_file(path, as_attachment=True, download_name=filename, mimetype='application/json')
+    ruta, entrada = resultado
+
+    # Los rangos se sirven sobre el archivo sin comprimir
+    codificacion = None
+    if not request.range:
+        variantes = almacen.variantes(entrada["hash"])
+        for candidata in ("br", "gzip"):
+            if candidata in variantes and request.accept_encodings[candidata]:
+                codificacion, ruta = candidata, variantes[candidata]
+                break
+
+    response = send_file(
+        ruta, mimetype=mimetype, as_attachment=True, download_name=filename,
+        etag=f"{entrada['hash']}-{codificacion}" if codificacion else entrada["hash"],
+        last_modified=entrada.get("publicado"), conditional=True
+    )
+    if codificacion:
+        response.headers['Content-Encoding'] = codificacion
+    response.vary.add('Accept-Encoding')
+    # El contenido de una URL de descarga nunca cambia
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    response.cache_control.max_age = 86400
+    return response
+
+@app.route('/download/csv/<job_id>/<filename>')
+def download_csv(job_id, filename):
+    return enviar_resultado(job_id, filename, 'text/csv')
+
+@app.route('/download/json/<job_id>/<filename>')
+def download_json(job_id, filename):
+    return enviar_resultado(job_id, filename, 'application/json')
+
+@app.route('/download/perfil/<job_id>/<filename>')
+def download_perfil(job_id, filename):
+    mimetype = 'text/plain' if filename.endswith('.txt') else 'application/octet-stream'
+    return enviar_resultado(job_id, filename, mimetype)
 
 if __name__ == '__main__':
+    # Con debug, el recargador vigila los archivos en un proceso padre y sirve
+    # desde un hijo (WERKZEUG_RUN_MAIN); solo el hijo arranca los workers
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar()
     app.run(debug=True)
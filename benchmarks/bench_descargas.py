@@ -0,0 +1,93 @@
+"""
+Mide los bytes transferidos por las rutas de descarga de resultados.
+
+Uso:
+    python benchmarks/bench_descargas.py [--filas N] [--descargas N]
+
+Publica un CSV sintético y su JSON en un almacén temporal y los descarga con
+el cliente de pruebas de Flask: sin compresión, con gzip, con brotli (si
+está instalado), de forma condicional con If-None-Match y por rangos. Al
+final compara N descargas repetidas de un tablero con y sin caché.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+# El almacén y la cola temporales deben configurarse antes de importar la aplicación
+directorio_temporal = tempfile.mkdtemp(prefix="bench_descargas_")
+os.environ["ALMACENAMIENTO_DIR"] = os.path.join(directorio_temporal, "uploads")
+os.environ["COLA_RUTA"] = os.path.join(directorio_temporal, "cola.sqlite")
+
+import app as aplicacion
+from utils.csv_to_json_converter import CSVToJSONConverter
+
+ENCABEZADO = "Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT"
+
+def generar_csv(ruta, filas):
+    mercados = ["BOGOTA", "ANTIOQUIA", "CALDAS", "NORTE SANTANDER", "NARIÑO", "META"]
+    niveles = ["1 OR", "1 Comp", "1 US", "2", "3"]
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(ENCABEZADO + "\n")
+        for i in range(filas):
+            valores = [round(random.uniform(10, 400), 4) for _ in range(7)]
+            cu = round(sum(valores) - valores[4], 4)
+            f.write(f"ENELX,{mercados[i % len(mercados)]},{niveles[i % len(niveles)]},"
+                    + ",".join(str(v) for v in valores) + f",{cu},{round(cu + valores[4], 4)}\n")
+
+def medir(cliente, url, **headers):
+    response = cliente.get(url, headers=headers)
+    return response.status_code, len(response.data), response.headers
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=20000)
+    parser.add_argument("--descargas", type=int, default=20)
+    args = parser.parse_args()
+
+    almacen = aplicacion.almacen
+    job_id = "bench"
+    directorio = almacen.crear_trabajo(job_id)
+    csv_path = os.path.join(directorio, "tarifas.csv")
+    generar_csv(csv_path, args.filas)
+    json_path = CSVToJSONConverter().convertir_csv_a_json(csv_path)
+    csv_name = almacen.publicar(job_id, csv_path)
+    json_name = almacen.publicar(job_id, json_path)
+    almacen.finalizar_trabajo(job_id)
+
+    cliente = aplicacion.app.test_client()
+    print(f"\n{'Petición':<34}{'Estado':>7}{'Bytes':>12}")
+    for tipo, nombre in (("csv", csv_name), ("json", json_name)):
+        url = f"/download/{tipo}/{job_id}/{nombre}"
+        estado, completo, headers = medir(cliente, url)
+        etag = headers["ETag"]
+        print(f"{tipo + ' sin compresión':<34}{estado:>7}{completo:>12}")
+        for codificacion in ("gzip", "br"):
+            estado, bytes_, headers = medir(cliente, url, **{"Accept-Encoding": codificacion})
+            if headers.get("Content-Encoding") == codificacion:
+                print(f"{tipo + ' ' + codificacion:<34}{estado:>7}{bytes_:>12}  ({100 * bytes_ / completo:.1f}%)")
+            else:
+                print(f"{tipo + ' ' + codificacion:<34}{'-':>7}{'-':>12}  (variante no disponible)")
+        estado, bytes_, _ = medir(cliente, url, **{"If-None-Match": etag})
+        print(f"{tipo + ' If-None-Match':<34}{estado:>7}{bytes_:>12}")
+        estado, bytes_, _ = medir(cliente, url, Range="bytes=0-4095")
+        print(f"{tipo + ' Range 0-4095':<34}{estado:>7}{bytes_:>12}")
+
+    # Un tablero que consulta el JSON repetidamente
+    url = f"/download/json/{job_id}/{json_name}"
+    sin_cache = args.descargas * medir(cliente, url)[1]
+    estado, primera, headers = medir(cliente, url, **{"Accept-Encoding": "br, gzip"})
+    con_cache = primera + sum(
+        medir(cliente, url, **{"Accept-Encoding": "br, gzip", "If-None-Match": headers["ETag"]})[1]
+        for _ in range(args.descargas - 1)
+    )
+    print(f"\n{args.descargas} descargas del JSON: {sin_cache} bytes sin caché, "
+          f"{con_cache} bytes con compresión y ETag ({100 * con_cache / sin_cache:.2f}%)")
+
+if __name__ == "__main__":
+    main()
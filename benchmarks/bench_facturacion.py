@@ -0,0 +1,122 @@
+"""
+Mide el cálculo vectorizado de facturas (utils/facturacion.py) sobre consumos
+sintéticos.
+
+Uso:
+    python benchmarks/bench_facturacion.py [--filas 10000000] [--bloque 1000000] [--muestra-base 1000000]
+
+Genera tarifas para 6 comercializadores en todos los mercados y niveles de
+config/example_json.py (con celdas faltantes) y N consumos con mercado,
+nivel, comercializador actual y kWh. Mide la codificación de etiquetas, la
+facturación con el comercializador actual y la búsqueda del más barato por
+cliente. Como referencia, hace el mismo cálculo con un merge de pandas sobre
+una muestra (la forma manual de cruzar los CSV), comprueba que coinciden y
+extrapola su tiempo a N filas.
+"""
+import argparse
+import resource
+import sys
+import time
+from pathlib import Path
+
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+import numpy as np
+import pandas as pd
+from config.example_json import MERCADOS, NIVELES_TENSION
+from utils.facturacion import MatrizTarifas, COMPONENTES, TOTAL
+
+COMERCIALIZADORES = ["VATIA", "ENELX", "QI", "ENERTOTAL", "NEU", "ENERBIT"]
+
+def generar_tarifas(rng, faltantes=0.15):
+    filas = []
+    for comercializador in COMERCIALIZADORES:
+        for mercado in MERCADOS:
+            for nivel in NIVELES_TENSION:
+                if rng.random() < faltantes:
+                    continue
+                valores = dict(zip(["G", "T", "D", "C", "COT", "P", "R"], rng.uniform(10, 400, 7).round(4)))
+                valores["CU"] = round(sum(v for c, v in valores.items() if c != "COT"), 4)
+                valores[TOTAL] = round(valores["CU"] + valores["COT"], 4)
+                filas.append({"Comercializador": comercializador, "Mercado": mercado,
+                              "Nivel de Tensión": nivel, **valores})
+    return pd.DataFrame(filas, columns=["Comercializador", "Mercado", "Nivel de Tensión"] + COMPONENTES)
+
+def cronometrar(nombre, funcion, filas):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<48}{segundos:>9.2f} s{filas / segundos / 1e6:>10.1f} M filas/s")
+    return resultado, segundos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10_000_000)
+    parser.add_argument("--bloque", type=int, default=1_000_000)
+    parser.add_argument("--muestra-base", type=int, default=1_000_000,
+                        help="Filas de la muestra calculada con merge de pandas")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    tarifas = generar_tarifas(rng)
+    matriz = MatrizTarifas.desde_df(tarifas)
+    print(f"Matriz de tarifas: {matriz.valores.shape} ({matriz.valores.nbytes} bytes), "
+          f"{len(tarifas)} celdas publicadas")
+
+    n = args.filas
+    mercados = rng.integers(0, len(matriz.mercados), n, dtype=np.int32)
+    niveles = rng.integers(0, len(matriz.niveles), n, dtype=np.int32)
+    actual = rng.integers(0, len(matriz.comercializadores), n, dtype=np.int32)
+    consumo = rng.gamma(2.0, 90.0, n)
+    print(f"{n} consumos sintéticos\n")
+    print(f"{'Operación':<48}{'Tiempo':>11}{'Rendimiento':>18}")
+
+    # Codificación de etiquetas de texto, sobre la muestra
+    m = min(args.muestra_base, n)
+    etiquetas = np.array(matriz.mercados, dtype=object)[mercados[:m]]
+    cronometrar(f"codificar mercados ({m} etiquetas)", lambda: matriz.codificar_mercados(etiquetas), m)
+
+    costos, _ = cronometrar("facturar con el comercializador actual",
+                            lambda: matriz.facturar(consumo, mercados, niveles, actual, tamano_bloque=args.bloque), n)
+    desglose, _ = cronometrar("facturar desglose de los 9 componentes",
+                              lambda: matriz.facturar(consumo, mercados, niveles, actual, COMPONENTES,
+                                                      tamano_bloque=args.bloque), n)
+    comparacion, _ = cronometrar("más barato por cliente y ahorro",
+                                 lambda: matriz.mas_barato(consumo, mercados, niveles, actual,
+                                                           tamano_bloque=args.bloque), n)
+
+    # Referencia: cruzar consumos y tarifas con merge de pandas, como se hace hoy a mano
+    # (con las etiquetas normalizadas igual que en la matriz)
+    tarifas["Nivel de Tensión"] = tarifas["Nivel de Tensión"].str.upper()
+
+    def con_merge():
+        clientes = pd.DataFrame({
+            "Comercializador": np.array(matriz.comercializadores)[actual[:m]],
+            "Mercado": np.array(matriz.mercados)[mercados[:m]],
+            "Nivel de Tensión": np.array(matriz.niveles)[niveles[:m]],
+            "kwh": consumo[:m],
+        })
+        cruce = clientes.merge(tarifas, on=["Comercializador", "Mercado", "Nivel de Tensión"], how="left")
+        costo_actual = cruce[TOTAL].to_numpy() * cruce["kwh"].to_numpy()
+        ofertas = clientes.reset_index().merge(tarifas[["Comercializador", "Mercado", "Nivel de Tensión", TOTAL]]
+                                               .rename(columns={"Comercializador": "oferta"}),
+                                               on=["Mercado", "Nivel de Tensión"])
+        minima = ofertas.groupby("index")[TOTAL].min().reindex(range(m)).to_numpy() * consumo[:m]
+        return costo_actual, minima
+
+    (base_actual, base_minima), segundos = cronometrar(f"referencia con merge de pandas ({m} filas)", con_merge, m)
+    print(f"{'  extrapolado a ' + str(n) + ' filas':<48}{segundos * n / m:>9.2f} s")
+
+    assert np.allclose(costos[:m, 0], base_actual, equal_nan=True)
+    assert np.allclose(comparacion.costo[:m], base_minima, equal_nan=True)
+    # CU = G + T + D + C + P + R en las tarifas sintéticas
+    assert np.allclose(desglose[:m, [0, 1, 2, 3, 5, 6]].sum(axis=1), desglose[:m, 7], rtol=1e-6, equal_nan=True)
+
+    cambian = np.nansum(comparacion.ahorro > 0)
+    print(f"\nClientes que ahorrarían cambiándose: {cambian} ({100 * cambian / n:.1f}%), "
+          f"ahorro total {np.nansum(comparacion.ahorro):,.0f}")
+    print(f"Memoria máxima del proceso: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+if __name__ == "__main__":
+    main()
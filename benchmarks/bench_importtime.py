@@ -0,0 +1,93 @@
+"""
+Benchmark del tiempo de importación en frío de los puntos de entrada.
+
+Uso:
+    python benchmarks/bench_importtime.py [modulo ...] [--repeticiones N] [--top N] [--max-ms MS]
+
+Importa cada módulo en un intérprete nuevo con `python -X importtime` y
+muestra el tiempo acumulado, los módulos más costosos y qué dependencias
+pesadas (OCR, PDF, tokenizador, pandas, SDK de Anthropic) se cargaron sin
+necesidad. Con --max-ms termina con código 1 si algún módulo supera el límite.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+root_dir = str(Path(__file__).parent.parent)
+
+MODULOS = ["src.tarifas_processor", "app", "src.main"]
+
+# Dependencias que solo deben cargarse en el primer uso
+PESADAS = ["pandas", "numpy", "cv2", "pytesseract", "fitz", "pdfplumber", "anthropic"]
+
+def importar(modulo):
+    """Importa un módulo en un proceso nuevo y devuelve {módulo: (propio, acumulado)} en µs"""
+    codigo = f"import {modulo}" if modulo else "pass"
+    # Importar la aplicación crea la cola y el almacén: que no toquen los reales
+    with tempfile.TemporaryDirectory(prefix="bench_importtime_") as directorio:
+        entorno = dict(os.environ, COLA_RUTA=os.path.join(directorio, "cola.sqlite"),
+                       ALMACENAMIENTO_DIR=os.path.join(directorio, "uploads"))
+        resultado = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", codigo],
+            cwd=root_dir, capture_output=True, text=True, env=entorno
+        )
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.strip().splitlines()[-1])
+
+    tiempos = {}
+    for linea in resultado.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        tiempos[nombre.strip()] = (int(propio), int(acumulado))
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modulos", nargs="*", default=MODULOS)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--max-ms", type=float)
+    args = parser.parse_args()
+
+    # Lo que el intérprete importa al arrancar (site, .pth...) no cuenta
+    arranque = set(importar(None))
+    excedidos = []
+    for modulo in args.modulos:
+        try:
+            mediciones = [importar(modulo) for _ in range(args.repeticiones)]
+        except RuntimeError as e:
+            print(f"{modulo:<24} error: {e}\n")
+            continue
+
+        mediana = statistics.median(m[modulo][1] for m in mediciones) / 1000
+        ultima = mediciones[-1]
+        print(f"{modulo:<24} {mediana:8.1f} ms (mediana de {args.repeticiones})")
+
+        # Solo los módulos de primer nivel, para no contar dos veces los subpaquetes
+        raices = {}
+        for nombre, (_, acumulado) in ultima.items():
+            raiz = nombre.lstrip().split(".")[0]
+            if nombre == raiz and raiz != modulo.split(".")[0] and nombre not in arranque:
+                raices[raiz] = max(raices.get(raiz, 0), acumulado)
+        for nombre, acumulado in sorted(raices.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"    {nombre:<20} {acumulado / 1000:8.1f} ms")
+
+        cargadas = [p for p in PESADAS if p in ultima]
+        if cargadas:
+            print(f"    cargadas al importar: {', '.join(cargadas)}")
+        print()
+
+        if args.max_ms is not None and mediana > args.max_ms:
+            excedidos.append(modulo)
+
+    if excedidos:
+        print(f"Superan {args.max_ms} ms: {', '.join(excedidos)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Mide la normalización local de salidas (utils/normalizacion.py) sobre filas
+sintéticas.
+
+Uso:
+    python benchmarks/bench_normalizacion.py [--filas 500000] [--locales 0.05]
+
+Genera N filas con el formato de 12 columnas usando las etiquetas tal como
+las publican los comercializadores (mercado_mapping y tension_mapping, con
+y sin tildes, en minúsculas) y una fracción de componentes con formato local
+("1.234,56", "$ 812,3"). Mide normalizar_df completo y, como referencia, la
+misma normalización con apply fila por fila sobre una muestra.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+import numpy as np
+import pandas as pd
+from config.comercializadores import COMERCIALIZADORES
+from utils.normalizacion import (normalizar_df, normalizar_comercializador, normalizar_mercado,
+                                 normalizar_nivel, parsear_numero, COLUMNAS_NUMERICAS)
+
+def generar(rng, n, locales):
+    etiquetas = [
+        (info["name"], mercado, nivel)
+        for info in COMERCIALIZADORES.values()
+        for mercado in info.get("mercado_mapping", {})
+        for nivel in info.get("tension_mapping", {})
+    ]
+    # Variantes de escritura de las mismas etiquetas
+    etiquetas += [(c.lower(), m.title(), n.lower()) for c, m, n in etiquetas]
+    elegidas = rng.integers(0, len(etiquetas), n)
+    df = pd.DataFrame(np.array(etiquetas, dtype=object)[elegidas],
+                      columns=["Comercializador", "Mercado", "Nivel de Tensión"])
+    for columna in COLUMNAS_NUMERICAS:
+        valores = rng.uniform(1, 2000, n).round(4)
+        texto = valores.astype(str).astype(object)
+        locales_idx = rng.random(n) < locales
+        texto[locales_idx] = [f"{v:,.4f}".replace(",", "_").replace(".", ",").replace("_", ".")
+                              for v in valores[locales_idx]]
+        df[columna] = texto
+    return df
+
+def cronometrar(nombre, funcion, filas):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<48}{segundos:>9.2f} s{filas / segundos / 1e3:>10.0f} k filas/s")
+    return resultado, segundos
+
+def fila_por_fila(df):
+    return pd.DataFrame({
+        "Comercializador": df["Comercializador"].apply(normalizar_comercializador),
+        "Mercado": df["Mercado"].apply(normalizar_mercado),
+        "Nivel de Tensión": df["Nivel de Tensión"].apply(normalizar_nivel),
+        **{c: df[c].apply(parsear_numero) for c in COLUMNAS_NUMERICAS}
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=500_000)
+    parser.add_argument("--locales", type=float, default=0.05,
+                        help="Fracción de componentes con formato local")
+    parser.add_argument("--muestra-base", type=int, default=50_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    df = generar(rng, args.filas, args.locales)
+    print(f"{args.filas} filas sintéticas, {df['Mercado'].nunique()} etiquetas de mercado distintas\n")
+    print(f"{'Operación':<48}{'Tiempo':>11}{'Rendimiento':>20}")
+
+    normalizado, _ = cronometrar("normalizar_df", lambda: normalizar_df(df.copy()), args.filas)
+
+    m = min(args.muestra_base, args.filas)
+    muestra = df.head(m)
+    base, segundos = cronometrar(f"referencia con apply fila por fila ({m} filas)", lambda: fila_por_fila(muestra), m)
+    print(f"{'  extrapolado a ' + str(args.filas) + ' filas':<48}{segundos * args.filas / m:>9.2f} s")
+
+    for columna in base.columns:
+        if columna in COLUMNAS_NUMERICAS:
+            assert np.allclose(normalizado[columna].head(m).to_numpy(), base[columna].to_numpy())
+        else:
+            assert (normalizado[columna].head(m).to_numpy() == base[columna].to_numpy()).all()
+    print(f"\nMercados resultantes: {sorted(normalizado['Mercado'].unique())}")
+
+if __name__ == "__main__":
+    main()
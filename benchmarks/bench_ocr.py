@@ -0,0 +1,83 @@
+"""
+Benchmark de los motores de OCR sobre las páginas escaneadas de ejemplo.
+
+Uso:
+    python benchmarks/bench_ocr.py [pdf ...] [--repeticiones N]
+
+Por defecto usa los PDFs de la carpeta pdfs/. Compara pytesseract (un proceso
+por imagen) con el pool persistente de tesserocr, si está instalado.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+import cv2
+import fitz
+import numpy as np
+
+from config.config import OCR_CONFIG, get_tesseract_path
+from utils.image_processor import ImageProcessor, PytesseractBackend, TesserocrPoolBackend
+
+def cargar_imagenes(pdf_paths):
+    """Extrae las imágenes (>100px) de los PDFs tal como lo hace PDFProcessor"""
+    imagenes = []
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as documento:
+            for pagina in documento:
+                for img_info in pagina.get_images(full=True):
+                    datos = documento.extract_image(img_info[0])["image"]
+                    imagen = cv2.imdecode(np.frombuffer(datos, np.uint8), cv2.IMREAD_COLOR)
+                    if imagen is not None and imagen.shape[0] > 100 and imagen.shape[1] > 100:
+                        imagenes.append(imagen)
+    return imagenes
+
+def medir(nombre, processor, imagenes, repeticiones, workers):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(processor.extraer_texto_de_imagen, imagenes))
+    total = time.perf_counter() - inicio
+    n = len(imagenes) * repeticiones
+    print(f"{nombre:<14} {n:>6} imágenes  {total:8.2f}s  {1000 * total / n:8.1f} ms/imagen")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pdfs", nargs="*")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_paths = args.pdfs or sorted(glob.glob(os.path.join(root_dir, "pdfs", "*.pdf")))
+    imagenes = cargar_imagenes(pdf_paths)
+    if not imagenes:
+        print("No se encontraron imágenes para OCR en los PDFs indicados")
+        return
+    print(f"{len(imagenes)} imágenes extraídas de {len(pdf_paths)} PDF(s)\n")
+
+    tesseract_path = get_tesseract_path()
+    if os.path.exists(tesseract_path):
+        backend = PytesseractBackend(tesseract_path)
+        medir("pytesseract", ImageProcessor(tesseract_path, backend), imagenes, args.repeticiones, 1)
+    else:
+        print(f"pytesseract    omitido: no se encontró {tesseract_path}")
+
+    try:
+        pool_size = OCR_CONFIG.get("pool_size", 2)
+        backend = TesserocrPoolBackend(lang=OCR_CONFIG.get("lang", "spa"), pool_size=pool_size,
+                                       tessdata_path=OCR_CONFIG.get("tessdata_path"))
+    except Exception as e:
+        print(f"pool           omitido: {e}")
+        return
+    try:
+        medir("pool", ImageProcessor(backend=backend), imagenes, args.repeticiones, pool_size)
+    finally:
+        backend.cerrar()
+
+if __name__ == "__main__":
+    main()
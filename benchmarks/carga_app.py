@@ -0,0 +1,219 @@
+"""
+Prueba de carga de la aplicación completa contra la Messages API simulada
+(benchmarks/stub_claude.py), sin red ni costo.
+
+Uso:
+    python benchmarks/carga_app.py [--niveles 1,2,4,8,16] [--peticiones 20]
+                                   [--latencia 0.5] [--por-fila 0.005]
+                                   [--tasa-429 0.05] [--tasa-malformadas 0.02]
+                                   [--archivos pdfs/*.pdf] [--json resultados.json]
+
+Levanta el stub y la aplicación (con sus workers locales) en este proceso,
+con la cola, el almacén y el historial en un directorio temporal. Para cada
+nivel de concurrencia N, N clientes en lazo cerrado repiten el recorrido de
+un usuario: POST /procesar, seguir /progreso/<job_id> hasta el evento final y
+descargar el CSV. Informa rendimiento, latencias p50/p95/p99 y tasa de error
+por nivel, y los contadores del stub (429 y respuestas malformadas servidas).
+
+A cada subida se le agrega un sufijo inocuo para que la coalescencia no
+reutilice el resultado de otra; con --repetir-contenido se suben idénticas.
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+sys.path.append(str(Path(__file__).parent))
+
+from stub_claude import crear_servidor
+
+def preparar_entorno(directorio, puerto_stub, trabajadores):
+    """Variables de entorno que deben existir antes de importar la aplicación"""
+    os.environ.update({
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{puerto_stub}",
+        "ANTHROPIC_API_KEY": "stub",
+        "COLA_BACKEND": "sqlite",
+        "COLA_RUTA": os.path.join(directorio, "cola.sqlite"),
+        "ALMACENAMIENTO_DIR": os.path.join(directorio, "uploads"),
+        "TRABAJADORES_LOCALES": str(trabajadores),
+        "REGISTRAR_USO_CLAUDE": "0",
+        "DIFF_HABILITADO": "0",
+    })
+
+def aislar_historial(directorio):
+    """Redirige al directorio temporal los archivos de historial que no dependen del entorno"""
+    from config.config import (CIRCUITO_CONFIG, COALESCENCIA_CONFIG, COMPARATIVO_CONFIG, DIFF_CONFIG,
+                               MODELOS_CONFIG, PRONOSTICO_CONFIG)
+    COMPARATIVO_CONFIG["ruta"] = os.path.join(directorio, "comparativo.json")
+    COALESCENCIA_CONFIG["ruta"] = os.path.join(directorio, "trabajos_en_curso.sqlite")
+    MODELOS_CONFIG["estadisticas"] = os.path.join(directorio, "modelos.json")
+    PRONOSTICO_CONFIG["registro"] = os.path.join(directorio, "uso_claude.jsonl")
+    DIFF_CONFIG["directorio"] = directorio
+    CIRCUITO_CONFIG["registro"] = os.path.join(directorio, "ultimos_resultados.sqlite")
+
+def iniciar_app(puerto):
+    import logging
+    from werkzeug.serving import make_server
+    import app as aplicacion
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    aplicacion.iniciar()
+    servidor = make_server("127.0.0.1", puerto, aplicacion.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+_subidas = itertools.count(1)
+
+def con_sufijo(nombre, contenido):
+    """
+    Contenido equivalente pero con otro hash: un comentario tras %%EOF en
+    los PDF y, en los CSV, un número distinto de líneas vacías al final
+    (pandas las ignora)
+    """
+    if nombre.lower().endswith(".pdf"):
+        return contenido + f"\n% carga {uuid.uuid4().hex}\n".encode()
+    return contenido.rstrip(b"\r\n") + b"\n" * (next(_subidas) + 1)
+
+def multipart(campos, nombre, contenido):
+    limite = uuid.uuid4().hex
+    partes = [f'--{limite}\r\nContent-Disposition: form-data; name="{clave}"\r\n\r\n{valor}\r\n'.encode()
+              for clave, valor in campos.items()]
+    partes.append(f'--{limite}\r\nContent-Disposition: form-data; name="archivo"; filename="{nombre}"\r\n'
+                  f'Content-Type: application/octet-stream\r\n\r\n'.encode() + contenido + b"\r\n")
+    partes.append(f"--{limite}--\r\n".encode())
+    return b"".join(partes), f"multipart/form-data; boundary={limite}"
+
+def seguir_progreso(base, ruta, timeout):
+    """Lee el canal SSE hasta el evento final y lo devuelve"""
+    with urllib.request.urlopen(base + ruta, timeout=timeout) as respuesta:
+        ultimo = None
+        for linea in respuesta:
+            linea = linea.decode("utf-8").strip()
+            if linea.startswith("data:"):
+                ultimo = json.loads(linea[5:])
+                if ultimo.get("etapa") in ("completado", "error"):
+                    return ultimo
+        return ultimo
+
+def recorrido(base, archivo, comercializador, repetir_contenido, timeout):
+    """Un usuario: subir, seguir el progreso y descargar el CSV. Devuelve (segundos, error)"""
+    nombre, contenido = archivo
+    if not repetir_contenido:
+        contenido = con_sufijo(nombre, contenido)
+    cuerpo, tipo = multipart({"comercializador": comercializador}, nombre, contenido)
+    inicio = time.perf_counter()
+    try:
+        peticion = urllib.request.Request(base + "/procesar", data=cuerpo, headers={"Content-Type": tipo})
+        with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+            trabajo = json.loads(respuesta.read())
+        final = seguir_progreso(base, trabajo["progreso_url"], timeout)
+        if not final or final.get("etapa") != "completado":
+            return time.perf_counter() - inicio, (final or {}).get("mensaje", "sin evento final")
+        with urllib.request.urlopen(base + final["csv_url"], timeout=timeout) as respuesta:
+            respuesta.read()
+        return time.perf_counter() - inicio, None
+    except Exception as e:
+        return time.perf_counter() - inicio, f"{type(e).__name__}: {e}"
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def medir_nivel(base, archivos, concurrencia, peticiones, args):
+    """N clientes en lazo cerrado hasta completar el número de recorridos pedido"""
+    tareas = [archivos[i % len(archivos)] for i in range(peticiones)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        resultados = list(pool.map(
+            lambda archivo: recorrido(base, archivo, args.comercializador, args.repetir_contenido, args.timeout),
+            tareas))
+    segundos = time.perf_counter() - inicio
+
+    latencias = [s for s, error in resultados if error is None]
+    errores = [error for _, error in resultados if error is not None]
+    return {
+        "concurrencia": concurrencia,
+        "peticiones": peticiones,
+        "correctas": len(latencias),
+        "errores": len(errores),
+        "tasa_error": len(errores) / peticiones,
+        "rendimiento": len(latencias) / segundos,
+        "p50": percentil(latencias, 50),
+        "p95": percentil(latencias, 95),
+        "p99": percentil(latencias, 99),
+        "segundos": segundos,
+        "muestra_errores": sorted(set(errores))[:3],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--niveles", default="1,2,4,8,16", help="Concurrencias separadas por comas")
+    parser.add_argument("--peticiones", type=int, default=20, help="Recorridos por nivel")
+    parser.add_argument("--archivos", nargs="*",
+                        default=sorted(glob.glob(os.path.join(root_dir, "pdfs", "*.pdf")))
+                        + [os.path.join(root_dir, "pdfs", "data (7).csv")])
+    parser.add_argument("--comercializador", default="AUTO")
+    parser.add_argument("--trabajadores", type=int, default=4, help="Workers locales de la aplicación")
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--por-fila", type=float, default=0.005)
+    parser.add_argument("--tasa-429", type=float, default=0.0)
+    parser.add_argument("--tasa-malformadas", type=float, default=0.0)
+    parser.add_argument("--filas", type=int, default=40)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--repetir-contenido", action="store_true",
+                        help="Subir archivos idénticos (mide la coalescencia)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--puerto", type=int, default=8767)
+    parser.add_argument("--puerto-stub", type=int, default=8766)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    archivos = [(os.path.basename(ruta), Path(ruta).read_bytes()) for ruta in args.archivos if os.path.exists(ruta)]
+    if not archivos:
+        parser.error("No hay archivos de muestra para reproducir")
+
+    directorio = tempfile.mkdtemp(prefix="carga_")
+    stub, estado = crear_servidor(args.puerto_stub, args.latencia, args.por_fila, args.tasa_429,
+                                  args.tasa_malformadas, args.filas, args.retry_after)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    preparar_entorno(directorio, args.puerto_stub, args.trabajadores)
+    aislar_historial(directorio)
+    servidor = iniciar_app(args.puerto)
+    base = f"http://127.0.0.1:{args.puerto}"
+
+    print(f"{len(archivos)} archivos de muestra, {args.trabajadores} workers, datos en {directorio}\n")
+    resultados = []
+    for concurrencia in (int(n) for n in args.niveles.split(",")):
+        resultados.append(medir_nivel(base, archivos, concurrencia, args.peticiones, args))
+
+    # La aplicación escribe en stdout mientras procesa: el informe va al final
+    print(f"\n{'N':>4}{'OK':>6}{'Error %':>9}{'Rend. (/s)':>12}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}")
+    for r in resultados:
+        print(f"{r['concurrencia']:>4}{r['correctas']:>6}{r['tasa_error'] * 100:>8.1f}%{r['rendimiento']:>12.2f}"
+              f"{r['p50']:>10.2f}{r['p95']:>10.2f}{r['p99']:>10.2f}")
+        for error in r["muestra_errores"]:
+            print(f"      {error[:110]}")
+    print(f"\nStub: {json.dumps(estado.resumen())}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"niveles": resultados, "stub": estado.resumen()}, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.json}")
+
+    servidor.shutdown()
+    stub.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Servidor local que imita el endpoint de carga de rates, para probar el
+publicador sin tocar el backend real.
+
+Uso:
+    python benchmarks/stub_backend.py [--puerto 8765] [--tasa-fallos 0.2] [--latencia 0.05]
+    python -m utils.publicador salida_rates.json --url http://127.0.0.1:8765/rates
+
+Responde 503 a una fracción aleatoria de peticiones (para ejercitar los
+reintentos) y 409 a las claves de idempotencia repetidas.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class EstadoStub:
+    def __init__(self, tasa_fallos, latencia):
+        self.tasa_fallos = tasa_fallos
+        self.latencia = latencia
+        self.lock = threading.Lock()
+        self.claves = set()
+        self.rates = 0
+        self.peticiones = 0
+        self.duplicadas = 0
+
+def crear_servidor(puerto=8765, tasa_fallos=0.0, latencia=0.0):
+    estado = EstadoStub(tasa_fallos, latencia)
+
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _responder(self, codigo, cuerpo):
+            datos = json.dumps(cuerpo).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def do_POST(self):
+            cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(estado.latencia)
+            clave = self.headers.get("Idempotency-Key")
+            with estado.lock:
+                estado.peticiones += 1
+                if random.random() < estado.tasa_fallos:
+                    return self._responder(503, {"error": "fallo simulado"})
+                if clave in estado.claves:
+                    estado.duplicadas += 1
+                    return self._responder(409, {"error": "lote ya recibido"})
+                lote = json.loads(cuerpo)
+                estado.claves.add(clave)
+                estado.rates += len(lote.get("rates", []))
+            self._responder(201, {"recibidos": len(lote.get("rates", []))})
+
+        def do_GET(self):
+            with estado.lock:
+                self._responder(200, {"peticiones": estado.peticiones, "lotes": len(estado.claves),
+                                      "rates": estado.rates, "duplicadas": estado.duplicadas})
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Manejador)
+    servidor.estado = estado
+    return servidor
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend de rates simulado")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--tasa-fallos", type=float, default=0.0)
+    parser.add_argument("--latencia", type=float, default=0.0)
+    args = parser.parse_args()
+
+    servidor = crear_servidor(args.puerto, args.tasa_fallos, args.latencia)
+    print(f"Backend simulado en http://127.0.0.1:{args.puerto}/rates (GET para ver totales)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Servidor local que imita la Messages API de Anthropic (POST /v1/messages,
+con y sin streaming), para probar la aplicación sin red ni costo.
+
+Uso:
+    python benchmarks/stub_claude.py [--puerto 8766] [--latencia 0.5] [--por-fila 0.005]
+                                     [--tasa-429 0.1] [--tasa-malformadas 0.05] [--filas 40]
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8766 ANTHROPIC_API_KEY=stub python app.py
+
+Responde con un CSV de tarifas válido (las filas cuadran CU con sus
+componentes) emitido fila por fila. Una fracción de peticiones recibe 429
+con retry-after y otra una respuesta que no es un CSV válido, para ejercitar
+los reintentos, el escalado de modelos y la validación.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENCABEZADO = "Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT"
+MERCADOS = ["ANTIOQUIA", "BOGOTA", "BOYACA", "CALDAS", "CALI", "CARIBE MAR", "CARIBE SOL", "CAUCA",
+            "HUILA", "META", "NARIÑO", "NORTE SANTANDER", "PEREIRA", "QUINDIO", "SANTANDER", "TOLIMA"]
+NIVELES = ["1 OR", "1 COMP", "1 US", "2", "3"]
+COMERCIALIZADORES = ["ENERTOTAL", "ENELX", "ENERBIT", "VATIA", "QI", "NEU"]
+
+MALFORMADAS = [
+    "Lo siento, no encontré una tabla de tarifas en el documento.",
+    f"{ENCABEZADO}\nVATIA,BOGOTA,1 OR,300.1,50.2\n",
+]
+
+class EstadoStub:
+    def __init__(self, latencia, por_fila, tasa_429, tasa_malformadas, filas, retry_after):
+        self.latencia = latencia
+        self.por_fila = por_fila
+        self.tasa_429 = tasa_429
+        self.tasa_malformadas = tasa_malformadas
+        self.filas = filas
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.peticiones = 0
+        self.limitadas = 0
+        self.malformadas = 0
+        self.en_curso = 0
+        self.max_en_curso = 0
+
+    def resumen(self):
+        with self.lock:
+            return {"peticiones": self.peticiones, "429": self.limitadas, "malformadas": self.malformadas,
+                    "max_simultaneas": self.max_en_curso}
+
+def generar_csv(comercializador, filas):
+    """CSV de tarifas cuyas filas cuadran CU = G + T + D + C + P + R"""
+    lineas = [ENCABEZADO]
+    for i in range(filas):
+        mercado = MERCADOS[i // len(NIVELES) % len(MERCADOS)]
+        nivel = NIVELES[i % len(NIVELES)]
+        g, t, d, c, cot, p, r = (round(random.uniform(10, 300), 4) for _ in range(7))
+        cu = round(g + t + d + c + p + r, 4)
+        lineas.append(f"{comercializador},{mercado},{nivel},{g},{t},{d},{c},{cot},{p},{r},{cu},{round(cu + cot, 4)}")
+    return "\n".join(lineas)
+
+def _comercializador(prompt):
+    for codigo in COMERCIALIZADORES:
+        if re.search(codigo, prompt, re.IGNORECASE):
+            return codigo
+    return "VATIA"
+
+def crear_servidor(puerto=8766, latencia=0.5, por_fila=0.005, tasa_429=0.0, tasa_malformadas=0.0,
+                   filas=40, retry_after=1):
+    estado = EstadoStub(latencia, por_fila, tasa_429, tasa_malformadas, filas, retry_after)
+
+    class Manejador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, cuerpo, cabeceras=None):
+            datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            for clave, valor in (cabeceras or {}).items():
+                self.send_header(clave, valor)
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _evento(self, tipo, datos):
+            self.wfile.write(f"event: {tipo}\ndata: {json.dumps(dict(datos, type=tipo), ensure_ascii=False)}\n\n"
+                             .encode("utf-8"))
+            self.wfile.flush()
+
+        def do_POST(self):
+            peticion = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with estado.lock:
+                estado.peticiones += 1
+                limitada = random.random() < estado.tasa_429
+                malformada = not limitada and random.random() < estado.tasa_malformadas
+                estado.limitadas += limitada
+                estado.malformadas += malformada
+                estado.en_curso += 1
+                estado.max_en_curso = max(estado.max_en_curso, estado.en_curso)
+            try:
+                if limitada:
+                    return self._responder(429, {"type": "error", "error": {
+                        "type": "rate_limit_error", "message": "Límite simulado"}},
+                        {"retry-after": str(estado.retry_after)})
+
+                prompt = "".join(m["content"] if isinstance(m["content"], str) else json.dumps(m["content"])
+                                 for m in peticion.get("messages", []))
+                texto = random.choice(MALFORMADAS) if malformada else generar_csv(_comercializador(prompt),
+                                                                                 estado.filas)
+                uso = {"input_tokens": len(prompt) // 4, "output_tokens": len(texto) // 4}
+                mensaje = {"id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+                           "model": peticion.get("model"), "stop_sequence": None}
+                time.sleep(estado.latencia)
+
+                if not peticion.get("stream"):
+                    time.sleep(estado.por_fila * texto.count("\n"))
+                    return self._responder(200, dict(mensaje, content=[{"type": "text", "text": texto}],
+                                                     stop_reason="end_turn", usage=uso))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                self._evento("message_start", {"message": dict(
+                    mensaje, content=[], stop_reason=None, usage=dict(uso, output_tokens=1))})
+                self._evento("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+                for linea in texto.splitlines(keepends=True):
+                    time.sleep(estado.por_fila)
+                    self._evento("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": linea}})
+                self._evento("content_block_stop", {"index": 0})
+                self._evento("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                               "usage": {"output_tokens": uso["output_tokens"]}})
+                self._evento("message_stop", {})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                with estado.lock:
+                    estado.en_curso -= 1
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Manejador)
+    servidor.daemon_threads = True
+    return servidor, estado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=8766)
+    parser.add_argument("--latencia", type=float, default=0.5, help="Segundos hasta el primer evento")
+    parser.add_argument("--por-fila", type=float, default=0.005, help="Segundos entre filas del streaming")
+    parser.add_argument("--tasa-429", type=float, default=0.0)
+    parser.add_argument("--tasa-malformadas", type=float, default=0.0)
+    parser.add_argument("--filas", type=int, default=40)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    servidor, estado = crear_servidor(args.puerto, args.latencia, args.por_fila, args.tasa_429,
+                                      args.tasa_malformadas, args.filas, args.retry_after)
+    print(f"Messages API simulada en http://127.0.0.1:{args.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(estado.resumen()))
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ COMERCIALIZADORES = {
     "ENERTOTAL": {
         "name": "Enertotal",
         "instrucciones_file": "config/instrucciones/enertotal.txt",
+        "huellas": {
+            "texto": ["ENERTOTAL", r"\bETTC\b", r"Cm \(Cot\)", r"Monomias Sencillas"],
+            "nombre_archivo": ["enertotal", "ettc"]
+        },
         "mercado_mapping": {
             "MCDO ANTIOQUIA UNIF": "ANTIOQUIA",
             "MERCADO CARIBE SOL": "CARIBE SOL",
@@ -44,6 +48,10 @@ COMERCIALIZADORES = {
     "ENELX": {
         "name": "ENELX",
         "instrucciones_file": "config/instrucciones/enelx.txt",
+        "huellas": {
+            "texto": [r"ENEL\s?X", r"enelxenergy", r"Enel Colombia"],
+            "nombre_archivo": [r"enel[\s_-]?x"]
+        },
         "mercado_mapping": {
             "BOGOTÁ Y CUNDINAMARCA": "BOGOTA",
             "ANTIOQUIA": "ANTIOQUIA",
@@ -77,6 +85,10 @@ COMERCIALIZADORES = {
     "ENERBIT": {
         "name": "Enerbit",
         "instrucciones_file": "config/instrucciones/enerbit.txt",
+        "huellas": {
+            "texto": ["ENERBIT", r"CU1 Prop", r"CU12 Prop"],
+            "nombre_archivo": ["enerbit"]
+        },
         "mercado_mapping": {
             "ANTIOQUIA": "ANTIOQUIA",
             "ATLANTICO": "ATLANTICO",
@@ -117,6 +129,11 @@ COMERCIALIZADORES = {
     "VATIA": {
         "name": "Vatia",
         "instrucciones_file": "config/instrucciones/vatia.txt",
+        "huellas": {
+            "texto": ["VATIA", r"CODENSA-EEC", r"EPM-EADE"],
+            "columnas_csv": ["or_abbreviation", "cu_without_cot", "asset_ownership"],
+            "nombre_archivo": ["vatia"]
+        },
         "mercado_mapping": {
             "EPSA": "VALLE",
             "PUTUMAYO": "PUTUMAYO",
@@ -155,6 +172,11 @@ COMERCIALIZADORES = {
     "QI": {
         "name": "QI",
         "instrucciones_file": "config/instrucciones/qi.txt",
+        "huellas": {
+            "texto": [r"QI ENERGY", r"\bQI\b", r"Rm,i", r"NIT:?\s*900\.677\.732"],
+            "columnas_csv": ["or_abbreviation"],
+            "nombre_archivo": [r"(^|[^a-z])qi([^a-z]|$)"]
+        },
         "mercado_mapping": {
             "ARAUCA": "ARAUCA",
             "ANTIOQUIA": "ANTIOQUIA",
@@ -196,6 +218,10 @@ COMERCIALIZADORES = {
     "NEU": {
         "name": "Neu",
         "instrucciones_file": "config/instrucciones/neu.txt",
+        "huellas": {
+            "texto": [r"\bNEU\b", r"NEU ENERG"],
+            "nombre_archivo": [r"(^|[^a-z])neu([^a-z]|$)"]
+        },
         "mercado_mapping": {
             "ANTIOQUIA": "ANTIOQUIA",
             "ATLANTICO": "ATLANTICO",
@@ -18,7 +18,40 @@ def get_tesseract_path():
 CLAUDE_API_CONFIG = {
     "model": "claude-sonnet-4-20250514",
     "max_tokens": 17000,
-    "base_url": "https://api.anthropic.com/v1/messages"
+    "base_url": "https://api.anthropic.com/v1/messages",
+    # Peticiones simultáneas por proceso en el cliente asíncrono
+    "max_concurrencia": int(os.getenv("CLAUDE_MAX_CONCURRENCIA", "8"))
+}
+
+# Enrutamiento de modelos: los niveles se prueban en orden y se escala al
+# siguiente si la salida no pasa la validación (el último es el definitivo)
+MODELOS_CONFIG = {
+    "habilitado": os.getenv("ENRUTAMIENTO_MODELOS", "1") == "1",
+    "niveles": [
+        {
+            "nombre": "rapido",
+            "model": os.getenv("MODELO_RAPIDO", "claude-3-5-haiku-20241022"),
+            "max_tokens": 8192,
+            "intentos": 1,
+            # Tamaño máximo de la entrada para usar este nivel; además, la salida
+            # pronosticada (utils/pronostico.py) debe caber en max_tokens
+            "max_caracteres_estructurado": 30000,
+            "max_caracteres_texto": 8000
+        },
+        {
+            "nombre": "completo",
+            "model": CLAUDE_API_CONFIG["model"],
+            "max_tokens": CLAUDE_API_CONFIG["max_tokens"]
+        }
+    ],
+    # Tolerancia de la conciliación CU = G + T + D + C + P + R y de la columna
+    # "CU + COT" frente a CU más |COT|
+    "tolerancia_relativa": 0.01,
+    "tolerancia_absoluta": 0.1,
+    # Si está activo, una fila descuadrada en un nivel barato obliga a escalar;
+    # si no, solo se advierte y se escala únicamente por errores de estructura
+    "escalar_por_conciliacion": os.getenv("ESCALAR_POR_CONCILIACION", "0") == "1",
+    "estadisticas": os.path.join(ROOT_DIR, "historial", "modelos.json")
 }
 
 # Configuración de reintentos
@@ -26,4 +59,206 @@ RETRY_CONFIG = {
     "max_retries": 3,
     "retry_delay": 2,
     "initial_timeout": 30
-} 
\ No newline at end of file
+} 
+
+# Cortacircuitos de la API de Claude (utils/circuito.py): tras umbral_fallos
+# fallos seguidos del servicio (timeouts, errores de la API, 429) las llamadas
+# fallan de inmediato durante "espera" segundos; después se deja pasar una
+# llamada de prueba y, si funciona, el circuito se cierra
+CIRCUITO_CONFIG = {
+    "habilitado": os.getenv("CIRCUITO_CLAUDE", "1") == "1",
+    "umbral_fallos": int(os.getenv("CIRCUITO_UMBRAL_FALLOS", "5")),
+    "espera": float(os.getenv("CIRCUITO_ESPERA", "60")),
+    # Llamadas de prueba simultáneas con el circuito semiabierto
+    "sondeos": 1,
+    # Con el circuito abierto se sirve el último resultado del mismo documento,
+    # marcado como desactualizado
+    "resultado_anterior": os.getenv("CIRCUITO_RESULTADO_ANTERIOR", "1") == "1",
+    # Si no hay resultado del mismo documento, también el último del comercializador
+    "anterior_por_comercializador": os.getenv("CIRCUITO_ANTERIOR_COMERCIALIZADOR", "0") == "1",
+    "max_por_comercializador": 50,
+    "registro": os.path.join(ROOT_DIR, "historial", "ultimos_resultados.sqlite")
+}
+
+# Configuración del motor de OCR
+# backend: "pytesseract" (un proceso por imagen) o "pool" (instancias
+# persistentes de tesserocr; si no está instalado se usa pytesseract)
+OCR_CONFIG = {
+    "backend": os.getenv("OCR_BACKEND", "pytesseract"),
+    "lang": "spa",
+    "pool_size": int(os.getenv("OCR_POOL_SIZE", "2")),
+    "psm": 6,
+    "oem": 3,
+    "tessdata_path": os.getenv("TESSDATA_PREFIX")
+}
+
+# Configuración del procesamiento por lotes de CSV grandes
+# Los CSV que superan umbral_bytes se leen por bloques de chunksize filas,
+# se agrupan por mercado en disco y se envían a Claude en porciones de como
+# máximo max_caracteres_lote caracteres
+CSV_STREAMING_CONFIG = {
+    "umbral_bytes": 2 * 1024 * 1024,
+    "chunksize": 50000,
+    "max_caracteres_lote": 60000,
+    "columna_mercado": "or_abbreviation"
+}
+
+# Configuración del procesamiento de varios archivos en una petición
+LOTE_CONFIG = {
+    "max_workers": int(os.getenv("LOTE_MAX_WORKERS", "4"))
+}
+
+# Perfilado bajo demanda de un trabajo (X-Perfilar: 1, ?perfilar=1 o --perfilar)
+PERFILADO_CONFIG = {
+    # Permite pedir el perfil desde la aplicación web
+    "permitido": os.getenv("PERFILADO_PERMITIDO", "1") == "1",
+    # Funciones del informe, ordenadas por tiempo acumulado
+    "lineas": 40,
+    # Marcos de pila que guarda tracemalloc por asignación y asignaciones del informe
+    "marcos": 5,
+    "asignaciones": 15
+}
+
+# Ingesta automática de carpetas vigiladas (python src/main.py --vigilar)
+VIGILANCIA_CONFIG = {
+    # Directorios de entrada, separados por os.pathsep (";" en Windows, ":" en Linux).
+    # Las subcarpetas con el nombre de un comercializador (entrada/VATIA/...)
+    # o de un periodo (entrada/2024-03/...) fijan esos valores
+    "directorios": [d for d in os.getenv("VIGILAR_DIRECTORIOS", os.path.join(ROOT_DIR, "entrada")).split(os.pathsep) if d],
+    # Las salidas se escriben en salida/<periodo>/<comercializador>/
+    "salida": os.getenv("VIGILAR_SALIDA", os.path.join(ROOT_DIR, "salida")),
+    # Hash de contenido de los archivos ya procesados
+    "registro": os.path.join(ROOT_DIR, "historial", "vigilancia.sqlite"),
+    "extensiones": [".pdf", ".csv"],
+    # Archivos temporales de descargas y editores que nunca se procesan
+    "ignorar": [".part", ".tmp", ".crdownload", ".download"],
+    # Un archivo se procesa cuando su tamaño y fecha no cambian durante este tiempo
+    "espera_estable": 2.0,
+    # Intervalo de revisión sin inotify (o entre eventos con inotify)
+    "sondeo": 2.0,
+    "max_workers": LOTE_CONFIG["max_workers"]
+}
+
+# Registro de comercializadores e instrucciones (utils/registro_instrucciones.py)
+INSTRUCCIONES_CONFIG = {
+    # Recarga config/comercializadores.py y las instrucciones al cambiar, sin reiniciar los workers
+    "recarga": os.getenv("RECARGAR_INSTRUCCIONES", "1") == "1",
+    # Segundos mínimos entre revisiones de las fechas de los archivos
+    "intervalo": 2.0
+}
+
+# Configuración de la detección automática del comercializador
+DETECCION_CONFIG = {
+    "max_paginas_pdf": 2,
+    # PDF con menos texto que esto se leen con OCR (requiere Tesseract)
+    "min_caracteres_texto": 100,
+    "ocr": os.getenv("DETECCION_OCR", "1") == "1",
+    "dpi_ocr": 150,
+    "max_filas_csv": 200,
+    "max_caracteres": 20000,
+    "puntaje_minimo": 6.0,
+    "temperatura": 3.0,
+    "confianza_minima": 0.8
+}
+
+# Configuración del procesamiento diferencial entre publicaciones
+# Solo se envían a Claude los mercados cuyo texto cambió respecto a la
+# publicación anterior del mismo comercializador
+DIFF_CONFIG = {
+    "habilitado": os.getenv("DIFF_HABILITADO", "0") == "1",
+    "directorio": os.path.join(ROOT_DIR, "historial")
+}
+
+# Normalización local de etiquetas y números (utils/normalizacion.py)
+NORMALIZACION_CONFIG = {
+    # Mercados, niveles, comercializadores y componentes de las salidas de Claude
+    "salida": os.getenv("NORMALIZAR_SALIDA", "1") == "1",
+    # Números con coma decimal y espacios del texto de los PDF antes de enviarlo
+    "texto_entrada": os.getenv("NORMALIZAR_TEXTO_ENTRADA", "0") == "1"
+}
+
+# Tabla consolidada de comparación entre comercializadores
+COMPARATIVO_CONFIG = {
+    "ruta": os.path.join(ROOT_DIR, "historial", "comparativo.json")
+}
+
+# Configuración de la publicación de rates en el backend de tarifas
+PUBLICACION_CONFIG = {
+    "url": os.getenv("TARIFAS_BACKEND_URL"),
+    "token": os.getenv("TARIFAS_BACKEND_TOKEN"),
+    "tamano_lote": int(os.getenv("PUBLICACION_TAMANO_LOTE", "200")),
+    "concurrencia": int(os.getenv("PUBLICACION_CONCURRENCIA", "4")),
+    # Espera máxima entre reintentos, aunque el backend pida más con Retry-After
+    "max_espera": float(os.getenv("PUBLICACION_MAX_ESPERA", "60")),
+    "checkpoint": os.path.join(ROOT_DIR, "historial", "publicacion_checkpoint.json")
+}
+
+# Configuración del almacenamiento de archivos de trabajo y resultados
+ALMACENAMIENTO_CONFIG = {
+    "directorio": os.getenv("ALMACENAMIENTO_DIR", os.path.join(ROOT_DIR, "uploads")),
+    "max_bytes": int(os.getenv("ALMACENAMIENTO_MAX_MB", "1024")) * 1024 * 1024,
+    "max_edad": int(os.getenv("ALMACENAMIENTO_MAX_HORAS", "24")) * 3600,
+    "intervalo_limpieza": 300,
+    # Un objeto sin referencias se conserva al menos estos segundos desde su
+    # último uso: otro proceso puede estar por registrarlo en su manifiesto
+    "gracia": 600,
+    "tamano_bloque": 1024 * 1024,
+    # Los resultados más pequeños no se precomprimen
+    "comprimir_min_bytes": 1024
+}
+
+# Configuración del pronóstico de tokens, latencia y costo antes de llamar a Claude
+PRONOSTICO_CONFIG = {
+    "registro": os.path.join(ROOT_DIR, "historial", "uso_claude.jsonl"),
+    "registrar": os.getenv("REGISTRAR_USO_CLAUDE", "1") == "1",
+    # Muestras mínimas para reemplazar los valores iniciales por los calibrados
+    "min_muestras": 5,
+    # Solo se calibra con las muestras más recientes
+    "max_muestras": 500,
+    # Cuando el registro supera este tamaño se compacta a las últimas max_muestras líneas
+    "max_bytes_registro": 1024 * 1024,
+    # Valores iniciales mientras no hay suficientes muestras
+    "caracteres_por_token": 3.2,
+    "tokens_salida_por_caracter": 0.35,
+    "latencia_base": 2.0,
+    "tokens_salida_por_segundo": 60.0,
+    # Factor de seguridad sobre la salida estimada frente a max_tokens
+    "margen_salida": 1.2,
+    "max_tokens_contexto": 200000,
+    # USD por millón de tokens (entrada, salida)
+    "precios": {
+        "claude-sonnet-4-20250514": (3.0, 15.0),
+        "claude-3-5-haiku-20241022": (0.8, 4.0)
+    }
+}
+
+# Coalescencia de trabajos idénticos en curso (mismo archivo, comercializador e instrucciones)
+COALESCENCIA_CONFIG = {
+    "ruta": os.path.join(ROOT_DIR, "historial", "trabajos_en_curso.sqlite"),
+    # Segundos entre consultas de un trabajo que espera a otro proceso
+    "sondeo": 1.0,
+    # El líder renueva su latido con esta frecuencia; si deja de hacerlo
+    # durante "expiracion" segundos otro proceso toma el trabajo
+    "latido": 5,
+    "expiracion": 30,
+    # Tiempo que un resultado terminado sigue disponible para quien espera
+    "retencion": 120
+}
+
+# Cola compartida de trabajos entre la aplicación web y los workers
+COLA_CONFIG = {
+    # "sqlite" (un archivo compartido, para una máquina o pruebas) o "redis"
+    "backend": os.getenv("COLA_BACKEND", "sqlite"),
+    "ruta": os.getenv("COLA_RUTA", os.path.join(ROOT_DIR, "historial", "cola_trabajos.sqlite")),
+    "url_redis": os.getenv("COLA_REDIS_URL", "redis://localhost:6379/0"),
+    # Un trabajo reservado vuelve a la cola si su worker no renueva la
+    # reserva durante "visibilidad" segundos; el latido la renueva
+    "visibilidad": 120,
+    "latido": 30,
+    "max_intentos": 3,
+    "sondeo": 0.5,
+    # Tiempo que se conservan los trabajos terminados y sus eventos
+    "retencion": 3600,
+    # Workers que la aplicación web arranca en su propio proceso (0 = solo encola)
+    "trabajadores_locales": int(os.getenv("TRABAJADORES_LOCALES", LOTE_CONFIG["max_workers"]))
+}
@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -8,11 +9,42 @@ sys.path.append(root_dir)
 
 from dotenv import load_dotenv
 from src.tarifas_processor import TarifasElectricasProcessor
-from config.config import ENV_FILE_PATH, get_tesseract_path
-from config.comercializadores import COMERCIALIZADORES
+from config.config import ENV_FILE_PATH, VIGILANCIA_CONFIG, get_tesseract_path
+from utils.registro_instrucciones import obtener_registro
+from utils.detector_comercializador import detectar_comercializador
+from utils.comparativo import ComparativoTarifas
+from utils.perfilado import perfilar, guardar_perfil
+
+def detectar(ruta):
+    """Detecta el comercializador de un archivo e informa el resultado"""
+    deteccion = detectar_comercializador(ruta)
+    if not deteccion.comercializador:
+        print(f"No se pudo detectar el comercializador (confianza {deteccion.confianza:.2f}).")
+        print("Vuelve a ejecutar y selecciónalo manualmente.")
+        return None
+    print(f"Comercializador detectado: {deteccion.comercializador} (confianza {deteccion.confianza:.2f})")
+    return deteccion.comercializador
+
+def actualizar_comparativo(csv_path):
+    """Incorpora el CSV generado a la tabla comparativa entre comercializadores"""
+    try:
+        ComparativoTarifas().actualizar_desde_csv(csv_path)
+    except Exception as e:
+        print(f"No se pudo actualizar el comparativo: {e}")
 
 def main():
     """Función principal para ejecutar el procesador"""
+    parser = argparse.ArgumentParser(description="Procesador de tarifas eléctricas")
+    parser.add_argument("--vigilar", nargs="*", metavar="DIRECTORIO",
+                        help="Vigila los directorios indicados (o VIGILAR_DIRECTORIOS) y procesa los archivos nuevos")
+    parser.add_argument("--salida", help="Directorio de salida del modo vigilancia")
+    parser.add_argument("--workers", type=int, help="Archivos procesados a la vez en el modo vigilancia")
+    parser.add_argument("--perfilar", action="store_true",
+                        help="Guarda un perfil de CPU y memoria del procesamiento junto a la salida")
+    parser.add_argument("--una-vez", action="store_true",
+                        help="Procesa los archivos presentes y termina, sin quedarse vigilando")
+    args = parser.parse_args()
+
     try:
         # Cargar API key
         api_key = os.getenv("ANTHROPIC_API_KEY")
@@ -43,6 +75,11 @@ def main():
             print("Si necesitas procesar tablas en imágenes, instala Tesseract desde: https://github.com/UB-Mannheim/tesseract/wiki")
             tesseract_path = None
         
+        if args.vigilar is not None:
+            from src.vigilante import vigilar
+            vigilar(api_key, args.vigilar or None, args.salida, args.workers, args.una_vez)
+            return
+
         # Inicializar el procesador
         procesador = TarifasElectricasProcessor(api_key)
 
@@ -58,23 +95,29 @@ def main():
 
         # Mostrar comercializadores disponibles
         print("\nComercializadores disponibles:")
-        for i, (codigo, info) in enumerate(COMERCIALIZADORES.items(), 1):
-            print(f"{i}. {info['name']}")
+        print("0. Detectar automáticamente")
+        registro = obtener_registro()
+        codigos = registro.codigos()
+        for i, codigo in enumerate(codigos, 1):
+            print(f"{i}. {registro.obtener(codigo).info['name']}")
 
         # Solicitar selección del comercializador
         while True:
             try:
                 seleccion = int(input("\nSeleccione el número del comercializador: "))
-                if 1 <= seleccion <= len(COMERCIALIZADORES):
-                    comercializador = list(COMERCIALIZADORES.keys())[seleccion - 1]
+                if seleccion == 0:
+                    comercializador = None
+                    break
+                if 1 <= seleccion <= len(codigos):
+                    comercializador = codigos[seleccion - 1]
                     break
                 else:
                     print("Por favor, seleccione un número válido.")
             except ValueError:
                 print("Por favor, ingrese un número válido.")
 
-        # Ruta común para PDF y CSV
-        default_path = r"C:\Users\User\Desktop\Tarifas cursor\pdfs"
+        # Ruta común para PDF y CSV (VIGILAR_DIRECTORIOS)
+        default_path = VIGILANCIA_CONFIG["directorios"][0]
 
         # Lógica para CSV
         if opcion == "2":
@@ -108,7 +151,16 @@ def main():
                 print(f"Error: El archivo {ruta_csv} no existe.")
                 return
 
-            procesador.procesar_csv(ruta_csv, comercializador)
+            comercializador = comercializador or detectar(ruta_csv)
+            if not comercializador:
+                return
+
+            with perfilar(args.perfilar, ruta_csv) as perfil:
+                salida_csv = procesador.procesar_csv(ruta_csv, comercializador)
+            if perfil:
+                guardar_perfil(perfil, os.path.join(os.path.dirname(ruta_csv), "output"), ruta_csv)
+            if salida_csv:
+                actualizar_comparativo(salida_csv)
             print("\nProceso completado.")
             return
 
@@ -142,9 +194,17 @@ def main():
             print(f"Error: El archivo {pdf_path} no existe.")
             return
 
-        csv_path, text_path = procesador.procesar_archivo(pdf_path, comercializador)
+        comercializador = comercializador or detectar(pdf_path)
+        if not comercializador:
+            return
+
+        with perfilar(args.perfilar, pdf_path) as perfil:
+            csv_path, text_path = procesador.procesar_archivo(pdf_path, comercializador)
+        if perfil:
+            guardar_perfil(perfil, os.path.join(os.path.dirname(pdf_path), "output"), pdf_path)
 
         if csv_path:
+            actualizar_comparativo(csv_path)
             print(f"\nArchivos generados:")
             print(f"  - CSV: {csv_path}")
             print(f"  - Texto: {text_path}")
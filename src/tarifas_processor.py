@@ -1,23 +1,26 @@
 import os
 import sys
 from pathlib import Path
-import pandas as pd
 from dotenv import load_dotenv
 import tempfile
-import csv
+import io
 import json
-import tiktoken  # <-- Agregado para conteo preciso de tokens
+import time
+from collections import namedtuple
 
 # Agregar el directorio raíz al path de Python
 root_dir = str(Path(__file__).parent.parent)
 sys.path.append(root_dir)
 
-from config.config import get_tesseract_path, CLAUDE_API_CONFIG, RETRY_CONFIG
-from utils.image_processor import ImageProcessor
-from utils.pdf_processor import PDFProcessor
-from utils.claude_api import ClaudeAPI
-from utils.csv_to_json_converter import CSVToJSONConverter
-from config.comercializadores import COMERCIALIZADORES
+from config.config import get_tesseract_path, CLAUDE_API_CONFIG, RETRY_CONFIG, CSV_STREAMING_CONFIG, DIFF_CONFIG, \
+    NORMALIZACION_CONFIG
+from utils.progreso import emitir
+from utils.diff_mercados import DiffMercados, HistorialMercados, PREAMBULO
+from utils.pronostico import obtener_pronosticador, DIVIDIR, RECHAZAR
+from utils.normalizacion import normalizar_df, normalizar_entrada
+from utils.registro_instrucciones import obtener_registro
+
+ResultadoMemoria = namedtuple("ResultadoMemoria", ["csv", "df", "json"])
 
 class TarifasElectricasProcessor:
     """
@@ -27,39 +30,104 @@ class TarifasElectricasProcessor:
     3. Obtiene y guarda el CSV estructurado
     """
 
-    def __init__(self, api_key):
+    def __init__(self, api_key, progreso=None):
         if not api_key:
             raise ValueError("Se requiere una API key de Anthropic")
 
         self.api_key = api_key
         self.tesseract_path = get_tesseract_path()
+        self.progreso = progreso
 
-        self.image_processor = ImageProcessor(self.tesseract_path)
-        self.pdf_processor = PDFProcessor(self.image_processor)
-        self.claude_api = ClaudeAPI(self.api_key)
-        self.csv_to_json = CSVToJSONConverter()
         self.config = CLAUDE_API_CONFIG
         self.retry_config = RETRY_CONFIG
-
-    def _contar_tokens_preciso(self, texto):
-        enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(texto))
+        self.pronosticador = obtener_pronosticador()
+
+        # OCR, PDF, tokenizador y cliente de Claude se cargan en el primer uso:
+        # un CSV nunca paga el arranque de OpenCV, Tesseract ni PyMuPDF
+        self._image_processor = None
+        self._pdf_processor = None
+        self._claude_api = None
+        self._csv_to_json = None
+
+    @property
+    def image_processor(self):
+        if self._image_processor is None:
+            from utils.image_processor import ImageProcessor
+            self._image_processor = ImageProcessor(self.tesseract_path)
+        return self._image_processor
+
+    @property
+    def pdf_processor(self):
+        if self._pdf_processor is None:
+            from utils.pdf_processor import PDFProcessor
+            self._pdf_processor = PDFProcessor(self.image_processor, self.progreso)
+        return self._pdf_processor
+
+    @property
+    def claude_api(self):
+        if self._claude_api is None:
+            from utils.claude_api import ClaudeAPI
+            self._claude_api = ClaudeAPI(self.api_key, self.progreso)
+        return self._claude_api
+
+    @property
+    def csv_to_json(self):
+        if self._csv_to_json is None:
+            from utils.csv_to_json_converter import CSVToJSONConverter
+            self._csv_to_json = CSVToJSONConverter()
+        return self._csv_to_json
+
+    def _estimar_tokens(self, texto):
+        """Tokens de Claude estimados con la calibración del uso registrado"""
+        return self.pronosticador.tokens(texto)
+
+    def _pronosticar(self, texto, instrucciones, divisible=True):
+        """Pronostica tokens, latencia y costo de la petición antes de enviarla"""
+        pronostico = self.pronosticador.estimar(texto, instrucciones, divisible=divisible)
+        print(f"Pronóstico: ~{pronostico.tokens_entrada} tokens de entrada, "
+              f"~{pronostico.tokens_salida} de salida, ~{pronostico.latencia}s, "
+              f"~{pronostico.costo} USD -> {pronostico.decision}"
+              + (f" en {pronostico.partes} partes" if pronostico.decision == DIVIDIR else ""))
+        emitir(self.progreso, "pronostico", **pronostico._asdict())
+        return pronostico
+
+    def _procesar_por_partes(self, secciones, instrucciones, partes):
+        """
+        Envía el documento en varias peticiones, cada una con el preámbulo y un
+        grupo de mercados de tamaño similar, y une los CSV resultantes.
+        """
+        mercados = [m for m in secciones if m != PREAMBULO]
+        tamano_objetivo = sum(len(secciones[m]) for m in mercados) / partes
+        grupos, actual, tamano = [], [], 0
+        for mercado in mercados:
+            if actual and tamano + len(secciones[mercado]) > tamano_objetivo:
+                grupos.append(actual)
+                actual, tamano = [], 0
+            actual.append(mercado)
+            tamano += len(secciones[mercado])
+        if actual:
+            grupos.append(actual)
+
+        encabezado, filas = None, []
+        for num_parte, grupo in enumerate(grupos, 1):
+            print(f"\nEnviando parte {num_parte}/{len(grupos)} ({len(grupo)} mercados) a Claude...")
+            emitir(self.progreso, "lote", lote=num_parte, total=len(grupos), filas_salida=len(filas))
+            resultado = self.claude_api.procesar_texto(DiffMercados.texto_parcial(secciones, grupo), instrucciones)
+            if not resultado:
+                return None
+            lineas = resultado.strip().splitlines()
+            encabezado = lineas[0]
+            filas.extend(lineas[1:])
+        return "\n".join([encabezado] + filas)
 
     def _cargar_instrucciones(self, comercializador):
-        if comercializador not in COMERCIALIZADORES:
-            raise ValueError(f"Comercializador no válido: {comercializador}")
-
-        # Cargar instrucciones específicas del comercializador
-        specific_path = os.path.join(root_dir, COMERCIALIZADORES[comercializador]["instrucciones_file"])
-        if not os.path.exists(specific_path):
-            raise ValueError(f"No se encontraron instrucciones para el comercializador {comercializador}")
-
-        with open(specific_path, "r", encoding="utf-8") as f:
-            return f.read()
+        # Instrucciones ya cargadas y validadas por el registro (ValueError si no está disponible)
+        return obtener_registro().instrucciones(comercializador)
 
     def visualizar_csv(self, csv_content):
         try:
             import io
+            import pandas as pd
             df = pd.read_csv(io.StringIO(csv_content))
             print("\nResumen del CSV generado:")
             print(f"  - Filas: {len(df)}")
@@ -82,35 +150,177 @@ class TarifasElectricasProcessor:
             print(f"Error al guardar el CSV: {e}")
             return False
 
-    def procesar_archivo(self, pdf_path, comercializador):
+    def _procesar_diferencial(self, texto, secciones, comercializador, instrucciones, periodo=None):
+        """
+        Envía a Claude solo los mercados que cambiaron respecto a la última
+        publicación guardada del comercializador y copia las filas anteriores
+        de los mercados sin cambios.
+        """
+        periodo = periodo or time.strftime("%Y-%m")
+        diff = DiffMercados(comercializador)
+        historial = HistorialMercados()
+        anterior = historial.ultimo(comercializador)
+        modificados, sin_cambios = diff.comparar(secciones, anterior)
+
+        if not sin_cambios:
+            print("\nSin publicación anterior comparable: se procesa el documento completo.")
+            csv_content = self.claude_api.procesar_texto(texto, instrucciones)
+        elif not modificados:
+            print(f"\nNingún mercado cambió respecto al periodo {anterior['periodo']}: se reutiliza la salida anterior.")
+            csv_content = anterior["csv"]
+        else:
+            texto_parcial = diff.texto_parcial(secciones, modificados)
+            print(f"\nEnviando a Claude solo {len(modificados)} de {len(modificados) + len(sin_cambios)} mercados...")
+            csv_nuevo = self.claude_api.procesar_texto(texto_parcial, instrucciones)
+            if not csv_nuevo:
+                return None
+            csv_content = diff.combinar_csv(csv_nuevo, anterior["csv"], sin_cambios, list(secciones))
+
+        if not csv_content:
+            return None
+
+        tokens_ahorrados = sum(self._estimar_tokens(secciones[m]) for m in sin_cambios)
+        print(f"Mercados modificados: {modificados}")
+        print(f"Mercados sin cambios (copiados de la salida anterior): {sin_cambios}")
+        print(f"Tokens de entrada ahorrados: {tokens_ahorrados}")
+        emitir(self.progreso, "diferencial", modificados=modificados, sin_cambios=sin_cambios,
+               tokens_ahorrados=tokens_ahorrados)
+
+        historial.guardar(comercializador, periodo, secciones, texto, csv_content)
+        return csv_content
+
+    def _csv_de_texto(self, texto, comercializador, diferencial, periodo):
+        """
+        Envía el texto extraído de un PDF a Claude (completo, por partes o
+        solo los mercados modificados) y devuelve el CSV generado o None.
+        """
+        instrucciones = self._cargar_instrucciones(comercializador)
+        texto = normalizar_entrada(texto)
+
+        # Pronosticar antes de gastar la llamada; solo se puede dividir por mercados
+        secciones = DiffMercados(comercializador).seccionar(texto)
+        pronostico = self._pronosticar(texto, instrucciones, divisible=len(secciones) > 2)
+        if pronostico.decision == RECHAZAR:
+            print(f"Documento rechazado: {pronostico.motivo}")
+            return None
+        tokens_entrada = pronostico.tokens_entrada
+
+        print("\nProcesando el texto con Claude...")
+        emitir(self.progreso, "etapa", nombre="claude", tokens_estimados=tokens_entrada)
+        if pronostico.decision == DIVIDIR:
+            csv_content = self._procesar_por_partes(secciones, instrucciones, pronostico.partes)
+        elif diferencial:
+            csv_content = self._procesar_diferencial(texto, secciones, comercializador, instrucciones, periodo)
+        else:
+            csv_content = self.claude_api.procesar_texto(texto, instrucciones)
+        if not csv_content:
+            print("No se pudo procesar el texto con Claude")
+            return None
+
+        # Calcular tokens de salida y total
+        tokens_salida = self._estimar_tokens(csv_content)
+        print(f"Tokens de salida (estimado): {tokens_salida}")
+        print(f"Tokens totales (entrada + salida): {tokens_entrada + tokens_salida}")
+        return csv_content
+
+    def _csv_de_bytes(self, datos, comercializador, diferencial, periodo):
+        """
+        Envía a Claude un CSV que ya está en memoria y devuelve el CSV
+        generado o None. La entrada se decodifica y se analiza una sola vez.
+        """
+        import pandas as pd
+
+        csv_text = datos.decode("utf-8")
+
+        # Leer el CSV y mostrar información sobre su contenido
+        df = pd.read_csv(io.StringIO(csv_text))
+        print("\nInformación del CSV de entrada:")
+        print(f"Columnas disponibles: {df.columns.tolist()}")
+        if 'or_abbreviation' in df.columns:
+            print(f"Mercados únicos en or_abbreviation: {sorted(df['or_abbreviation'].unique().tolist())}")
+            print(f"Total de mercados únicos: {len(df['or_abbreviation'].unique())}")
+        print(f"Total de filas: {len(df)}")
+
+        instrucciones = self._cargar_instrucciones(comercializador)
+
+        # Pronosticar antes de gastar la llamada; un CSV siempre se puede dividir por filas
+        pronostico = self._pronosticar(csv_text, instrucciones)
+        if pronostico.decision == DIVIDIR:
+            max_caracteres = min(CSV_STREAMING_CONFIG["max_caracteres_lote"],
+                                 len(csv_text) // pronostico.partes)
+            salida = io.StringIO()
+            if not self._escribir_csv_streaming(io.BytesIO(datos), comercializador, salida, max_caracteres):
+                return None
+            return salida.getvalue()
+        tokens_entrada = pronostico.tokens_entrada
+
+        print("\nEnviando CSV como texto a Claude...")
+        emitir(self.progreso, "etapa", nombre="claude", tokens_estimados=tokens_entrada)
+        if diferencial:
+            secciones = DiffMercados(comercializador).seccionar_csv(
+                csv_text, CSV_STREAMING_CONFIG["columna_mercado"])
+            resultado = self._procesar_diferencial(csv_text, secciones, comercializador, instrucciones, periodo)
+        else:
+            resultado = self.claude_api.procesar_texto(csv_text, instrucciones)
+
+        if not resultado:
+            print("No se obtuvo respuesta de Claude.")
+            return None
+
+        # Calcular tokens de salida y total
+        tokens_salida = self._estimar_tokens(resultado)
+        print(f"Tokens de salida (estimado): {tokens_salida}")
+        print(f"Tokens totales (entrada + salida): {tokens_entrada + tokens_salida}")
+        return resultado
+
+    def _normalizar_salida(self, csv_content, comercializador):
+        """
+        Analiza el CSV generado y normaliza localmente sus etiquetas y números
+        (NORMALIZACION_CONFIG["salida"]).
+
+        Returns:
+            tuple: (texto CSV, DataFrame)
+        """
+        import pandas as pd
+
+        df = pd.read_csv(io.StringIO(csv_content))
+        if NORMALIZACION_CONFIG["salida"]:
+            normalizar_df(df, comercializador)
+            csv_content = df.to_csv(index=False)
+        return csv_content, df
+
+    def _resumir_salida(self, df_salida):
+        print("\nInformación del CSV de salida:")
+        print(f"Total de filas: {len(df_salida)}")
+        print(f"Mercados únicos: {sorted(df_salida['Mercado'].unique().tolist())}")
+        print(f"Total de mercados únicos: {len(df_salida['Mercado'].unique())}")
+        print(f"Niveles de tensión únicos: {df_salida['Nivel de Tensión'].unique().tolist()}")
+
+    def procesar_archivo(self, pdf_path, comercializador, diferencial=None, periodo=None):
+        """
+        Extrae el texto de un PDF y lo procesa con Claude.
+
+        Con diferencial (por defecto DIFF_CONFIG["habilitado"]) solo se envían
+        los mercados que cambiaron respecto a la publicación anterior.
+        """
+        if diferencial is None:
+            diferencial = DIFF_CONFIG["habilitado"]
         try:
+            emitir(self.progreso, "etapa", nombre="extraccion")
             texto, text_path = self.pdf_processor.extraer_texto_pdf(pdf_path)
             if not texto:
                 print("No se pudo extraer texto del PDF")
                 return None, None
 
-            instrucciones = self._cargar_instrucciones(comercializador)
-
-            # Calcular tokens de entrada (preciso)
-            tokens_entrada = self._contar_tokens_preciso(texto) + self._contar_tokens_preciso(instrucciones)
-            print(f"Tokens de entrada (preciso): {tokens_entrada}")
-
-            print("\nProcesando el texto con Claude...")
-            csv_content = self.claude_api.procesar_texto(texto, instrucciones)
+            csv_content = self._csv_de_texto(texto, comercializador, diferencial, periodo)
             if not csv_content:
-                print("No se pudo procesar el texto con Claude")
                 return None, None
-
-            # Calcular tokens de salida y total
-            tokens_salida = self._contar_tokens_preciso(csv_content)
-            print(f"Tokens de salida (preciso): {tokens_salida}")
-            print(f"Tokens totales (entrada + salida): {tokens_entrada + tokens_salida}")
+            csv_content, _ = self._normalizar_salida(csv_content, comercializador)
 
             output_dir = os.path.join(os.path.dirname(pdf_path), "output")
             os.makedirs(output_dir, exist_ok=True)
 
-            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-            csv_path = os.path.join(output_dir, f"{base_name}.csv")
+            csv_path = os.path.join(output_dir, self.nombres_salida(pdf_path)[0])
 
             with open(csv_path, 'w', encoding='utf-8') as f:
                 f.write(csv_content)
@@ -122,62 +332,43 @@ class TarifasElectricasProcessor:
             print(f"Error al procesar el archivo: {str(e)}")
             return None, None
 
-    def procesar_csv(self, csv_path, comercializador):
-        """Procesa un CSV como texto, enviándolo a Claude junto con instrucciones"""
+    def procesar_csv(self, csv_path, comercializador, streaming=None, diferencial=None, periodo=None):
+        """
+        Procesa un CSV como texto, enviándolo a Claude junto con instrucciones.
+
+        Si streaming es None se activa automáticamente para archivos que
+        superan CSV_STREAMING_CONFIG["umbral_bytes"]. El modo diferencial se
+        aplica solo al procesamiento sin streaming.
+        """
+        if diferencial is None:
+            diferencial = DIFF_CONFIG["habilitado"]
         try:
             if not os.path.exists(csv_path):
                 print(f"Archivo no encontrado: {csv_path}")
                 return None
 
-            # Leer el CSV y mostrar información sobre su contenido
-            df = pd.read_csv(csv_path)
-            print("\nInformación del CSV de entrada:")
-            print(f"Columnas disponibles: {df.columns.tolist()}")
-            if 'or_abbreviation' in df.columns:
-                print(f"Mercados únicos en or_abbreviation: {sorted(df['or_abbreviation'].unique().tolist())}")
-                print(f"Total de mercados únicos: {len(df['or_abbreviation'].unique())}")
-            print(f"Total de filas: {len(df)}")
-
-            with open(csv_path, "r", encoding="utf-8") as f:
-                csv_text = f.read()
-
-            instrucciones = self._cargar_instrucciones(comercializador)
-
-            # Calcular tokens de entrada (preciso)
-            tokens_entrada = self._contar_tokens_preciso(csv_text) + self._contar_tokens_preciso(instrucciones)
-            print(f"Tokens de entrada (preciso): {tokens_entrada}")
-
-            print("\nEnviando CSV como texto a Claude...")
-            resultado = self.claude_api.procesar_texto(csv_text, instrucciones)
+            if streaming is None:
+                streaming = os.path.getsize(csv_path) > CSV_STREAMING_CONFIG["umbral_bytes"]
+            if streaming:
+                return self._procesar_csv_streaming(csv_path, comercializador)
 
+            with open(csv_path, "rb") as f:
+                resultado = self._csv_de_bytes(f.read(), comercializador, diferencial, periodo)
             if not resultado:
-                print("No se obtuvo respuesta de Claude.")
                 return None
-
-            # Calcular tokens de salida y total
-            tokens_salida = self._contar_tokens_preciso(resultado)
-            print(f"Tokens de salida (preciso): {tokens_salida}")
-            print(f"Tokens totales (entrada + salida): {tokens_entrada + tokens_salida}")
+            resultado, df_salida = self._normalizar_salida(resultado, comercializador)
 
             # Crear directorio de salida si no existe
             output_dir = os.path.join(os.path.dirname(csv_path), "output")
             os.makedirs(output_dir, exist_ok=True)
-
-            # Generar nombre del archivo de salida
-            base_name = os.path.splitext(os.path.basename(csv_path))[0]
-            output_path = os.path.join(output_dir, f"{base_name}_procesado.csv")
+            output_path = os.path.join(output_dir, self.nombres_salida(csv_path)[0])
 
             # Guardar el resultado
             with open(output_path, "w", encoding="utf-8") as f:
                 f.write(resultado)
 
-            # Leer el CSV de salida y mostrar información
-            df_salida = pd.read_csv(output_path)
-            print("\nInformación del CSV de salida:")
-            print(f"Total de filas: {len(df_salida)}")
-            print(f"Mercados únicos: {sorted(df_salida['Mercado'].unique().tolist())}")
-            print(f"Total de mercados únicos: {len(df_salida['Mercado'].unique())}")
-            print(f"Niveles de tensión únicos: {df_salida['Nivel de Tensión'].unique().tolist()}")
+            # La información de salida se toma del resultado en memoria, sin releer el archivo
+            self._resumir_salida(df_salida)
 
             print(f"\n\u2705 Archivo procesado guardado en: {output_path}")
             return output_path
@@ -186,6 +377,216 @@ class TarifasElectricasProcessor:
             print(f"\u274c Error al procesar el CSV con Claude: {e}")
             return None
 
+    @staticmethod
+    def nombres_salida(nombre):
+        """Nombres del CSV y del JSON generados para un archivo de entrada"""
+        base_name = os.path.splitext(os.path.basename(nombre))[0]
+        if nombre.lower().endswith(".csv"):
+            base_name = f"{base_name}_procesado"
+        return f"{base_name}.csv", f"{base_name}.json"
+
+    def procesar_en_memoria(self, datos, nombre, comercializador, diferencial=None, periodo=None):
+        """
+        Procesa un PDF o CSV a partir de sus bytes sin escribir en disco: el
+        PDF se abre desde el buffer, el CSV generado se analiza una sola vez
+        en un DataFrame que sirve para el resumen, la validación de columnas
+        y la conversión a JSON. Quien llama decide si guardar el resultado
+        (ver guardar_resultado) o publicarlo directamente.
+
+        Returns:
+            ResultadoMemoria: (texto CSV, DataFrame, estructura JSON) o None
+            si el documento no produjo salida (PDF sin texto, documento
+            rechazado por el pronóstico)
+
+        Raises:
+            ValueError: si la entrada o el CSV generado no son válidos
+            CircuitoAbierto: si la API de Claude está marcada como caída
+            Exception: los errores de Claude y de red se propagan para que
+                la cola reintente el trabajo
+        """
+        if diferencial is None:
+            diferencial = DIFF_CONFIG["habilitado"]
+        if nombre.lower().endswith(".csv"):
+            csv_content = self._csv_de_bytes(datos, comercializador, diferencial, periodo)
+        else:
+            emitir(self.progreso, "etapa", nombre="extraccion")
+            texto, _ = self.pdf_processor.extraer_texto_pdf(nombre, datos=datos, guardar_texto=False)
+            if not texto:
+                print("No se pudo extraer texto del PDF")
+                return None
+            csv_content = self._csv_de_texto(texto, comercializador, diferencial, periodo)
+        if not csv_content:
+            return None
+
+        try:
+            csv_content, df = self._normalizar_salida(csv_content, comercializador)
+            self._resumir_salida(df)
+        except KeyError as e:
+            raise ValueError(f"Al CSV generado le falta la columna {e}") from e
+        emitir(self.progreso, "etapa", nombre="conversion_json")
+        return ResultadoMemoria(csv_content, df, self.csv_to_json.convertir_df(df))
+
+    def guardar_resultado(self, resultado, directorio, nombre):
+        """Escribe el CSV y el JSON de un resultado en memoria, una vez cada uno"""
+        csv_name, json_name = self.nombres_salida(nombre)
+        os.makedirs(directorio, exist_ok=True)
+        csv_path = os.path.join(directorio, csv_name)
+        json_path = os.path.join(directorio, json_name)
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write(resultado.csv)
+        with open(json_path, "wb") as f:
+            f.write(self.csv_to_json.serializar(resultado.json))
+        return csv_path, json_path
+
+    def _agrupar_csv_por_mercado(self, csv_path, directorio):
+        """
+        Lee el CSV (ruta o buffer) por bloques y reparte sus filas en un archivo temporal por
+        mercado, calculando las estadísticas de entrada en una sola pasada.
+
+        Returns:
+            tuple: (encabezado, lista de (mercado, ruta), total de filas)
+        """
+        import pandas as pd
+
+        config = CSV_STREAMING_CONFIG
+        columna_mercado = config["columna_mercado"]
+        rutas = {}
+        columnas = None
+        total_filas = 0
+
+        lector = pd.read_csv(csv_path, chunksize=config["chunksize"], dtype=str,
+                             keep_default_na=False)
+        for bloque in lector:
+            if columnas is None:
+                columnas = bloque.columns.tolist()
+                print("\nInformación del CSV de entrada (por bloques):")
+                print(f"Columnas disponibles: {columnas}")
+
+            # Descartar filas completamente vacías
+            bloque = bloque[(bloque != "").any(axis=1)]
+            total_filas += len(bloque)
+
+            if columna_mercado in bloque.columns:
+                grupos = bloque.groupby(columna_mercado, sort=False)
+            else:
+                grupos = [("", bloque)]
+
+            for mercado, grupo in grupos:
+                if mercado not in rutas:
+                    rutas[mercado] = os.path.join(directorio, f"mercado_{len(rutas)}.csv")
+                grupo.to_csv(rutas[mercado], mode="a", header=False, index=False)
+
+        if columnas is None:
+            return None, [], 0
+
+        if columna_mercado in columnas:
+            print(f"Mercados únicos en {columna_mercado}: {sorted(rutas)}")
+            print(f"Total de mercados únicos: {len(rutas)}")
+        print(f"Total de filas: {total_filas}")
+
+        encabezado = ",".join(columnas)
+        return encabezado, sorted(rutas.items()), total_filas
+
+    def _generar_lotes_csv(self, encabezado, grupos, max_caracteres=None):
+        """
+        Genera porciones de CSV (con encabezado) de tamaño acotado. Las filas de
+        un mismo mercado se mantienen juntas siempre que quepan en una porción.
+        """
+        max_caracteres = max_caracteres or CSV_STREAMING_CONFIG["max_caracteres_lote"]
+        lineas = []
+        tamano = len(encabezado)
+
+        for _, ruta in grupos:
+            tamano_mercado = os.path.getsize(ruta)
+            # Empezar una porción nueva si el mercado completo no cabe en la actual
+            if lineas and tamano + tamano_mercado > max_caracteres:
+                yield encabezado + "\n" + "".join(lineas)
+                lineas, tamano = [], len(encabezado)
+
+            with open(ruta, "r", encoding="utf-8") as f:
+                for linea in f:
+                    if lineas and tamano + len(linea) > max_caracteres:
+                        yield encabezado + "\n" + "".join(lineas)
+                        lineas, tamano = [], len(encabezado)
+                    lineas.append(linea)
+                    tamano += len(linea)
+
+        if lineas:
+            yield encabezado + "\n" + "".join(lineas)
+
+    def _procesar_csv_streaming(self, csv_path, comercializador, max_caracteres=None):
+        """
+        Procesa un CSV grande con memoria acotada: lee la entrada por bloques,
+        agrupa las filas por mercado en disco y envía a Claude porciones de
+        tamaño limitado, escribiendo la salida a medida que llega.
+        """
+        output_dir = os.path.join(os.path.dirname(csv_path), "output")
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, self.nombres_salida(csv_path)[0])
+
+        with open(output_path, "w", encoding="utf-8", newline="") as salida:
+            if not self._escribir_csv_streaming(csv_path, comercializador, salida, max_caracteres):
+                return None
+
+        print(f"\n\u2705 Archivo procesado guardado en: {output_path}")
+        return output_path
+
+    def _escribir_csv_streaming(self, origen, comercializador, salida, max_caracteres=None):
+        """
+        Procesa por porciones un CSV (ruta o buffer) y escribe el resultado,
+        normalizado como en _normalizar_salida, en el archivo abierto salida.
+        Devuelve False si alguna porción falla.
+        """
+        instrucciones = self._cargar_instrucciones(comercializador)
+        tokens_instrucciones = self._estimar_tokens(instrucciones)
+
+        tokens_entrada = 0
+        tokens_salida = 0
+        filas_salida = 0
+        mercados_salida = set()
+        niveles_salida = []
+
+        with tempfile.TemporaryDirectory() as directorio:
+            emitir(self.progreso, "etapa", nombre="lectura_csv")
+            encabezado, grupos, total_filas = self._agrupar_csv_por_mercado(origen, directorio)
+            if not total_filas:
+                print("El CSV de entrada no contiene filas.")
+                return False
+
+            encabezado_escrito = False
+
+            for num_lote, lote in enumerate(self._generar_lotes_csv(encabezado, grupos, max_caracteres), 1):
+                tokens_entrada += self._estimar_tokens(lote) + tokens_instrucciones
+                print(f"\nEnviando porción {num_lote} del CSV a Claude ({len(lote)} caracteres)...")
+                emitir(self.progreso, "lote", lote=num_lote, filas_salida=filas_salida)
+                resultado = self.claude_api.procesar_texto(lote, instrucciones)
+                if not resultado:
+                    print(f"No se obtuvo respuesta de Claude para la porción {num_lote}.")
+                    return False
+                tokens_salida += self._estimar_tokens(resultado)
+
+                # Misma normalización que el camino en memoria, porción a porción
+                _, df = self._normalizar_salida(resultado, comercializador)
+                df.to_csv(salida, header=not encabezado_escrito, index=False)
+                encabezado_escrito = True
+
+                filas_salida += len(df)
+                mercados_salida.update(df["Mercado"].astype(str))
+                for nivel in df["Nivel de Tensión"].astype(str):
+                    if nivel not in niveles_salida:
+                        niveles_salida.append(nivel)
+
+        print(f"\nTokens de entrada (estimado): {tokens_entrada}")
+        print(f"Tokens de salida (estimado): {tokens_salida}")
+        print(f"Tokens totales (entrada + salida): {tokens_entrada + tokens_salida}")
+
+        print("\nInformación del CSV de salida:")
+        print(f"Total de filas: {filas_salida}")
+        print(f"Mercados únicos: {sorted(mercados_salida)}")
+        print(f"Total de mercados únicos: {len(mercados_salida)}")
+        print(f"Niveles de tensión únicos: {niveles_salida}")
+        return True
+
 if __name__ == '__main__':
     if len(sys.argv) < 3:
         print("Uso: python tarifas_processor.py <ruta_archivo> <comercializador>")
@@ -0,0 +1,339 @@
+"""
+Ingesta automática: vigila los directorios de entrada (VIGILANCIA_CONFIG) y
+procesa cada PDF o CSV nuevo cuando termina de escribirse.
+
+El comercializador se toma del nombre de una subcarpeta (entrada/VATIA/...)
+o se detecta a partir del contenido, y el periodo de una subcarpeta con
+formato AAAA-MM o de la fecha del archivo. Las salidas se escriben en
+salida/<periodo>/<comercializador>/. Los archivos ya procesados se saltan por
+hash de contenido, de modo que reiniciar el servicio no repite trabajo.
+
+En Linux se usa inotify si está instalado inotify_simple; en otro caso los
+directorios se revisan periódicamente.
+
+Uso:
+    python src/main.py --vigilar [DIRECTORIO ...] [--salida DIR] [--workers N] [--una-vez]
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Agregar el directorio raíz al path de Python
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+from config.config import VIGILANCIA_CONFIG
+from config.comercializadores import COMERCIALIZADORES
+from src.tarifas_processor import TarifasElectricasProcessor
+from src.worker import AUTO, procesar_documento, resolver_comercializador
+from utils.circuito import CircuitoAbierto
+from utils.comparativo import ComparativoTarifas
+from utils.normalizacion import normalizar_comercializador
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+PROCESADO = "procesado"
+ERROR = "fallido"
+
+_PERIODO = re.compile(r"^\d{4}-\d{2}$")
+
+class RegistroProcesados:
+    """
+    Registro en SQLite de los archivos procesados. Cada contenido (hash) se
+    procesa una sola vez; la ruta, el tamaño y la fecha de cada archivo visto
+    evitan volver a calcular el hash de los que no cambiaron.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or VIGILANCIA_CONFIG["registro"]
+        self._lock = threading.Lock()
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("""
+            CREATE TABLE IF NOT EXISTS procesados (
+                hash TEXT PRIMARY KEY,
+                comercializador TEXT,
+                estado TEXT NOT NULL,
+                salida TEXT,
+                error TEXT,
+                fecha REAL NOT NULL
+            )
+        """)
+        self._conexion.execute("""
+            CREATE TABLE IF NOT EXISTS vistos (
+                ruta TEXT PRIMARY KEY,
+                tamano INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                hash TEXT NOT NULL
+            )
+        """)
+
+    def vistos(self):
+        """Ruta -> (tamaño, fecha) de los archivos ya resueltos"""
+        with self._lock:
+            filas = self._conexion.execute("SELECT ruta, tamano, mtime FROM vistos").fetchall()
+        return {ruta: (tamano, mtime) for ruta, tamano, mtime in filas}
+
+    def estado(self, hash_archivo):
+        with self._lock:
+            fila = self._conexion.execute("SELECT estado FROM procesados WHERE hash = ?", (hash_archivo,)).fetchone()
+        return fila[0] if fila else None
+
+    def marcar_visto(self, ruta, tamano, mtime, hash_archivo):
+        with self._lock:
+            self._conexion.execute("INSERT OR REPLACE INTO vistos VALUES (?, ?, ?, ?)",
+                                   (ruta, tamano, mtime, hash_archivo))
+
+    def registrar(self, hash_archivo, comercializador, estado, salida=None, error=None):
+        with self._lock:
+            self._conexion.execute("INSERT OR REPLACE INTO procesados VALUES (?, ?, ?, ?, ?, ?)",
+                                   (hash_archivo, comercializador, estado, salida, error, time.time()))
+
+class VigilanteCarpetas:
+    """
+    Detecta archivos nuevos o modificados en los directorios vigilados,
+    espera a que dejen de cambiar (tamaño y fecha estables durante
+    "espera_estable" segundos) y los reparte entre un grupo acotado de
+    hilos. Un archivo en proceso no se vuelve a encolar.
+    """
+
+    def __init__(self, api_key, directorios=None, salida=None, max_workers=None, registro=None, config=None):
+        self.config = dict(VIGILANCIA_CONFIG, **(config or {}))
+        self.api_key = api_key
+        self.directorios = [os.path.abspath(d) for d in (directorios or self.config["directorios"])]
+        self.salida = salida or self.config["salida"]
+        self.max_workers = max_workers or self.config["max_workers"]
+        self.registro = registro or RegistroProcesados(self.config["registro"])
+        self.comparativo = ComparativoTarifas()
+        self.procesador = TarifasElectricasProcessor(api_key)
+        self.extensiones = tuple(e.lower() for e in self.config["extensiones"])
+
+        self._vistos = self.registro.vistos()
+        # Ruta -> (tamaño, fecha, momento en que se vio así por primera vez)
+        self._pendientes = {}
+        # Ruta -> (tamaño, fecha) de los archivos que se están procesando
+        self._en_curso = {}
+        self._hashes_en_curso = set()
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._inotify = None
+        self._directorios_wd = {}
+
+    # --- Descubrimiento ---
+
+    def _es_candidato(self, nombre):
+        nombre = nombre.lower()
+        if nombre.startswith((".", "~$")) or nombre.endswith(tuple(self.config["ignorar"])):
+            return False
+        return nombre.endswith(self.extensiones)
+
+    def _escanear(self, directorio):
+        """Agrega a pendientes los archivos del directorio (y subcarpetas) que no están resueltos"""
+        try:
+            entradas = list(os.scandir(directorio))
+        except OSError as e:
+            print(f"No se pudo leer {directorio}: {e}")
+            return
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False):
+                self._escanear(entrada.path)
+            elif entrada.is_file() and self._es_candidato(entrada.name):
+                self._observar(entrada.path)
+
+    def _observar(self, ruta):
+        try:
+            estado = os.stat(ruta)
+        except OSError:
+            self._pendientes.pop(ruta, None)
+            return
+        firma = (estado.st_size, estado.st_mtime)
+        if self._vistos.get(ruta) == firma or self._en_curso.get(ruta) == firma:
+            self._pendientes.pop(ruta, None)
+            return
+        anterior = self._pendientes.get(ruta)
+        if anterior is None or anterior[:2] != firma:
+            # Nuevo o todavía cambiando: la espera empieza de nuevo
+            self._pendientes[ruta] = (*firma, time.monotonic())
+
+    def _listos(self):
+        """Pendientes cuyo tamaño y fecha no cambiaron durante la espera"""
+        ahora = time.monotonic()
+        listos = []
+        for ruta in list(self._pendientes):
+            self._observar(ruta)
+            pendiente = self._pendientes.get(ruta)
+            if pendiente and pendiente[0] > 0 and ahora - pendiente[2] >= self.config["espera_estable"]:
+                listos.append(ruta)
+        return listos
+
+    # --- inotify ---
+
+    def _vigilar_inotify(self, directorio):
+        mascara = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+        for actual, _, _ in os.walk(directorio):
+            try:
+                self._directorios_wd[self._inotify.add_watch(actual, mascara)] = actual
+            except OSError as e:
+                print(f"No se pudo vigilar {actual}: {e}")
+
+    def _esperar_eventos(self):
+        """Espera eventos de inotify o, sin inotify, vuelve a revisar los directorios"""
+        espera = self.config["espera_estable"] if self._pendientes else self.config["sondeo"]
+        if self._inotify is None:
+            self._detener.wait(espera)
+            for directorio in self.directorios:
+                self._escanear(directorio)
+            return
+
+        for evento in self._inotify.read(timeout=int(espera * 1000)):
+            directorio = self._directorios_wd.get(evento.wd)
+            if directorio is None or not evento.name:
+                continue
+            ruta = os.path.join(directorio, evento.name)
+            if evento.mask & flags.ISDIR:
+                # Carpeta nueva (o movida): se vigila y se revisa su contenido
+                self._vigilar_inotify(ruta)
+                self._escanear(ruta)
+            elif self._es_candidato(evento.name):
+                self._observar(ruta)
+
+    # --- Procesamiento ---
+
+    def _subcarpetas(self, ruta):
+        for directorio in self.directorios:
+            if os.path.commonpath([directorio, ruta]) == directorio:
+                return Path(os.path.relpath(ruta, directorio)).parts[:-1]
+        return ()
+
+    def _contexto(self, ruta, mtime):
+        """(comercializador o None, periodo) a partir de las subcarpetas y la fecha del archivo"""
+        comercializador, periodo = None, None
+        for parte in self._subcarpetas(ruta):
+            codigo = normalizar_comercializador(parte)
+            if codigo in COMERCIALIZADORES:
+                comercializador = codigo
+            elif _PERIODO.match(parte):
+                periodo = parte
+        return comercializador, periodo or time.strftime("%Y-%m", time.localtime(mtime))
+
+    def procesar_archivo(self, ruta, tamano, mtime):
+        """Procesa un archivo estable salvo que su contenido ya se haya procesado"""
+        nombre = os.path.basename(ruta)
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        hash_archivo = hashlib.sha256(datos).hexdigest()
+        with self._lock:
+            # Una copia con el mismo contenido que ya se está procesando no se repite
+            duplicado = hash_archivo in self._hashes_en_curso
+            self._hashes_en_curso.add(hash_archivo)
+        estado = "en proceso" if duplicado else self.registro.estado(hash_archivo)
+        if estado is not None:
+            print(f"Omitido {nombre}: contenido ya {estado}")
+            self.registro.marcar_visto(ruta, tamano, mtime, hash_archivo)
+            if not duplicado:
+                with self._lock:
+                    self._hashes_en_curso.discard(hash_archivo)
+            return
+
+        comercializador, periodo = self._contexto(ruta, mtime)
+        try:
+            comercializador = resolver_comercializador(ruta, nombre, comercializador or AUTO, None, datos)
+            print(f"Procesando {nombre} ({comercializador}, periodo {periodo})")
+            resultado = procesar_documento(datos, nombre, comercializador, None, self.api_key,
+                                           self.comparativo, periodo)
+            directorio = os.path.join(self.salida, periodo, comercializador)
+            csv_path, json_path = self.procesador.guardar_resultado(resultado, directorio, nombre)
+            self.registro.registrar(hash_archivo, comercializador, PROCESADO, salida=csv_path)
+            print(f"✅ {nombre}: {csv_path}")
+        except CircuitoAbierto:
+            # No es un fallo del archivo: no se registra y se vuelve a intentar (ver _despachar)
+            raise
+        except Exception as e:
+            # Un archivo que falla no se reintenta hasta que cambie su contenido
+            self.registro.registrar(hash_archivo, comercializador, ERROR, error=str(e))
+            print(f"❌ {nombre}: {e}")
+        finally:
+            with self._lock:
+                self._hashes_en_curso.discard(hash_archivo)
+        self.registro.marcar_visto(ruta, tamano, mtime, hash_archivo)
+
+    def _despachar(self, pool, ruta):
+        tamano, mtime, _ = self._pendientes.pop(ruta)
+        with self._lock:
+            self._en_curso[ruta] = (tamano, mtime)
+
+        def tarea():
+            aplazar = None
+            try:
+                self.procesar_archivo(ruta, tamano, mtime)
+            except CircuitoAbierto as e:
+                print(f"⏸ {os.path.basename(ruta)}: {e}")
+                aplazar = e.reintentar_en
+            except OSError as e:
+                print(f"No se pudo leer {ruta}: {e}")
+            finally:
+                with self._lock:
+                    if aplazar is None:
+                        self._vistos[ruta] = (tamano, mtime)
+                    else:
+                        # Vuelve a pendientes hasta que el circuito deje pasar una llamada de prueba
+                        self._pendientes[ruta] = (tamano, mtime, time.monotonic() + aplazar)
+                    self._en_curso.pop(ruta, None)
+
+        pool.submit(tarea)
+
+    def ejecutar(self, una_vez=False):
+        """
+        Ciclo principal. Con una_vez se procesan los archivos presentes y se
+        termina al vaciar la cola.
+        """
+        for directorio in self.directorios:
+            os.makedirs(directorio, exist_ok=True)
+        if INotify is not None and not una_vez:
+            self._inotify = INotify()
+            for directorio in self.directorios:
+                self._vigilar_inotify(directorio)
+        modo = "inotify" if self._inotify else f"revisión cada {self.config['sondeo']} s"
+        print(f"Vigilando {', '.join(self.directorios)} ({modo}, {self.max_workers} workers)")
+
+        for directorio in self.directorios:
+            self._escanear(directorio)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while not self._detener.is_set():
+                for ruta in self._listos():
+                    with self._lock:
+                        ocupado = ruta in self._en_curso
+                        lleno = len(self._en_curso) >= self.max_workers
+                    # Los demás esperan en pendientes: la cola del pool no crece sin límite
+                    if lleno:
+                        break
+                    if not ocupado:
+                        self._despachar(pool, ruta)
+                if una_vez and not self._pendientes:
+                    with self._lock:
+                        if not self._en_curso:
+                            break
+                self._esperar_eventos()
+
+    def detener(self):
+        self._detener.set()
+
+def vigilar(api_key, directorios=None, salida=None, max_workers=None, una_vez=False):
+    vigilante = VigilanteCarpetas(api_key, directorios, salida, max_workers)
+    try:
+        vigilante.ejecutar(una_vez)
+    except KeyboardInterrupt:
+        print("Deteniendo; los archivos en proceso terminan antes de salir")
+        vigilante.detener()
@@ -0,0 +1,313 @@
+"""
+Worker de procesamiento: toma trabajos de la cola compartida (COLA_CONFIG),
+los procesa con TarifasElectricasProcessor y publica los resultados en el
+almacén. Varios workers, en esta u otras máquinas, pueden atender la misma
+cola mientras compartan el backend de cola y el directorio del almacén.
+
+Uso:
+    python -m src.worker [--hilos N] [--nombre NOMBRE]
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path de Python
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+from dotenv import load_dotenv
+from src.tarifas_processor import TarifasElectricasProcessor
+from utils.progreso import emitir
+from utils.detector_comercializador import detectar_comercializador
+from utils.comparativo import ComparativoTarifas
+from utils.almacenamiento import AlmacenArtefactos
+from utils.coalescencia import obtener_coalescedor, clave_trabajo, version_instrucciones
+from utils.circuito import CircuitoAbierto, ResultadosAnteriores
+from config.config import CIRCUITO_CONFIG
+from utils.cola_trabajos import obtener_cola
+from utils.perfilado import perfilar, nombres_perfil
+
+AUTO = "AUTO"
+
+def resolver_comercializador(original_path, original_name, comercializador, progreso=None, datos=None):
+    """
+    Devuelve el comercializador elegido por el usuario o, si no eligió
+    ninguno (o eligió AUTO), el detectado a partir del contenido del archivo.
+    """
+    if comercializador and comercializador != AUTO:
+        return comercializador
+
+    deteccion = detectar_comercializador(original_path, original_name, datos)
+    emitir(progreso, "deteccion", comercializador=deteccion.comercializador,
+           confianza=deteccion.confianza, puntajes=deteccion.puntajes)
+    if not deteccion.comercializador:
+        raise ValueError(
+            "No se pudo detectar el comercializador automáticamente "
+            f"(confianza {deteccion.confianza:.2f}). Selecciónalo manualmente."
+        )
+    print(f"Comercializador detectado: {deteccion.comercializador} (confianza {deteccion.confianza:.2f})")
+    return deteccion.comercializador
+
+def procesar_documento(datos, original_name, comercializador, progreso=None, api_key=None, comparativo=None,
+                       periodo=None):
+    """
+    Procesa en memoria un archivo subido (sus bytes) y lo convierte a JSON.
+
+    Returns:
+        ResultadoMemoria: CSV, DataFrame y estructura JSON del resultado
+
+    Raises:
+        ValueError: si alguna de las salidas no se generó correctamente
+        CircuitoAbierto: si la API de Claude está marcada como caída
+
+    Los errores de Claude y de red (timeouts, 5xx, conexión) se propagan tal
+    cual para que el trabajo se reintente en la cola.
+    """
+    processor = TarifasElectricasProcessor(api_key=api_key, progreso=progreso)
+    resultado = processor.procesar_en_memoria(datos, original_name, comercializador, periodo=periodo)
+    if resultado is None or resultado.df.empty:
+        raise ValueError("El archivo CSV de salida no se generó correctamente")
+
+    # Incorporar la publicación a la tabla comparativa
+    if comparativo is not None:
+        try:
+            comparativo.actualizar(resultado.df.to_dict(orient="records"), original_name)
+        except Exception as e:
+            print(f"No se pudo actualizar el comparativo: {e}")
+
+    return resultado
+
+class Trabajador:
+    """
+    Consume la cola de trabajos. Cada trabajo reservado se procesa con un
+    latido que renueva la reserva; si el proceso muere, la reserva vence y
+    otro worker lo retoma. Los errores de validación (ValueError) son
+    definitivos; los demás se reintentan mientras queden intentos. Con el
+    circuito de Claude abierto se sirve el último resultado del documento,
+    marcado como desactualizado, o el trabajo falla de inmediato.
+    """
+
+    def __init__(self, cola, almacen, api_key=None, nombre=None, comparativo=None, coalescedor=None,
+                 anteriores=None):
+        self.cola = cola
+        self.almacen = almacen
+        self.api_key = api_key
+        self.nombre = nombre or f"{socket.gethostname()}-{os.getpid()}"
+        self.comparativo = comparativo or ComparativoTarifas()
+        self.coalescedor = coalescedor or obtener_coalescedor()
+        self.anteriores = anteriores or ResultadosAnteriores()
+        self._detener = threading.Event()
+
+    def _publicar(self, job_id, original_name, comercializador, csv_bytes, json_bytes):
+        """Escribe el CSV y el JSON en el almacén y devuelve su descripción"""
+        csv_name, json_name = TarifasElectricasProcessor.nombres_salida(original_name)
+        self.almacen.publicar_datos(job_id, csv_name, csv_bytes)
+        self.almacen.publicar_datos(job_id, json_name, json_bytes)
+        manifiesto = self.almacen.manifiesto(job_id)["archivos"]
+        return {
+            "comercializador": comercializador,
+            "archivos": {nombre: manifiesto[nombre]["hash"] for nombre in (csv_name, json_name)},
+            "csv": csv_name,
+            "json": json_name
+        }
+
+    def _resultado_anterior(self, job_id, original_name, hash_archivo, comercializador, progreso, error):
+        """
+        Con el circuito de Claude abierto, publica el último resultado correcto
+        del documento (o del comercializador, si está permitido) marcado como
+        desactualizado. Si no lo hay, vuelve a lanzar el error.
+        """
+        anterior = None
+        if CIRCUITO_CONFIG["resultado_anterior"]:
+            anterior = self.anteriores.buscar(hash_archivo, comercializador,
+                                              CIRCUITO_CONFIG["anterior_por_comercializador"])
+        if anterior is None:
+            raise error
+        print(f"Claude no disponible: se sirve el resultado del {anterior['fecha']} ({anterior['origen']})")
+        progreso.emitir("circuito_abierto", reintentar_en=round(error.reintentar_en),
+                        fecha_resultado=anterior["fecha"], origen=anterior["origen"])
+        resultado = self._publicar(job_id, original_name, comercializador,
+                                   anterior["csv"].encode("utf-8"), anterior["json"])
+        return dict(resultado, desactualizado=True, fecha_resultado=anterior["fecha"])
+
+    def ejecutar_trabajo(self, progreso, job_id, datos):
+        """
+        Procesa un archivo y publica sus resultados en el almacén.
+
+        Si ya hay un trabajo en curso con el mismo archivo, comercializador y
+        versión de instrucciones (en este proceso o en otro), este se une a él
+        y recibe los mismos resultados en lugar de volver a llamar a Claude.
+
+        Returns:
+            dict: nombres de descarga del CSV y del JSON
+        """
+        original_path, original_name = datos["original_path"], datos["original_name"]
+        progreso.emitir("etapa", nombre="inicio", archivo=original_name, comercializador=datos["comercializador"])
+        # El archivo subido se lee una vez; detección, extracción y conversión trabajan sobre estos bytes
+        with open(original_path, "rb") as f:
+            subida = f.read()
+        comercializador = resolver_comercializador(
+            original_path, original_name, datos["comercializador"], progreso, subida)
+        # Versión de las instrucciones con las que se procesa (ValueError si el comercializador no está disponible)
+        version = version_instrucciones(comercializador)
+
+        def procesar():
+            from utils.csv_to_json_converter import CSVToJSONConverter
+
+            try:
+                resultado = procesar_documento(
+                    subida, original_name, comercializador, progreso, self.api_key, self.comparativo)
+            except CircuitoAbierto as e:
+                return self._resultado_anterior(job_id, original_name, datos.get("hash_archivo"),
+                                                comercializador, progreso, e)
+            # Los resultados se escriben una sola vez, directamente en el almacén
+            json_bytes = CSVToJSONConverter().serializar(resultado.json)
+            publicado = self._publicar(job_id, original_name, comercializador,
+                                       resultado.csv.encode("utf-8"), json_bytes)
+            if datos.get("hash_archivo"):
+                try:
+                    self.anteriores.guardar(datos["hash_archivo"], comercializador, resultado.csv, json_bytes)
+                except Exception as e:
+                    print(f"No se pudo guardar el resultado para servirlo si Claude no responde: {e}")
+            return dict(publicado, version_instrucciones=version)
+
+        def al_unirse(lider):
+            progreso.emitir("coalescido", lider=lider)
+
+        # Un trabajo perfilado se procesa siempre por su cuenta, sin unirse a otro
+        with perfilar(datos.get("perfilar"), original_name) as perfil:
+            if datos.get("hash_archivo") and not perfil:
+                clave = clave_trabajo(datos["hash_archivo"], comercializador, version)
+                resultado = self.coalescedor.ejecutar(clave, procesar, lider=job_id, al_unirse=al_unirse)
+            else:
+                resultado = procesar()
+        if perfil:
+            # El perfil es accesorio: si no se puede guardar, el trabajo termina igual
+            try:
+                informe, binario = nombres_perfil(original_name)
+                self.almacen.publicar_datos(job_id, informe, perfil.informe().encode("utf-8"))
+                resultado = dict(resultado, perfil=informe)
+                datos_perfil = perfil.datos()
+                if datos_perfil is not None:
+                    self.almacen.publicar_datos(job_id, binario, datos_perfil)
+                    resultado["perfil_binario"] = binario
+            except Exception as e:
+                print(f"No se pudo guardar el perfil de {original_name}: {e}")
+
+        # Un trabajo unido a otro enlaza los objetos que publicó el líder
+        if not self.almacen.manifiesto(job_id):
+            for nombre, contenido in resultado["archivos"].items():
+                if not self.almacen.vincular(job_id, nombre, contenido):
+                    raise ValueError("Los resultados del trabajo compartido ya no están disponibles")
+        return resultado
+
+    def procesar(self, reserva):
+        """Procesa una reserva manteniendo su latido hasta terminar"""
+        job_id = reserva.job_id
+        progreso = self.cola.canal(job_id)
+        detener_latido = threading.Event()
+
+        def latir():
+            while not detener_latido.wait(self.cola.config["latido"]):
+                if not self.cola.renovar(job_id, reserva.token):
+                    print(f"[{self.nombre}] Se perdió la reserva del trabajo {job_id}")
+                    return
+
+        threading.Thread(target=latir, daemon=True).start()
+        self.almacen.crear_trabajo(job_id)
+        definitivo = True
+        try:
+            resultado = self.ejecutar_trabajo(progreso, job_id, reserva.datos)
+            extra = {c: resultado[c] for c in ("perfil", "perfil_binario", "desactualizado", "fecha_resultado",
+                                               "version_instrucciones") if c in resultado}
+            progreso.emitir("completado", csv=resultado["csv"], json=resultado["json"],
+                            comercializador=resultado["comercializador"], **extra)
+            self.cola.completar(job_id, reserva.token)
+
+        except ValueError as e:
+            progreso.emitir("error", mensaje=str(e))
+            self.cola.fallar(job_id, reserva.token, e)
+
+        except CircuitoAbierto as e:
+            # Falla de inmediato: reintentar ahora volvería a encontrar el circuito abierto
+            progreso.emitir("error", mensaje=str(e), reintentar_en=round(e.reintentar_en))
+            self.cola.fallar(job_id, reserva.token, e)
+
+        except Exception as e:
+            definitivo = reserva.intentos >= self.cola.config["max_intentos"]
+            if definitivo:
+                progreso.emitir("error", mensaje=f'Error al procesar el archivo: {str(e)}')
+            else:
+                progreso.emitir("trabajo_reintento", intento=reserva.intentos, mensaje=str(e))
+            self.cola.fallar(job_id, reserva.token, e, reintentar=True)
+
+        finally:
+            detener_latido.set()
+            if definitivo:
+                # Se eliminan el archivo subido y los intermedios; los resultados quedan en el almacén
+                self.almacen.finalizar_trabajo(job_id)
+            else:
+                # El archivo subido se conserva para el siguiente intento
+                self.almacen.soltar_trabajo(job_id)
+
+    def ejecutar(self):
+        """Ciclo principal: reserva y procesa trabajos hasta que se detenga"""
+        print(f"[{self.nombre}] Esperando trabajos")
+        while not self._detener.is_set():
+            try:
+                reserva = self.cola.reservar(self.nombre)
+            except Exception as e:
+                print(f"[{self.nombre}] Error al consultar la cola: {e}")
+                reserva = None
+            if reserva is None:
+                self._detener.wait(self.cola.config["sondeo"])
+                continue
+            print(f"[{self.nombre}] Trabajo {reserva.job_id} (intento {reserva.intentos})")
+            try:
+                self.procesar(reserva)
+            except Exception as e:
+                # Un fallo al emitir o al actualizar la cola (p. ej. "database is locked")
+                # no debe detener el worker; la reserva vence y el trabajo se retoma
+                print(f"[{self.nombre}] Error inesperado en el trabajo {reserva.job_id}: {e}")
+                self._detener.wait(self.cola.config["sondeo"])
+
+    def iniciar(self):
+        """Ejecuta el ciclo en un hilo en segundo plano"""
+        hilo = threading.Thread(target=self.ejecutar, name=self.nombre, daemon=True)
+        hilo.start()
+        return hilo
+
+    def detener(self):
+        self._detener.set()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hilos", type=int, default=1, help="Trabajos simultáneos en este proceso")
+    parser.add_argument("--nombre", default=f"{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(root_dir, 'private', '.env'))
+    cola = obtener_cola()
+    almacen = AlmacenArtefactos()
+    comparativo = ComparativoTarifas()
+    trabajadores = [
+        Trabajador(cola, almacen, os.getenv('ANTHROPIC_API_KEY'), f"{args.nombre}-{i}", comparativo)
+        for i in range(args.hilos)
+    ]
+    hilos = [t.iniciar() for t in trabajadores]
+    try:
+        while any(h.is_alive() for h in hilos):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Deteniendo workers; los trabajos en curso terminan antes de salir")
+        for t in trabajadores:
+            t.detener()
+        for h in hilos:
+            h.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import pytest
+from utils.circuito import ABIERTO, CERRADO, SEMIABIERTO, Circuito, CircuitoAbierto
+
+class Reloj:
+    """Reloj manual para recorrer las esperas sin dormir"""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+@pytest.fixture
+def circuito(reloj):
+    return Circuito({"habilitado": True, "umbral_fallos": 3, "espera": 60, "sondeos": 1}, reloj=reloj)
+
+def _fallar(circuito, veces):
+    for _ in range(veces):
+        circuito.fallo(circuito.permitir())
+
+def test_se_abre_tras_el_umbral_de_fallos(circuito):
+    _fallar(circuito, 2)
+    assert circuito.estado == CERRADO
+    _fallar(circuito, 1)
+    assert circuito.estado == ABIERTO
+    with pytest.raises(CircuitoAbierto) as error:
+        circuito.permitir()
+    assert error.value.reintentar_en == 60
+
+def test_un_exito_reinicia_los_fallos(circuito):
+    _fallar(circuito, 2)
+    circuito.exito(circuito.permitir())
+    _fallar(circuito, 2)
+    assert circuito.estado == CERRADO
+
+def test_semiabierto_tras_la_espera_y_cierra_con_exito(circuito, reloj):
+    _fallar(circuito, 3)
+    reloj.ahora += 61
+    sondeo = circuito.permitir()
+    assert sondeo is True
+    assert circuito.estado == SEMIABIERTO
+    # Solo una llamada de prueba a la vez
+    with pytest.raises(CircuitoAbierto):
+        circuito.permitir()
+    circuito.exito(sondeo)
+    assert circuito.estado == CERRADO
+    assert circuito.permitir() is False
+
+def test_sondeo_fallido_vuelve_a_abrir(circuito, reloj):
+    _fallar(circuito, 3)
+    reloj.ahora += 61
+    circuito.fallo(circuito.permitir())
+    assert circuito.estado == ABIERTO
+    assert circuito.resumen()["reintentar_en"] == 60
+
+def test_liberar_devuelve_el_turno_de_prueba(circuito, reloj):
+    _fallar(circuito, 3)
+    reloj.ahora += 61
+    circuito.liberar(circuito.permitir())
+    assert circuito.permitir() is True
+
+def test_comprobar_no_reserva_llamadas(circuito, reloj):
+    circuito.comprobar()
+    _fallar(circuito, 3)
+    with pytest.raises(CircuitoAbierto):
+        circuito.comprobar()
+    reloj.ahora += 61
+    circuito.comprobar()
+    assert circuito.estado == ABIERTO
+
+def test_deshabilitado_siempre_permite(reloj):
+    circuito = Circuito({"habilitado": False, "umbral_fallos": 1}, reloj=reloj)
+    _fallar(circuito, 5)
+    assert circuito.permitir() is False
+    assert circuito.estado == CERRADO
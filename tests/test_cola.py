@@ -0,0 +1,70 @@
+import pytest
+from utils.cola_trabajos import ERROR, PENDIENTE, RESERVADO, TERMINADO, ColaSQLite
+
+@pytest.fixture
+def cola(tmp_path):
+    return ColaSQLite(str(tmp_path / "cola.sqlite"), {"visibilidad": 60, "max_intentos": 2})
+
+def test_reserva_en_orden_de_llegada(cola):
+    cola.encolar("a", {"archivo": "a.pdf"})
+    cola.encolar("b", {"archivo": "b.pdf"})
+    primera = cola.reservar("w1")
+    segunda = cola.reservar("w2")
+    assert (primera.job_id, primera.datos, primera.intentos) == ("a", {"archivo": "a.pdf"}, 1)
+    assert segunda.job_id == "b"
+    assert cola.reservar("w3") is None
+
+def test_completar_exige_el_token_de_la_reserva(cola):
+    cola.encolar("a", {})
+    reserva = cola.reservar("w1")
+    assert not cola.completar("a", "otro-token")
+    assert cola.completar("a", reserva.token)
+    assert cola.resumen() == {TERMINADO: 1}
+    assert not cola.renovar("a", reserva.token)
+
+def test_fallo_con_reintento_vuelve_a_la_cola(cola):
+    cola.encolar("a", {})
+    reserva = cola.reservar("w1")
+    assert cola.fallar("a", reserva.token, "429", reintentar=True)
+    assert cola.resumen() == {PENDIENTE: 1}
+    otra = cola.reservar("w2")
+    assert otra.intentos == 2 and otra.token != reserva.token
+    # Sin intentos restantes el reintento termina en error
+    assert cola.fallar("a", otra.token, "429", reintentar=True)
+    assert cola.resumen() == {ERROR: 1}
+    assert cola.reservar("w3") is None
+
+def test_fallo_sin_reintento_termina_en_error(cola):
+    cola.encolar("a", {})
+    reserva = cola.reservar("w1")
+    assert cola.fallar("a", reserva.token, "archivo inválido")
+    assert cola.resumen() == {ERROR: 1}
+
+def test_reserva_vencida_la_toma_otro_worker(tmp_path):
+    cola = ColaSQLite(str(tmp_path / "cola.sqlite"), {"visibilidad": -1, "max_intentos": 2})
+    cola.encolar("a", {})
+    primera = cola.reservar("w1")
+    segunda = cola.reservar("w2")
+    assert segunda.job_id == "a" and segunda.intentos == 2
+    # El worker original ya no puede completar el trabajo
+    assert not cola.completar("a", primera.token)
+    # Agotados los intentos, la siguiente reserva lo marca como error
+    assert cola.reservar("w3") is None
+    assert cola.resumen() == {ERROR: 1}
+    assert cola.eventos("a")[-1]["etapa"] == "error"
+
+def test_cancelar_solo_pendientes(cola):
+    cola.encolar("a", {})
+    cola.encolar("b", {})
+    cola.reservar("w1")
+    assert not cola.cancelar("a")
+    assert cola.cancelar("b")
+    assert cola.resumen() == {RESERVADO: 1, ERROR: 1}
+
+def test_eventos_por_trabajo(cola):
+    cola.encolar("a", {})
+    cola.emitir("a", "claude", intento=1)
+    eventos = cola.eventos("a")
+    assert [e["etapa"] for e in eventos] == ["encolado", "claude"]
+    assert cola.eventos("a", desde=eventos[0]["id"])[0]["intento"] == 1
+    assert cola.existe("a") and not cola.existe("z")
@@ -0,0 +1,83 @@
+import os
+import shutil
+import pytest
+from utils.detector_comercializador import DetectorComercializador
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Archivos de ejemplo del repositorio y el comercializador que publica cada uno
+MUESTRAS = [
+    ("uploads/Julio_22_de_2025_-_Publicacion_de_Tarifas_ETTC_1.csv", "ENERTOTAL"),
+    ("uploads/PUBLICACION-TARIFAS-QI-DE-JULIO-2025.csv", "QI"),
+    ("uploads/Tarifas-jun25.csv", "ENERBIT"),
+    ("uploads/Untitled_spreadsheet_-_Table_1_3.csv", "ENERTOTAL"),
+    ("uploads/Untitled_spreadsheet_-_Table_1_4.csv", "ENELX"),
+    ("uploads/Untitled_spreadsheet_-_Table_1_5.csv", "ENERTOTAL"),
+    ("uploads/enel_x_junio_-_Table_1.csv", "ENELX"),
+    ("uploads/qi_junio_-_Table_1.csv", "QI"),
+    ("uploads/tarifas_enertotal_julio_-_Table_1.csv", "ENERTOTAL"),
+    ("pdfs/data (7).csv", "VATIA"),
+    ("pdfs/data (7)_procesado.csv", "VATIA"),
+    ("pdfs/Tarifas_Enel_X_22_de_abril-37009a10-9e13-41c9-a4fe-3a2b12b931d9.pdf", "ENELX"),
+]
+
+@pytest.fixture(scope="module")
+def detector():
+    return DetectorComercializador()
+
+@pytest.mark.parametrize("archivo,esperado", MUESTRAS)
+def test_detecta_archivos_de_ejemplo(detector, archivo, esperado):
+    ruta = os.path.join(RAIZ, archivo)
+    if not os.path.exists(ruta):
+        pytest.skip(f"{archivo} no está en el repositorio")
+    deteccion = detector.detectar_archivo(ruta)
+    assert deteccion.comercializador == esperado, deteccion.puntajes
+
+def test_detecta_desde_bytes_sin_leer_el_disco(detector):
+    ruta = os.path.join(RAIZ, "uploads", "qi_junio_-_Table_1.csv")
+    if not os.path.exists(ruta):
+        pytest.skip("archivo de ejemplo ausente")
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    deteccion = detector.detectar_archivo("no-existe.csv", "qi_junio.csv", datos)
+    assert deteccion.comercializador == "QI"
+
+def test_sin_evidencia_no_elige(detector):
+    deteccion = detector.detectar("texto sin relación con ninguna tarifa")
+    assert deteccion.comercializador is None
+    assert deteccion.confianza == 0.0
+
+class _OCRFalso:
+    """Procesador de imágenes que devuelve un texto fijo"""
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.llamadas = 0
+
+    def extraer_texto_de_imagen(self, imagen):
+        self.llamadas += 1
+        return self.texto
+
+def test_pdf_escaneado_usa_ocr():
+    ruta = os.path.join(RAIZ, "pdfs", "Tarifas-abril25.pdf")
+    if not os.path.exists(ruta):
+        pytest.skip("archivo de ejemplo ausente")
+    ocr = _OCRFalso("ENERBIT S.A.S. E.S.P. CU1 Prop, OR CU12 Prop, Mixta")
+    deteccion = DetectorComercializador(image_processor=ocr).detectar_archivo(ruta)
+    assert ocr.llamadas == 1
+    assert deteccion.comercializador == "ENERBIT"
+
+def test_pdf_escaneado_sin_ocr_no_elige():
+    ruta = os.path.join(RAIZ, "pdfs", "Tarifas-abril25.pdf")
+    if not os.path.exists(ruta):
+        pytest.skip("archivo de ejemplo ausente")
+    ocr = _OCRFalso("ERROR EN OCR")
+    deteccion = DetectorComercializador(image_processor=ocr).detectar_archivo(ruta)
+    assert deteccion.comercializador is None
+
+@pytest.mark.skipif(shutil.which("tesseract") is None, reason="requiere Tesseract instalado")
+def test_pdf_escaneado_con_tesseract(detector):
+    ruta = os.path.join(RAIZ, "pdfs", "Tarifas-abril25.pdf")
+    if not os.path.exists(ruta):
+        pytest.skip("archivo de ejemplo ausente")
+    assert detector.detectar_archivo(ruta).comercializador is not None
@@ -0,0 +1,77 @@
+import pytest
+from config.config import MODELOS_CONFIG
+from utils.claude_api import conciliar_csv
+from utils.enrutador_modelos import EnrutadorModelos, EstadisticasModelos, es_estructurado
+from utils.pronostico import PronosticadorClaude, RegistroUso
+
+CABECERA = "Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT"
+
+def _fila(cu=None, cot=10.0, cu_cot=None, comercializador="VATIA"):
+    g, t, d, c, p, r = 400.0, 50.0, 200.0, 40.0, 60.0, 20.0
+    cu = g + t + d + c + p + r if cu is None else cu
+    cu_cot = cu + cot if cu_cot is None else cu_cot
+    return f"{comercializador},BOGOTA,1 OR,{g},{t},{d},{c},{cot},{p},{r},{cu},{cu_cot}"
+
+def _csv(*filas):
+    return "\n".join((CABECERA,) + filas)
+
+def test_conciliacion_correcta():
+    conciliar_csv(_csv(_fila(), _fila(cot=0.0)))
+
+def test_conciliacion_cot_negativo_sumado():
+    # QI publica COT negativo aunque CU + COT es la suma con el valor absoluto
+    conciliar_csv(_csv(_fila(cot=-45.39, cu_cot=770.0 + 45.39, comercializador="QI")))
+
+def test_conciliacion_cot_negativo_restado():
+    conciliar_csv(_csv(_fila(cot=-45.39, cu_cot=770.0 - 45.39, comercializador="QI")))
+
+def test_conciliacion_dentro_de_la_tolerancia():
+    conciliar_csv(_csv(_fila(cu=770.0 * 1.005)))
+
+def test_conciliacion_cu_descuadrado():
+    with pytest.raises(ValueError, match="líneas 3"):
+        conciliar_csv(_csv(_fila(), _fila(cu=900.0)))
+
+def test_conciliacion_cu_cot_descuadrado():
+    with pytest.raises(ValueError, match="1 fila"):
+        conciliar_csv(_csv(_fila(cot=10.0, cu_cot=800.0)))
+
+def test_conciliacion_valor_no_numerico():
+    with pytest.raises(ValueError, match="no numérico"):
+        conciliar_csv(_csv(_fila().replace("400.0", "N/A")))
+
+@pytest.fixture
+def enrutador(tmp_path):
+    # Sin muestras registradas el pronosticador usa los coeficientes iniciales
+    pronosticador = PronosticadorClaude(RegistroUso(str(tmp_path / "uso.jsonl")))
+    return EnrutadorModelos(estadisticas=EstadisticasModelos(str(tmp_path / "modelos.json")),
+                            pronosticador=pronosticador)
+
+def _tabla(caracteres):
+    linea = "BOGOTA,1 OR,412.5,53.8,210.3\n"
+    return linea * (caracteres // len(linea))
+
+def _niveles(enrutador, texto):
+    return [nivel["nombre"] for nivel in enrutador.niveles_para(texto)]
+
+def test_tabla_pequena_empieza_por_el_nivel_rapido(enrutador):
+    texto = _tabla(15000)
+    assert es_estructurado(texto)
+    assert _niveles(enrutador, texto) == ["rapido", "completo"]
+
+def test_tabla_cuya_salida_no_cabe_salta_el_nivel_rapido(enrutador):
+    # Por debajo de max_caracteres_estructurado, pero la salida pronosticada
+    # supera el max_tokens del nivel rápido
+    texto = _tabla(25000)
+    rapido = MODELOS_CONFIG["niveles"][0]
+    assert len(texto) <= rapido["max_caracteres_estructurado"]
+    assert _niveles(enrutador, texto) == ["completo"]
+
+def test_texto_libre_usa_su_propio_limite(enrutador):
+    assert _niveles(enrutador, "Tarifas de energía " * 300) == ["rapido", "completo"]
+    assert _niveles(enrutador, "Tarifas de energía " * 600) == ["completo"]
+
+def test_enrutamiento_deshabilitado(tmp_path):
+    config = dict(MODELOS_CONFIG, habilitado=False)
+    enrutador = EnrutadorModelos(config, EstadisticasModelos(str(tmp_path / "modelos.json")))
+    assert _niveles(enrutador, "corto") == ["completo"]
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from utils.publicador import CheckpointPublicacion, clave_idempotencia, segundos_retry_after
+
+def _carga(exportado, valor=100.0):
+    return {
+        "period": "2025-07-01",
+        "operator_id": 7,
+        "created_at": exportado,
+        "updated_at": exportado,
+        "batch_index": 0,
+        "batch_total": 1,
+        "rates": [{"region_id": 1, "unit_cost": valor, "created_at": exportado, "updated_at": exportado}]
+    }
+
+def test_clave_estable_entre_exportaciones():
+    assert clave_idempotencia(_carga("2025-07-01T10:00:00")) == clave_idempotencia(_carga("2025-07-02T08:30:00"))
+
+def test_clave_cambia_con_los_valores():
+    assert clave_idempotencia(_carga("2025-07-01T10:00:00")) != clave_idempotencia(_carga("2025-07-01T10:00:00", 101.0))
+
+def test_clave_cambia_con_el_lote():
+    otra = dict(_carga("2025-07-01T10:00:00"), batch_index=1)
+    assert clave_idempotencia(_carga("2025-07-01T10:00:00")) != clave_idempotencia(otra)
+
+def test_retry_after_en_segundos():
+    assert segundos_retry_after("7", 1.0) == 7.0
+    assert segundos_retry_after("-3", 1.0) == 0.0
+
+def test_retry_after_fecha_http():
+    fecha = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= segundos_retry_after(fecha, 1.0) <= 30
+
+def test_retry_after_fecha_pasada():
+    assert segundos_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", 1.0) == 0.0
+
+def test_retry_after_acotado_al_maximo():
+    assert segundos_retry_after("86400", 1.0, maximo=60) == 60
+    assert segundos_retry_after("Fri, 01 Jan 2100 00:00:00 GMT", 1.0, maximo=60) == 60
+    assert segundos_retry_after("5", 1.0, maximo=60) == 5.0
+
+def test_retry_after_invalido_o_ausente():
+    assert segundos_retry_after(None, 4.0) == 4.0
+    assert segundos_retry_after("pronto", 4.0) == 4.0
+
+def test_checkpoint_fusiona_lo_registrado_por_otro_proceso(tmp_path):
+    ruta = str(tmp_path / "checkpoint.json")
+    primero = CheckpointPublicacion(ruta)
+    segundo = CheckpointPublicacion(ruta)
+    primero.registrar("a", "archivo#0")
+    segundo.registrar("b", "archivo#1")
+    assert set(CheckpointPublicacion(ruta).enviados) == {"a", "b"}
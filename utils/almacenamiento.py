@@ -0,0 +1,388 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from config.config import ALMACENAMIENTO_CONFIG
+
+try:
+    import brotli  # Dependencia opcional
+except ImportError:
+    brotli = None
+
+MANIFIESTO = "manifiesto.json"
+
+# Marca de un trabajo encolado o en proceso, visible para todos los procesos
+ACTIVO = ".activo"
+
+# Variantes precomprimidas de cada objeto: codificación HTTP -> sufijo
+CODIFICACIONES = {"br": ".br", "gzip": ".gz"}
+
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9_-]+$")
+
+def _hash_archivo(ruta, tamano_bloque):
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+def _tamano_directorio(ruta):
+    total = 0
+    for raiz, _, archivos in os.walk(ruta):
+        for archivo in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, archivo))
+            except OSError:
+                pass
+    return total
+
+class AlmacenArtefactos:
+    """
+    Almacenamiento de los archivos de cada trabajo:
+
+    - trabajos/<job_id>/: archivo subido y archivos intermedios mientras el
+      trabajo está activo, y su manifiesto con los resultados publicados
+    - objetos/<hash>: resultados guardados por contenido, de modo que dos
+      trabajos con la misma salida comparten un único archivo, junto con sus
+      variantes precomprimidas <hash>.gz y <hash>.br (si brotli está instalado)
+
+    Un barrido periódico elimina los trabajos más antiguos que max_edad y,
+    si el total supera max_bytes, los más antiguos hasta volver al límite.
+    Los trabajos activos (encolados o en proceso en cualquier proceso, con
+    la marca .activo) solo se eliminan si la marca supera max_edad, es decir,
+    si quedaron abandonados. Los objetos sin referencias se liberan pasado
+    un periodo de gracia desde su último uso.
+    """
+
+    def __init__(self, directorio=None, config=None):
+        self.config = dict(ALMACENAMIENTO_CONFIG, **(config or {}))
+        self.directorio = directorio or self.config["directorio"]
+        self.dir_trabajos = os.path.join(self.directorio, "trabajos")
+        self.dir_objetos = os.path.join(self.directorio, "objetos")
+        os.makedirs(self.dir_trabajos, exist_ok=True)
+        os.makedirs(self.dir_objetos, exist_ok=True)
+        self._lock = threading.RLock()
+        self._activos = set()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    # --- Trabajos ---
+
+    def _ruta_trabajo(self, job_id):
+        if not _ID_VALIDO.match(job_id or ""):
+            raise ValueError(f"Identificador de trabajo no válido: {job_id}")
+        return os.path.join(self.dir_trabajos, job_id)
+
+    def crear_trabajo(self, job_id):
+        """Crea el directorio del trabajo y lo marca como activo"""
+        ruta = self._ruta_trabajo(job_id)
+        with self._lock:
+            os.makedirs(ruta, exist_ok=True)
+            with open(os.path.join(ruta, ACTIVO), "a"):
+                pass
+            os.utime(os.path.join(ruta, ACTIVO))
+            self._activos.add(job_id)
+        return ruta
+
+    def guardar_subida(self, job_id, nombre, stream):
+        """
+        Escribe el archivo subido en el directorio del trabajo por bloques,
+        sin cargarlo completo en memoria.
+
+        Returns:
+            tuple: (ruta del archivo, hash sha256 del contenido)
+        """
+        ruta = os.path.join(self.crear_trabajo(job_id), nombre)
+        sha = hashlib.sha256()
+        tamano_bloque = self.config["tamano_bloque"]
+        with open(ruta, "wb") as f:
+            for bloque in iter(lambda: stream.read(tamano_bloque), b""):
+                sha.update(bloque)
+                f.write(bloque)
+        return ruta, sha.hexdigest()
+
+    def publicar(self, job_id, ruta, nombre=None):
+        """
+        Mueve un resultado al almacén por contenido y lo registra en el
+        manifiesto del trabajo. Si ya existía un objeto idéntico se reutiliza.
+
+        Returns:
+            str: nombre con el que se descarga el resultado
+        """
+        nombre = nombre or os.path.basename(ruta)
+        contenido = _hash_archivo(ruta, self.config["tamano_bloque"])
+        destino = self.ruta_objeto(contenido)
+        with self._lock:
+            if os.path.exists(destino):
+                os.remove(ruta)
+                # Renovar la fecha para que el barrido lo considere reciente
+                os.utime(destino)
+            else:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                shutil.move(ruta, destino)
+                self._comprimir(destino)
+            self._registrar(job_id, nombre, contenido)
+        return nombre
+
+    def publicar_datos(self, job_id, nombre, datos):
+        """
+        Publica un resultado que está en memoria: se escribe una sola vez,
+        directamente como objeto del almacén, sin archivo intermedio.
+
+        Returns:
+            str: nombre con el que se descarga el resultado
+        """
+        contenido = hashlib.sha256(datos).hexdigest()
+        destino = self.ruta_objeto(contenido)
+        with self._lock:
+            if os.path.exists(destino):
+                os.utime(destino)
+            else:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                # Nombre temporal propio: otro proceso puede estar escribiendo el mismo objeto
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(destino), prefix=f"{contenido}.",
+                                                 suffix=".tmp", delete=False) as f:
+                    f.write(datos)
+                os.replace(f.name, destino)
+                self._comprimir(destino)
+            self._registrar(job_id, nombre, contenido)
+        return nombre
+
+    def vincular(self, job_id, nombre, contenido):
+        """
+        Registra en el manifiesto de un trabajo un objeto ya publicado por
+        otro, sin copiarlo. Devuelve False si el objeto ya no existe.
+        """
+        destino = self.ruta_objeto(contenido)
+        with self._lock:
+            if not os.path.exists(destino):
+                return False
+            os.utime(destino)
+            self._registrar(job_id, nombre, contenido)
+        return True
+
+    def _registrar(self, job_id, nombre, contenido):
+        os.makedirs(self._ruta_trabajo(job_id), exist_ok=True)
+        manifiesto = self.manifiesto(job_id) or {"creado": time.time(), "archivos": {}}
+        manifiesto["archivos"][nombre] = {
+            "hash": contenido,
+            "bytes": os.path.getsize(self.ruta_objeto(contenido)),
+            "publicado": time.time()
+        }
+        self._guardar_manifiesto(job_id, manifiesto)
+
+    def _comprimir(self, destino):
+        """Genera las variantes comprimidas de un objeto, si reducen su tamaño"""
+        tamano = os.path.getsize(destino)
+        if tamano < self.config["comprimir_min_bytes"]:
+            return
+        tamano_bloque = self.config["tamano_bloque"]
+        for codificacion, sufijo in CODIFICACIONES.items():
+            if codificacion == "br" and brotli is None:
+                continue
+            with open(destino, "rb") as origen, tempfile.NamedTemporaryFile(
+                    dir=os.path.dirname(destino), prefix=f"{os.path.basename(destino)}{sufijo}.",
+                    suffix=".tmp", delete=False) as salida:
+                temporal = salida.name
+                if codificacion == "gzip":
+                    with gzip.GzipFile(fileobj=salida, mode="wb", compresslevel=9, mtime=0) as comprimido:
+                        shutil.copyfileobj(origen, comprimido, tamano_bloque)
+                else:
+                    compresor = brotli.Compressor(quality=11)
+                    for bloque in iter(lambda: origen.read(tamano_bloque), b""):
+                        salida.write(compresor.process(bloque))
+                    salida.write(compresor.finish())
+            if os.path.getsize(temporal) < tamano:
+                os.replace(temporal, f"{destino}{sufijo}")
+            else:
+                os.remove(temporal)
+
+    def finalizar_trabajo(self, job_id):
+        """Elimina los archivos intermedios del trabajo y conserva su manifiesto"""
+        ruta = self._ruta_trabajo(job_id)
+        with self._lock:
+            self._activos.discard(job_id)
+            if not os.path.isdir(ruta):
+                return
+            for nombre in os.listdir(ruta):
+                if nombre == MANIFIESTO:
+                    continue
+                archivo = os.path.join(ruta, nombre)
+                if os.path.isdir(archivo):
+                    shutil.rmtree(archivo, ignore_errors=True)
+                else:
+                    os.remove(archivo)
+            if not os.path.exists(os.path.join(ruta, MANIFIESTO)):
+                os.rmdir(ruta)
+
+    def soltar_trabajo(self, job_id):
+        """
+        Deja de proteger el trabajo en este proceso porque lo continúa otro
+        (un worker). La marca .activo sigue protegiéndolo hasta que termine.
+        """
+        with self._lock:
+            self._activos.discard(job_id)
+
+    def eliminar_trabajo(self, job_id):
+        """Elimina el trabajo completo; sus objetos se liberan en el siguiente barrido"""
+        with self._lock:
+            self._activos.discard(job_id)
+            shutil.rmtree(self._ruta_trabajo(job_id), ignore_errors=True)
+
+    def manifiesto(self, job_id):
+        ruta = os.path.join(self._ruta_trabajo(job_id), MANIFIESTO)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _guardar_manifiesto(self, job_id, manifiesto):
+        ruta = os.path.join(self._ruta_trabajo(job_id), MANIFIESTO)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    # --- Descargas ---
+
+    def ruta_objeto(self, contenido):
+        return os.path.join(self.dir_objetos, contenido[:2], contenido)
+
+    def resolver(self, job_id, nombre):
+        """
+        Devuelve (ruta del objeto, entrada del manifiesto) de un resultado
+        publicado, o None si el trabajo o el archivo no existen.
+        """
+        try:
+            manifiesto = self.manifiesto(job_id)
+        except ValueError:
+            return None
+        entrada = (manifiesto or {}).get("archivos", {}).get(nombre)
+        if not entrada:
+            return None
+        ruta = self.ruta_objeto(entrada["hash"])
+        return (ruta, entrada) if os.path.exists(ruta) else None
+
+    def variantes(self, contenido):
+        """Codificaciones precomprimidas disponibles de un objeto: {codificación: ruta}"""
+        base = self.ruta_objeto(contenido)
+        return {
+            codificacion: f"{base}{sufijo}"
+            for codificacion, sufijo in CODIFICACIONES.items()
+            if os.path.exists(f"{base}{sufijo}")
+        }
+
+    # --- Retención ---
+
+    def limpiar(self):
+        """
+        Aplica la política de retención y libera los objetos sin referencias.
+
+        Returns:
+            dict: trabajos eliminados, objetos eliminados y bytes en uso
+        """
+        ahora = time.time()
+        resumen = {"trabajos": 0, "objetos": 0}
+        with self._lock:
+            trabajos = []
+            for job_id in os.listdir(self.dir_trabajos):
+                ruta = os.path.join(self.dir_trabajos, job_id)
+                if job_id in self._activos or not os.path.isdir(ruta):
+                    continue
+                try:
+                    # Un trabajo activo en otro proceso cuenta desde su marca
+                    activo = os.path.exists(os.path.join(ruta, ACTIVO))
+                    fecha = os.path.getmtime(os.path.join(ruta, ACTIVO) if activo else ruta)
+                except OSError:
+                    continue
+                if ahora - fecha > self.config["max_edad"]:
+                    shutil.rmtree(ruta, ignore_errors=True)
+                    resumen["trabajos"] += 1
+                elif not activo:
+                    trabajos.append((fecha, job_id))
+
+            resumen["objetos"] += self._liberar_objetos()
+
+            # Si aún se supera el límite, eliminar los trabajos más antiguos
+            en_uso = _tamano_directorio(self.directorio)
+            for _, job_id in sorted(trabajos):
+                if en_uso <= self.config["max_bytes"]:
+                    break
+                shutil.rmtree(os.path.join(self.dir_trabajos, job_id), ignore_errors=True)
+                resumen["trabajos"] += 1
+                resumen["objetos"] += self._liberar_objetos()
+                en_uso = _tamano_directorio(self.directorio)
+
+        resumen["bytes"] = en_uso
+        return resumen
+
+    def _liberar_objetos(self):
+        """Elimina los objetos que ningún manifiesto referencia"""
+        referenciados = set()
+        for job_id in os.listdir(self.dir_trabajos):
+            try:
+                manifiesto = self.manifiesto(job_id)
+            except (ValueError, OSError, json.JSONDecodeError):
+                continue
+            for entrada in (manifiesto or {}).get("archivos", {}).values():
+                referenciados.add(entrada["hash"])
+
+        ahora = time.time()
+        eliminados = 0
+        for prefijo in os.listdir(self.dir_objetos):
+            carpeta = os.path.join(self.dir_objetos, prefijo)
+            if not os.path.isdir(carpeta):
+                continue
+            for nombre in os.listdir(carpeta):
+                # Las variantes <hash>.gz y <hash>.br siguen a su objeto
+                contenido = nombre.split(".")[0]
+                if contenido in referenciados:
+                    continue
+                ruta = os.path.join(carpeta, nombre)
+                try:
+                    if nombre.endswith(".tmp"):
+                        # Escritura en curso de otro proceso, o restos de uno que murió
+                        liberar = ahora - os.path.getmtime(ruta) > self.config["max_edad"]
+                    else:
+                        # Publicado o reutilizado hace poco: aún puede estar por registrarse
+                        objeto = os.path.join(carpeta, contenido)
+                        fecha = os.path.getmtime(objeto if os.path.exists(objeto) else ruta)
+                        liberar = ahora - fecha > self.config["gracia"]
+                    if liberar:
+                        os.remove(ruta)
+                        eliminados += 1
+                except OSError:
+                    continue
+            try:
+                if not os.listdir(carpeta):
+                    os.rmdir(carpeta)
+            except OSError:
+                pass
+        return eliminados
+
+    def iniciar_limpieza(self, intervalo=None):
+        """Lanza el barrido periódico en un hilo en segundo plano"""
+        if self._hilo and self._hilo.is_alive():
+            return
+        intervalo = intervalo or self.config["intervalo_limpieza"]
+
+        def ciclo():
+            while not self._detener.wait(intervalo):
+                try:
+                    resumen = self.limpiar()
+                    if resumen["trabajos"] or resumen["objetos"]:
+                        print(f"Limpieza de almacenamiento: {resumen}")
+                except Exception as e:
+                    print(f"Error en la limpieza de almacenamiento: {e}")
+
+        self._detener.clear()
+        self._hilo = threading.Thread(target=ciclo, daemon=True)
+        self._hilo.start()
+
+    def detener_limpieza(self):
+        self._detener.set()
@@ -0,0 +1,40 @@
+import contextlib
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+@contextlib.contextmanager
+def bloqueo_archivo(ruta):
+    """
+    Bloqueo exclusivo entre procesos sobre <ruta>.lock mientras dura el
+    bloque (fcntl en POSIX, msvcrt en Windows). Protege los
+    leer-modificar-escribir de archivos JSON compartidos por varios procesos.
+    """
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(f"{ruta}.lock", "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK se rinde tras unos 10 segundos; se sigue esperando
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
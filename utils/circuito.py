@@ -0,0 +1,193 @@
+"""
+Cortacircuitos de la API de Claude y registro de los últimos resultados
+correctos, que se sirven marcados como desactualizados mientras la API no
+está disponible.
+
+Estados del circuito (CIRCUITO_CONFIG):
+    cerrado: las llamadas pasan y se cuentan los fallos seguidos del servicio.
+    abierto: tras umbral_fallos fallos, las llamadas fallan de inmediato con
+        CircuitoAbierto durante "espera" segundos, sin reintentos ni esperas.
+    semiabierto: pasada la espera se dejan pasar "sondeos" llamadas de
+        prueba; un éxito cierra el circuito y un fallo lo vuelve a abrir.
+
+Los errores de validación de la salida no cuentan como fallos: el servicio
+respondió.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from config.config import CIRCUITO_CONFIG
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+class CircuitoAbierto(Exception):
+    """La API de Claude se considera caída y la llamada no se intentó"""
+
+    def __init__(self, reintentar_en):
+        self.reintentar_en = reintentar_en
+        super().__init__(f"La API de Claude no está disponible (circuito abierto); "
+                         f"se volverá a probar en {reintentar_en:.0f} s")
+
+class Circuito:
+    """Cortacircuitos compartido por todos los clientes de Claude del proceso"""
+
+    def __init__(self, config=None, reloj=time.monotonic):
+        self.config = dict(CIRCUITO_CONFIG, **(config or {}))
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self.estado = CERRADO
+        self.fallos = 0
+        self._abierto_desde = 0.0
+        self._sondeos = 0
+
+    def _cambiar(self, estado, motivo=""):
+        print(f"Circuito de la API de Claude: {self.estado} -> {estado}{motivo}")
+        self.estado = estado
+        if estado == ABIERTO:
+            self._abierto_desde = self._reloj()
+        elif estado == CERRADO:
+            self.fallos = 0
+
+    def _restante(self):
+        return max(0.0, self._abierto_desde + self.config["espera"] - self._reloj())
+
+    def permitir(self):
+        """
+        Autoriza una llamada o lanza CircuitoAbierto. Devuelve True si la
+        llamada es de prueba (circuito semiabierto); ese valor se pasa a
+        exito() o fallo() al terminar.
+        """
+        if not self.config["habilitado"]:
+            return False
+        with self._lock:
+            if self.estado == ABIERTO:
+                if self._restante() > 0:
+                    raise CircuitoAbierto(self._restante())
+                self._cambiar(SEMIABIERTO)
+            if self.estado == SEMIABIERTO:
+                if self._sondeos >= self.config["sondeos"]:
+                    # Otra llamada ya está probando el servicio
+                    raise CircuitoAbierto(self.config["espera"])
+                self._sondeos += 1
+                return True
+            return False
+
+    def comprobar(self):
+        """Lanza CircuitoAbierto si el circuito está abierto, sin reservar una llamada"""
+        if self.config["habilitado"] and self.estado == ABIERTO:
+            with self._lock:
+                if self.estado == ABIERTO and self._restante() > 0:
+                    raise CircuitoAbierto(self._restante())
+
+    def exito(self, sondeo=False):
+        if not self.config["habilitado"]:
+            return
+        with self._lock:
+            if sondeo:
+                self._sondeos -= 1
+            if self.estado != CERRADO:
+                self._cambiar(CERRADO)
+            self.fallos = 0
+
+    def fallo(self, sondeo=False):
+        if not self.config["habilitado"]:
+            return
+        with self._lock:
+            if sondeo:
+                self._sondeos -= 1
+                self._cambiar(ABIERTO, " (falló la llamada de prueba)")
+            elif self.estado == CERRADO:
+                self.fallos += 1
+                if self.fallos >= self.config["umbral_fallos"]:
+                    self._cambiar(ABIERTO, f" ({self.fallos} fallos seguidos)")
+
+    def liberar(self, sondeo):
+        """Devuelve el turno de una llamada de prueba cancelada sin resultado"""
+        if sondeo:
+            with self._lock:
+                self._sondeos -= 1
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos": self.fallos,
+                "reintentar_en": round(self._restante(), 1) if self.estado == ABIERTO else 0
+            }
+
+class ResultadosAnteriores:
+    """
+    Último resultado correcto (CSV y JSON) de cada documento y
+    comercializador, en SQLite. Se conservan los max_por_comercializador más
+    recientes de cada comercializador.
+    """
+
+    def __init__(self, ruta=None, config=None):
+        self.config = dict(CIRCUITO_CONFIG, **(config or {}))
+        self.ruta = ruta or self.config["registro"]
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conectar() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS resultados (
+                    hash TEXT NOT NULL,
+                    comercializador TEXT NOT NULL,
+                    csv TEXT NOT NULL,
+                    json BLOB NOT NULL,
+                    fecha REAL NOT NULL,
+                    PRIMARY KEY (hash, comercializador)
+                )
+            """)
+
+    def _conectar(self):
+        """Conexión en modo autocommit que se cierra al salir del bloque with"""
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        return closing(conexion)
+
+    def guardar(self, hash_archivo, comercializador, csv_content, json_bytes):
+        with self._conectar() as conexion:
+            conexion.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)",
+                             (hash_archivo, comercializador, csv_content, json_bytes, time.time()))
+            conexion.execute("""
+                DELETE FROM resultados WHERE comercializador = ? AND hash NOT IN (
+                    SELECT hash FROM resultados WHERE comercializador = ? ORDER BY fecha DESC LIMIT ?
+                )
+            """, (comercializador, comercializador, self.config["max_por_comercializador"]))
+
+    def buscar(self, hash_archivo, comercializador, por_comercializador=False):
+        """
+        Último resultado del documento o, si por_comercializador, el más
+        reciente del comercializador. Devuelve un dict con csv, json, fecha y
+        origen ("documento" o "comercializador"), o None.
+        """
+        consultas = [("documento", "hash = ? AND comercializador = ?", (hash_archivo, comercializador))]
+        if por_comercializador:
+            consultas.append(("comercializador", "comercializador = ?", (comercializador,)))
+        with self._conectar() as conexion:
+            for origen, condicion, parametros in consultas:
+                fila = conexion.execute(
+                    f"SELECT csv, json, fecha FROM resultados WHERE {condicion} ORDER BY fecha DESC LIMIT 1",
+                    parametros).fetchone()
+                if fila:
+                    return {
+                        "csv": fila[0],
+                        "json": bytes(fila[1]),
+                        "fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(fila[2])),
+                        "origen": origen
+                    }
+        return None
+
+_circuito = None
+
+def obtener_circuito():
+    """Circuito compartido del proceso"""
+    global _circuito
+    if _circuito is None:
+        _circuito = Circuito()
+    return _circuito
@@ -1,204 +1,402 @@
 import anthropic
-import json
-import os
-from dotenv import load_dotenv
-from config.config import CLAUDE_API_CONFIG, RETRY_CONFIG
-import requests
+import asyncio
 import time
+from config.config import CLAUDE_API_CONFIG, MODELOS_CONFIG, PRONOSTICO_CONFIG, RETRY_CONFIG
+from utils.circuito import CircuitoAbierto, obtener_circuito
+from utils.enrutador_modelos import obtener_enrutador
+from utils.progreso import emitir
+from utils.pronostico import RegistroUso
 
-class ClaudeAPI:
-    """Clase para manejar la comunicación con la API de Claude"""
-    
-    def __init__(self, api_key):
-        """Inicializar con la API key de Claude"""
-        self.client = anthropic.Anthropic(api_key=api_key)
-        self.headers = {
-            "x-api-key": api_key,
-            "anthropic-version": "2023-06-01",
-            "content-type": "application/json"
-        }
-    
-    def procesar_texto(self, text, instructions):
-        """Procesa el texto usando Claude y devuelve el resultado en formato CSV."""
-        try:
-            # Construir el prompt
-            prompt = f"""{instructions}
+ENCABEZADO_CSV = "Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT"
+
+SYSTEM_PROMPT = "Eres un asistente especializado en procesar documentos de tarifas eléctricas y convertirlos a formato CSV. Tu única tarea es extraer los datos y devolverlos en formato CSV, sin ningún texto adicional. Debes seguir estrictamente el formato de columnas especificado."
+
+def construir_prompt(text, instructions):
+    """Construye el prompt de extracción común a los clientes síncrono y asíncrono"""
+    return f"""{instructions}
 
 A continuación está el texto extraído del documento de tarifas:
 
 {text}
 
 IMPORTANTE: Por favor, organiza los datos en formato CSV con las siguientes columnas en este orden exacto:
-Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT
+{ENCABEZADO_CSV}
 
 REGLAS ESTRICTAS:
-1. La primera línea DEBE ser exactamente: Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT
+1. La primera línea DEBE ser exactamente: {ENCABEZADO_CSV}
 2. Los valores numéricos deben usar punto como separador decimal
 3. No usar separadores de miles
 4. No incluir espacios extras entre columnas
 5. No incluir texto adicional antes o después del CSV
 6. Asegurarse de que todas las columnas estén presentes y en el orden correcto"""
 
-            # Intentar con reintentos en caso de fallo
-            for attempt in range(RETRY_CONFIG["max_retries"]):
+def parametros_mensaje(prompt, nivel=None):
+    """Parámetros de la llamada a messages.stream para un nivel de MODELOS_CONFIG"""
+    nivel = nivel or {}
+    return {
+        "model": nivel.get("model", CLAUDE_API_CONFIG["model"]),
+        "max_tokens": nivel.get("max_tokens", CLAUDE_API_CONFIG["max_tokens"]),
+        "temperature": 0,
+        "system": SYSTEM_PROMPT,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+def validar_csv(content):
+    """
+    Verifica que la respuesta sea un CSV con el encabezado y el número de
+    columnas esperados. Lanza ValueError si no lo es.
+    """
+    content_lines = content.strip().split('\n')
+    if not content or not content_lines:
+        raise ValueError("La respuesta está vacía")
+
+    first_line = content_lines[0].strip()
+    if first_line != ENCABEZADO_CSV:
+        print(f"\nPrimera línea de la respuesta: '{first_line}'")
+        print(f"Encabezado esperado: '{ENCABEZADO_CSV}'")
+        raise ValueError("La respuesta no tiene el formato CSV esperado")
+
+    expected_columns = len(ENCABEZADO_CSV.split(','))
+    for i, line in enumerate(content_lines[1:], 2):
+        if len(line.strip().split(',')) != expected_columns:
+            raise ValueError(f"Error en línea {i}: número incorrecto de columnas")
+
+def _numero(valor):
+    return float(valor.strip())
+
+def conciliar_csv(content, config=None):
+    """
+    Verifica en cada fila que CU = G + T + D + C + P + R y que la columna
+    "CU + COT" sea CU más o menos COT, dentro de la tolerancia configurada.
+    El signo de COT no se exige porque algunos comercializadores (QI) lo
+    publican negativo aunque lo suman. Lanza ValueError con las filas que
+    no cuadran.
+    """
+    config = config or MODELOS_CONFIG
+    lineas = content.strip().split('\n')
+    columnas = lineas[0].strip().split(',')
+    indices = {nombre: columnas.index(nombre) for nombre in columnas}
+    descuadradas = []
+    for i, line in enumerate(lineas[1:], 2):
+        valores = line.strip().split(',')
+        try:
+            g, t, d, c, cot, p, r, cu, cu_cot = (
+                _numero(valores[indices[nombre]])
+                for nombre in ("G", "T", "D", "C", "COT", "P", "R", "CU", "CU + COT")
+            )
+        except ValueError:
+            descuadradas.append(f"{i} (valor no numérico)")
+            continue
+        # Con COT, el signo que mejor cuadra la fila
+        con_cot = min((cu + cot, cu - cot), key=lambda total: abs(total - cu_cot))
+        for esperado, obtenido in ((g + t + d + c + p + r, cu), (con_cot, cu_cot)):
+            tolerancia = max(config["tolerancia_absoluta"], config["tolerancia_relativa"] * abs(esperado))
+            if abs(esperado - obtenido) > tolerancia:
+                descuadradas.append(str(i))
+                break
+    if descuadradas:
+        muestra = ", ".join(descuadradas[:5]) + ("..." if len(descuadradas) > 5 else "")
+        raise ValueError(f"{len(descuadradas)} fila(s) no cuadran CU con sus componentes: líneas {muestra}")
+
+def tiempo_espera(attempt, retry_delay=None):
+    """Espera exponencial antes del siguiente intento"""
+    return (retry_delay or RETRY_CONFIG["retry_delay"]) * (2 ** attempt)
+
+def _mostrar_respuesta(content):
+    print("\nRespuesta de Claude:")
+    print("-" * 50)
+    print(content[:500] + "..." if len(content) > 500 else content)
+    print("-" * 50)
+
+def _registro_por_defecto(registro_uso):
+    if registro_uso is not None:
+        return registro_uso
+    return RegistroUso() if PRONOSTICO_CONFIG["registrar"] else None
+
+class _ContadorFilas:
+    """
+    Cuenta las filas recibidas durante el streaming e informa el progreso.
+    Al terminar registra el uso real de la respuesta para calibrar el
+    pronóstico de futuras peticiones.
+    """
+
+    def __init__(self, progreso, registro=None, parametros=None, caracteres_texto=0, estricto=False):
+        self.progreso = progreso
+        self.registro = registro
+        self.parametros = parametros or {}
+        self.caracteres_texto = caracteres_texto
+        self.estricto = estricto
+        self.partes = []
+        self.filas = 0
+        self.inicio = time.perf_counter()
+
+    def agregar(self, fragmento):
+        self.partes.append(fragmento)
+        nuevas = fragmento.count("\n")
+        if nuevas:
+            self.filas += nuevas
+            emitir(self.progreso, "claude_filas", filas=self.filas)
+
+    def terminar(self, response):
+        content = "".join(self.partes).strip()
+        emitir(self.progreso, "claude_respuesta",
+               tokens_entrada=response.usage.input_tokens,
+               tokens_salida=response.usage.output_tokens)
+        if self.registro:
+            try:
+                self.registro.registrar(
+                    modelo=self.parametros.get("model"),
+                    caracteres_entrada=len(self.parametros["messages"][0]["content"]),
+                    caracteres_texto=self.caracteres_texto,
+                    caracteres_salida=len(content),
+                    tokens_entrada=response.usage.input_tokens,
+                    tokens_salida=response.usage.output_tokens,
+                    latencia=round(time.perf_counter() - self.inicio, 3),
+                    stop_reason=getattr(response, "stop_reason", None)
+                )
+            except Exception as e:
+                print(f"No se pudo registrar el uso de Claude: {e}")
+        _mostrar_respuesta(content)
+        validar_csv(content)
+        # Las publicaciones reales no siempre cuadran (redondeos, componentes
+        # agrupados), así que una fila descuadrada solo se advierte; obliga a
+        # escalar solo si escalar_por_conciliacion está activo
+        try:
+            conciliar_csv(content)
+        except ValueError as e:
+            if self.estricto and MODELOS_CONFIG["escalar_por_conciliacion"]:
+                raise
+            print(f"Advertencia: {e}")
+        return content
+
+def _motivo_fallo(error):
+    if isinstance(error, (asyncio.TimeoutError, anthropic.APITimeoutError)):
+        return "timeout"
+    if isinstance(error, ValueError):
+        return "validacion"
+    if isinstance(error, anthropic.RateLimitError):
+        return "limite"
+    return "api"
+
+class _Enrutado:
+    """
+    Lógica de enrutamiento común a los clientes: los niveles baratos se
+    prueban primero y, si fallan o su salida no valida, se escala al
+    siguiente. Los resultados de cada modelo se registran en las estadísticas.
+    """
+
+    def _niveles(self, text):
+        return self.enrutador.niveles_para(text)
+
+    def _registrar(self, nivel, inicio, error=None):
+        """Actualiza las estadísticas del modelo; si no se pueden guardar, la llamada no se ve afectada"""
+        try:
+            self.enrutador.estadisticas.registrar(
+                nivel["model"], error is None, time.perf_counter() - inicio,
+                None if error is None else _motivo_fallo(error)
+            )
+        except Exception as e:
+            print(f"No se pudieron registrar las estadísticas de {nivel['model']}: {e}")
+
+    def _registrar_circuito(self, sondeo, error=None):
+        # Un error de validación no es un fallo del servicio: respondió
+        if error is None or _motivo_fallo(error) == "validacion":
+            self.circuito.exito(sondeo)
+        else:
+            self.circuito.fallo(sondeo)
+
+    def _escalar(self, nivel, siguiente, error):
+        print(f"El modelo {nivel['model']} no produjo una salida válida ({error}); "
+              f"se escala a {siguiente['model']}...")
+        emitir(self.progreso, "claude_escalado", desde=nivel["model"], hacia=siguiente["model"],
+               motivo=str(error))
+
+class ClaudeAPI(_Enrutado):
+    """Clase para manejar la comunicación con la API de Claude"""
+
+    def __init__(self, api_key, progreso=None, registro_uso=None, enrutador=None, circuito=None):
+        """Inicializar con la API key de Claude, un canal de progreso y un registro de uso opcionales"""
+        self.client = anthropic.Anthropic(api_key=api_key)
+        self.progreso = progreso
+        self.registro_uso = _registro_por_defecto(registro_uso)
+        self.enrutador = enrutador or obtener_enrutador()
+        self.circuito = circuito or obtener_circuito()
+
+    def procesar_texto(self, text, instructions, max_retries=None, retry_delay=None, timeout=None):
+        """Procesa el texto usando Claude y devuelve el resultado en formato CSV."""
+        prompt = construir_prompt(text, instructions)
+        niveles = self._niveles(text)
+        try:
+            for nivel, siguiente in zip(niveles, niveles[1:]):
                 try:
-                    print(f"Intento {attempt+1}/{RETRY_CONFIG['max_retries']}...")
-                    
-                    # Llamar a Claude
-                    response = self.client.messages.create(
-                        model=CLAUDE_API_CONFIG["model"],
-                        max_tokens=CLAUDE_API_CONFIG["max_tokens"],
-                        temperature=0,
-                        system="Eres un asistente especializado en procesar documentos de tarifas eléctricas y convertirlos a formato CSV. Tu única tarea es extraer los datos y devolverlos en formato CSV, sin ningún texto adicional. Debes seguir estrictamente el formato de columnas especificado.",
-                        messages=[
-                            {"role": "user", "content": prompt}
-                        ]
-                    )
-                    
-                    # Extraer el contenido de la respuesta
-                    content = response.content[0].text.strip()
-                    
-                    # Imprimir la respuesta para depuración
-                    print("\nRespuesta de Claude:")
-                    print("-" * 50)
-                    print(content[:500] + "..." if len(content) > 500 else content)
-                    print("-" * 50)
-                    
-                    # Verificar que la respuesta comienza con el encabezado correcto
-                    expected_header = "Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT"
-                    
-                    # Limpiar la respuesta de posibles espacios o caracteres especiales
-                    content_lines = content.strip().split('\n')
-                    if not content_lines:
-                        print("La respuesta está vacía")
-                        continue
-                        
-                    first_line = content_lines[0].strip()
-                    print(f"\nPrimera línea de la respuesta: '{first_line}'")
-                    print(f"Encabezado esperado: '{expected_header}'")
-                    
-                    if first_line != expected_header:
-                        print("La respuesta no tiene el formato CSV esperado. Reintentando...")
-                        if attempt < RETRY_CONFIG["max_retries"] - 1:
-                            time.sleep(RETRY_CONFIG["retry_delay"] * (2 ** attempt))
-                            continue
-                        raise ValueError("La respuesta no tiene el formato CSV esperado")
-                    
-                    # Verificar que todas las líneas tienen el número correcto de columnas
-                    expected_columns = len(expected_header.split(','))
-                    for i, line in enumerate(content_lines[1:], 2):
-                        columns = line.strip().split(',')
-                        if len(columns) != expected_columns:
-                            print(f"Error en línea {i}: número incorrecto de columnas")
-                            if attempt < RETRY_CONFIG["max_retries"] - 1:
-                                time.sleep(RETRY_CONFIG["retry_delay"] * (2 ** attempt))
-                                continue
-                            raise ValueError(f"Error en línea {i}: número incorrecto de columnas")
-                    
-                    # Si llegamos aquí, la respuesta es válida
-                    return content
-                    
+                    return self._procesar_con_nivel(prompt, len(text), nivel, nivel.get("intentos", 1),
+                                                    retry_delay, timeout, estricto=True)
+                except CircuitoAbierto:
+                    raise
                 except Exception as e:
-                    print(f"Error en el intento {attempt+1}: {str(e)}")
-                    if attempt < RETRY_CONFIG["max_retries"] - 1:
-                        wait_time = RETRY_CONFIG["retry_delay"] * (2 ** attempt)
-                        print(f"Reintentando en {wait_time} segundos...")
-                        time.sleep(wait_time)
-                    else:
-                        raise Exception(f"Error al procesar el texto con Claude después de {RETRY_CONFIG['max_retries']} intentos: {str(e)}")
-            
+                    self._escalar(nivel, siguiente, e)
+            return self._procesar_con_nivel(prompt, len(text), niveles[-1],
+                                            max_retries or RETRY_CONFIG["max_retries"], retry_delay, timeout)
+
+        except CircuitoAbierto:
+            raise
         except Exception as e:
             raise Exception(f"Error al procesar el texto con Claude: {str(e)}")
 
+    def _procesar_con_nivel(self, prompt, caracteres_texto, nivel, max_retries, retry_delay, timeout, estricto=False):
+        """
+        Envía el prompt al modelo de un nivel con reintentos y espera
+        exponencial. Con el circuito abierto falla de inmediato con
+        CircuitoAbierto, sin agotar los intentos.
+        """
+        parametros = parametros_mensaje(prompt, nivel)
+        for attempt in range(max_retries):
+            sondeo = self.circuito.permitir()
+            inicio = time.perf_counter()
+            try:
+                print(f"Intento {attempt+1}/{max_retries} con {parametros['model']}...")
+                emitir(self.progreso, "claude", intento=attempt+1, max_intentos=max_retries,
+                       modelo=parametros["model"])
+
+                # Llamar a Claude en modo streaming para informar las filas recibidas
+                contador = _ContadorFilas(self.progreso, self.registro_uso, parametros, caracteres_texto, estricto)
+                opciones = {"timeout": timeout} if timeout else {}
+                with self.client.messages.stream(**parametros, **opciones) as stream:
+                    for fragmento in stream.text_stream:
+                        contador.agregar(fragmento)
+                    response = stream.get_final_message()
+                content = contador.terminar(response)
+
+            except Exception as e:
+                self._registrar_circuito(sondeo, e)
+                self._registrar(nivel, inicio, e)
+                print(f"Error en el intento {attempt+1}: {str(e)}")
+                if attempt < max_retries - 1:
+                    self.circuito.comprobar()
+                    wait_time = tiempo_espera(attempt, retry_delay)
+                    print(f"Reintentando en {wait_time} segundos...")
+                    emitir(self.progreso, "claude_reintento", intento=attempt+1, espera=wait_time, motivo=str(e))
+                    time.sleep(wait_time)
+                    # Tras un timeout se amplía el plazo, hasta un máximo de 10 minutos
+                    if timeout and isinstance(e, anthropic.APITimeoutError):
+                        timeout = min(timeout * 1.5, 600)
+                else:
+                    raise Exception(f"Error al procesar el texto con Claude después de {max_retries} intentos: {str(e)}")
+
+            else:
+                # Fuera del try: un fallo al guardar las estadísticas no descarta la respuesta
+                self._registrar_circuito(sondeo)
+                self._registrar(nivel, inicio)
+                return content
+
     def procesar_texto_con_reintentos(self, texto, instrucciones, max_retries=None, retry_delay=None, initial_timeout=None):
-        """Envía texto a Claude para su procesamiento con manejo de reintentos"""
-        # Usar configuración por defecto si no se especifica
-        max_retries = max_retries or RETRY_CONFIG["max_retries"]
-        retry_delay = retry_delay or RETRY_CONFIG["retry_delay"]
-        timeout = initial_timeout or RETRY_CONFIG["initial_timeout"]
-        
-        # Construir el prompt completo
-        prompt = f"""{instrucciones}
+        """Variante de procesar_texto con timeout por intento que devuelve None si falla"""
+        try:
+            return self.procesar_texto(
+                texto, instrucciones, max_retries, retry_delay,
+                initial_timeout or RETRY_CONFIG["initial_timeout"]
+            )
+        except Exception as e:
+            print(f"Error al comunicarse con la API: {e}")
+            return None
 
-A continuación está el texto extraído del documento de tarifas:
+class ClaudeAPIAsync(_Enrutado):
+    """
+    Cliente asíncrono con la misma semántica que ClaudeAPI.procesar_texto.
+    Todas las llamadas comparten el pool de conexiones de AsyncAnthropic y un
+    semáforo limita las peticiones simultáneas. Las esperas entre intentos usan
+    asyncio.sleep, por lo que cancelar la tarea interrumpe también el backoff.
+    """
 
-{texto}
+    def __init__(self, api_key, progreso=None, max_concurrencia=None, registro_uso=None, enrutador=None,
+                 circuito=None):
+        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.progreso = progreso
+        self.registro_uso = _registro_por_defecto(registro_uso)
+        self.enrutador = enrutador or obtener_enrutador()
+        self.circuito = circuito or obtener_circuito()
+        self._semaforo = asyncio.Semaphore(max_concurrencia or CLAUDE_API_CONFIG["max_concurrencia"])
 
-IMPORTANTE: Por favor, organiza los datos en formato CSV con las siguientes columnas en este orden exacto:
-Comercializador,Mercado,Nivel de Tensión,G,T,D,C,COT,P,R,CU,CU + COT
-
-Asegúrate de que la respuesta sea SOLO el CSV, sin texto adicional antes o después."""
-        
-        # Preparar datos para la API
-        message_data = {
-            "model": CLAUDE_API_CONFIG["model"],
-            "max_tokens": CLAUDE_API_CONFIG["max_tokens"],
-            "temperature": 0,  # Temperatura 0 para respuestas más consistentes
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        }
-        
-        # Intentar con reintentos en caso de fallo
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.cerrar()
+
+    async def cerrar(self):
+        await self.client.close()
+
+    async def _intento(self, parametros, timeout, caracteres_texto, estricto):
+        contador = _ContadorFilas(self.progreso, self.registro_uso, parametros, caracteres_texto, estricto)
+
+        async def recibir():
+            async with self.client.messages.stream(**parametros) as stream:
+                async for fragmento in stream.text_stream:
+                    contador.agregar(fragmento)
+                return await stream.get_final_message()
+
+        async with self._semaforo:
+            # El plazo cubre también la apertura del stream (conexión y primera respuesta)
+            response = await asyncio.wait_for(recibir(), timeout) if timeout else await recibir()
+        return contador.terminar(response)
+
+    async def procesar_texto(self, text, instructions, max_retries=None, retry_delay=None, timeout=None):
+        """Procesa el texto usando Claude y devuelve el resultado en formato CSV."""
+        prompt = construir_prompt(text, instructions)
+        niveles = self._niveles(text)
+        try:
+            for nivel, siguiente in zip(niveles, niveles[1:]):
+                try:
+                    return await self._procesar_con_nivel(prompt, len(text), nivel, nivel.get("intentos", 1),
+                                                          retry_delay, timeout, estricto=True)
+                except CircuitoAbierto:
+                    raise
+                except Exception as e:
+                    self._escalar(nivel, siguiente, e)
+            return await self._procesar_con_nivel(prompt, len(text), niveles[-1],
+                                                  max_retries or RETRY_CONFIG["max_retries"], retry_delay, timeout)
+
+        except CircuitoAbierto:
+            raise
+        except Exception as e:
+            # Mismo error que el cliente síncrono, sea cual sea el transporte
+            raise Exception(f"Error al procesar el texto con Claude: {str(e)}")
+
+    async def _procesar_con_nivel(self, prompt, caracteres_texto, nivel, max_retries, retry_delay, timeout, estricto=False):
+        parametros = parametros_mensaje(prompt, nivel)
         for attempt in range(max_retries):
+            sondeo = self.circuito.permitir()
+            inicio = time.perf_counter()
             try:
-                print(f"Intento {attempt+1}/{max_retries} (timeout: {timeout}s)...")
-                response = requests.post(
-                    CLAUDE_API_CONFIG["base_url"],
-                    headers=self.headers,
-                    json=message_data,
-                    timeout=timeout
-                )
-                
-                if response.status_code == 200:
-                    csv_content = response.json()["content"][0]["text"].strip()
-                    # Verificar que la respuesta comienza con el encabezado CSV
-                    if not csv_content.startswith("Comercializador,Mercado,Nivel de Tensión"):
-                        print("La respuesta no está en formato CSV. Reintentando...")
-                        if attempt < max_retries - 1:
-                            continue
-                        return None
-                    return csv_content
-                
-                elif response.status_code == 429:  # Rate limit
-                    wait_time = retry_delay * (2 ** attempt)
-                    print(f"Rate limit alcanzado. Esperando {wait_time} segundos...")
-                    time.sleep(wait_time)
-                    continue
-                
-                else:
-                    print(f"Error en la API: {response.status_code}")
-                    print(f"Detalles: {response.text}")
-                    
-                    if attempt < max_retries - 1:
-                        wait_time = retry_delay * (2 ** attempt)
-                        print(f"Reintentando en {wait_time} segundos...")
-                        time.sleep(wait_time)
-                    else:
-                        return None
-            
-            except requests.exceptions.Timeout:
-                print(f"Timeout al comunicarse con la API (después de {timeout} segundos)")
-                
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    timeout = min(timeout * 1.5, 600)  # Aumentar hasta máximo 10 minutos
-                    print(f"Reintentando en {wait_time} segundos con timeout aumentado a {timeout}s...")
-                    time.sleep(wait_time)
-                else:
-                    return None
-                    
+                print(f"Intento {attempt+1}/{max_retries} con {parametros['model']}...")
+                emitir(self.progreso, "claude", intento=attempt+1, max_intentos=max_retries,
+                       modelo=parametros["model"])
+                content = await self._intento(parametros, timeout, caracteres_texto, estricto)
+            except asyncio.CancelledError:
+                self.circuito.liberar(sondeo)
+                raise
             except Exception as e:
-                print(f"Error al comunicarse con la API: {e}")
-                
+                self._registrar_circuito(sondeo, e)
+                self._registrar(nivel, inicio, e)
+                print(f"Error en el intento {attempt+1}: {str(e) or type(e).__name__}")
                 if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    print(f"Reintentando en {wait_time} segundos...")
-                    time.sleep(wait_time)
+                    self.circuito.comprobar()
+                    wait_time = tiempo_espera(attempt, retry_delay)
+                    emitir(self.progreso, "claude_reintento", intento=attempt+1, espera=wait_time,
+                           motivo=str(e) or type(e).__name__)
+                    await asyncio.sleep(wait_time)
+                    if timeout and isinstance(e, (asyncio.TimeoutError, anthropic.APITimeoutError)):
+                        timeout = min(timeout * 1.5, 600)
                 else:
-                    return None
-        
-        return None 
\ No newline at end of file
+                    raise Exception(f"Error al procesar el texto con Claude después de {max_retries} intentos: {str(e) or type(e).__name__}")
+            else:
+                self._registrar_circuito(sondeo)
+                self._registrar(nivel, inicio)
+                return content
+
+    async def procesar_varios(self, textos, instructions, **opciones):
+        """Procesa varios textos en paralelo; los errores se devuelven en lugar del CSV"""
+        tareas = [self.procesar_texto(texto, instructions, **opciones) for texto in textos]
+        return await asyncio.gather(*tareas, return_exceptions=True)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import closing
+from config.config import COALESCENCIA_CONFIG
+from utils.circuito import CircuitoAbierto
+from utils.registro_instrucciones import obtener_registro
+
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+# Motivo de un error del líder que los demás deben recibir con su tipo original
+MOTIVO_CIRCUITO = "circuito_abierto"
+
+class ErrorCoalescido(Exception):
+    """Error del trabajo líder al que se unió la petición"""
+
+def version_instrucciones(comercializador):
+    """Hash corto de las instrucciones y la configuración de un comercializador"""
+    return obtener_registro().version(comercializador)
+
+def clave_trabajo(hash_archivo, comercializador, version=None):
+    """Clave de coalescencia: (hash del archivo, comercializador, versión de instrucciones)"""
+    version = version or version_instrucciones(comercializador)
+    return hashlib.sha256(f"{hash_archivo}|{comercializador}|{version}".encode("utf-8")).hexdigest()
+
+class Coalescedor:
+    """
+    Ejecuta una sola vez los trabajos idénticos que están en curso a la vez.
+
+    Dentro del proceso, las peticiones que llegan mientras el líder trabaja
+    esperan su Future. Entre procesos, una fila de SQLite por clave indica
+    quién es el líder; los demás consultan la fila hasta que el resultado
+    (que debe ser serializable en JSON) esté disponible. Si el líder deja de
+    renovar su latido, otro proceso toma el trabajo.
+    """
+
+    def __init__(self, ruta=None, config=None):
+        self.config = dict(COALESCENCIA_CONFIG, **(config or {}))
+        self.ruta = ruta or self.config["ruta"]
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conectar() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS vuelos (
+                    clave TEXT PRIMARY KEY,
+                    lider TEXT,
+                    estado TEXT NOT NULL,
+                    latido REAL NOT NULL,
+                    resultado TEXT,
+                    error TEXT,
+                    motivo TEXT,
+                    reintentar_en REAL
+                )
+            """)
+            columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(vuelos)")}
+            for columna, tipo in (("motivo", "TEXT"), ("reintentar_en", "REAL")):
+                if columna not in columnas:
+                    conexion.execute(f"ALTER TABLE vuelos ADD COLUMN {columna} {tipo}")
+
+    def _conectar(self):
+        """Conexión en modo autocommit que se cierra al salir del bloque with"""
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        return closing(conexion)
+
+    def ejecutar(self, clave, funcion, lider=None, al_unirse=None):
+        """
+        Ejecuta funcion() o, si ya hay un trabajo con la misma clave en curso,
+        espera su resultado. al_unirse(lider) se llama al unirse a otro.
+        """
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = Future()
+                futuro.lider = lider
+                self._en_vuelo[clave] = futuro
+
+        if not propio:
+            if al_unirse:
+                al_unirse(futuro.lider)
+            return futuro.result()
+
+        try:
+            resultado = self._ejecutar_entre_procesos(clave, funcion, lider, al_unirse)
+            futuro.set_result(resultado)
+            return resultado
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+
+    def _ejecutar_entre_procesos(self, clave, funcion, lider, al_unirse):
+        avisado = False
+        while True:
+            fila = self._tomar(clave, lider, esperando=avisado)
+            if fila is None:
+                return self._liderar(clave, funcion)
+
+            otro_lider, estado, resultado, error, motivo, reintentar_en, latido = fila
+            if estado == COMPLETADO:
+                return json.loads(resultado)
+            if estado == ERROR:
+                if motivo == MOTIVO_CIRCUITO:
+                    # El circuito abierto hace fallar el trabajo de inmediato, sin reintentos de la cola
+                    raise CircuitoAbierto(max(0.0, (reintentar_en or 0) - (time.time() - latido)))
+                raise ErrorCoalescido(error)
+            if not avisado and al_unirse:
+                al_unirse(otro_lider)
+                avisado = True
+            time.sleep(self.config["sondeo"])
+
+    def _tomar(self, clave, lider, esperando=False):
+        """
+        Intenta registrar este proceso como líder. Devuelve None si lo
+        consigue o la fila del líder actual si otro proceso tiene el trabajo.
+        Un error anterior solo se comparte con quien ya estaba esperando; una
+        petición nueva vuelve a intentarlo.
+        """
+        ahora = time.time()
+        with self._conectar() as conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                # Los resultados retenidos demasiado tiempo ya no se comparten
+                conexion.execute(
+                    "DELETE FROM vuelos WHERE estado != ? AND latido < ?",
+                    (EN_CURSO, ahora - self.config["retencion"])
+                )
+                fila = conexion.execute(
+                    "SELECT lider, estado, resultado, error, motivo, reintentar_en, latido FROM vuelos "
+                    "WHERE clave = ?", (clave,)
+                ).fetchone()
+                libre = (
+                    fila is None
+                    or (fila[1] == EN_CURSO and fila[6] < ahora - self.config["expiracion"])
+                    or (fila[1] == ERROR and not esperando)
+                )
+                if libre:
+                    conexion.execute(
+                        "INSERT OR REPLACE INTO vuelos (clave, lider, estado, latido) VALUES (?, ?, ?, ?)",
+                        (clave, lider, EN_CURSO, ahora)
+                    )
+                    conexion.execute("COMMIT")
+                    return None
+                conexion.execute("COMMIT")
+                return fila
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+
+    def _liderar(self, clave, funcion):
+        detener = threading.Event()
+
+        def latir():
+            while not detener.wait(self.config["latido"]):
+                with self._conectar() as conexion:
+                    conexion.execute("UPDATE vuelos SET latido = ? WHERE clave = ? AND estado = ?",
+                                     (time.time(), clave, EN_CURSO))
+
+        hilo = threading.Thread(target=latir, daemon=True)
+        hilo.start()
+        try:
+            resultado = funcion()
+        except BaseException as e:
+            detener.set()
+            # Los que esperan reciben el error; la siguiente petición idéntica
+            # vuelve a intentarlo
+            if isinstance(e, CircuitoAbierto):
+                self._finalizar(clave, ERROR, error=str(e), motivo=MOTIVO_CIRCUITO, reintentar_en=e.reintentar_en)
+            else:
+                self._finalizar(clave, ERROR, error=str(e))
+            raise
+        detener.set()
+        self._finalizar(clave, COMPLETADO, resultado=json.dumps(resultado, ensure_ascii=False))
+        return resultado
+
+    def _finalizar(self, clave, estado, resultado=None, error=None, motivo=None, reintentar_en=None):
+        with self._conectar() as conexion:
+            conexion.execute(
+                "UPDATE vuelos SET estado = ?, resultado = ?, error = ?, motivo = ?, reintentar_en = ?, latido = ? "
+                "WHERE clave = ?",
+                (estado, resultado, error, motivo, reintentar_en, time.time(), clave)
+            )
+
+_coalescedor = None
+
+def obtener_coalescedor():
+    """Coalescedor compartido del proceso"""
+    global _coalescedor
+    if _coalescedor is None:
+        _coalescedor = Coalescedor()
+    return _coalescedor
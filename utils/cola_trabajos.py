@@ -0,0 +1,457 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from contextlib import closing
+from config.config import COLA_CONFIG
+from utils.progreso import ETAPAS_FINALES
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+PENDIENTE = "pendiente"
+RESERVADO = "reservado"
+TERMINADO = "terminado"
+ERROR = "error"
+
+Reserva = namedtuple("Reserva", ["job_id", "token", "datos", "intentos"])
+
+class ColaTrabajos(ABC):
+    """
+    Interfaz de la cola compartida entre la aplicación web (que encola) y
+    los workers (que reservan y procesan).
+
+    Un trabajo reservado queda invisible durante `visibilidad` segundos; el
+    worker renueva la reserva con latidos mientras trabaja. Si el worker
+    muere, la reserva vence y otro worker lo toma de nuevo, hasta
+    `max_intentos` veces. Los eventos de progreso de cada trabajo también
+    viven en la cola para que la aplicación los sirva por SSE sin importar
+    qué worker los generó.
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(COLA_CONFIG, **(config or {}))
+
+    @abstractmethod
+    def encolar(self, job_id, datos):
+        """Agrega un trabajo pendiente y emite su evento de encolado"""
+
+    @abstractmethod
+    def reservar(self, trabajador):
+        """Devuelve una Reserva o None si no hay trabajos disponibles"""
+
+    @abstractmethod
+    def renovar(self, job_id, token):
+        """Extiende la reserva; False si el trabajo ya no pertenece a este token"""
+
+    @abstractmethod
+    def completar(self, job_id, token):
+        """Marca el trabajo como terminado; False si ya no pertenece a este token"""
+
+    @abstractmethod
+    def fallar(self, job_id, token, error, reintentar=False):
+        """Devuelve el trabajo a la cola si quedan intentos o lo marca como error"""
+
+    @abstractmethod
+    def cancelar(self, job_id):
+        """Descarta un trabajo que aún no se reservó; devuelve False si ya empezó"""
+
+    @abstractmethod
+    def emitir(self, job_id, etapa, **datos):
+        """Agrega un evento de progreso al trabajo y lo devuelve"""
+
+    @abstractmethod
+    def eventos(self, job_id, desde=0):
+        """Eventos del trabajo posteriores al id desde, en orden"""
+
+    @abstractmethod
+    def existe(self, job_id):
+        """Indica si el trabajo está en la cola (en cualquier estado)"""
+
+    @abstractmethod
+    def resumen(self):
+        """Número de trabajos por estado"""
+
+    def canal(self, job_id):
+        return CanalCola(self, job_id)
+
+    def _evento(self, id_evento, etapa, datos):
+        evento = {"id": id_evento, "etapa": etapa, "ts": time.time()}
+        evento.update(datos)
+        return evento
+
+class CanalCola:
+    """
+    Canal de progreso de un trabajo encolado: los workers emiten y la
+    aplicación se suscribe.
+    """
+
+    def __init__(self, cola, job_id):
+        self.cola = cola
+        self.job_id = job_id
+
+    def emitir(self, etapa, **datos):
+        return self.cola.emitir(self.job_id, etapa, **datos)
+
+    @property
+    def ultimo(self):
+        eventos = self.cola.eventos(self.job_id)
+        return eventos[-1] if eventos else None
+
+    @property
+    def terminado(self):
+        ultimo = self.ultimo
+        return bool(ultimo) and ultimo["etapa"] in ETAPAS_FINALES
+
+    def suscribir(self, desde=0, espera=15):
+        """Consulta la cola periódicamente; devuelve None cada `espera` segundos sin eventos"""
+        siguiente = desde
+        ultimo_envio = time.time()
+        while True:
+            nuevos = self.cola.eventos(self.job_id, desde=siguiente)
+            if not nuevos:
+                if time.time() - ultimo_envio >= espera:
+                    ultimo_envio = time.time()
+                    yield None
+                time.sleep(self.cola.config["sondeo"])
+                continue
+
+            ultimo_envio = time.time()
+            for evento in nuevos:
+                siguiente = evento["id"]
+                yield evento
+                if evento["etapa"] in ETAPAS_FINALES:
+                    return
+
+class ColaSQLite(ColaTrabajos):
+    """
+    Cola sobre un archivo SQLite. Sirve para varios procesos en la misma
+    máquina (o sobre un sistema de archivos compartido) y para pruebas.
+    """
+
+    def __init__(self, ruta=None, config=None):
+        super().__init__(config)
+        self.ruta = ruta or self.config["ruta"]
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conectar() as conexion:
+            conexion.executescript("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    job_id TEXT PRIMARY KEY,
+                    datos TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    trabajador TEXT,
+                    token TEXT,
+                    vence REAL,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, creado);
+                CREATE TABLE IF NOT EXISTS eventos (
+                    job_id TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    evento TEXT NOT NULL,
+                    PRIMARY KEY (job_id, id)
+                );
+            """)
+
+    def _conectar(self):
+        """
+        Conexión en modo autocommit que se cierra al salir del bloque with
+        (el context manager de sqlite3 solo confirma la transacción)
+        """
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        return closing(conexion)
+
+    def _transaccion(self, funcion):
+        """Ejecuta funcion(conexion) en una transacción exclusiva de escritura"""
+        with self._conectar() as conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = funcion(conexion)
+                conexion.execute("COMMIT")
+                return resultado
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+
+    def _emitir(self, conexion, job_id, etapa, datos):
+        fila = conexion.execute("SELECT COALESCE(MAX(id), 0) FROM eventos WHERE job_id = ?", (job_id,)).fetchone()
+        evento = self._evento(fila[0] + 1, etapa, datos)
+        conexion.execute("INSERT INTO eventos (job_id, id, evento) VALUES (?, ?, ?)",
+                         (job_id, evento["id"], json.dumps(evento, ensure_ascii=False)))
+        return evento
+
+    def encolar(self, job_id, datos):
+        ahora = time.time()
+
+        def insertar(conexion):
+            # Los trabajos terminados hace más de la retención se descartan
+            limite = ahora - self.config["retencion"]
+            viejos = [f[0] for f in conexion.execute(
+                "SELECT job_id FROM trabajos WHERE estado IN (?, ?) AND actualizado < ?", (TERMINADO, ERROR, limite))]
+            for viejo in viejos:
+                conexion.execute("DELETE FROM eventos WHERE job_id = ?", (viejo,))
+                conexion.execute("DELETE FROM trabajos WHERE job_id = ?", (viejo,))
+            conexion.execute(
+                "INSERT INTO trabajos (job_id, datos, estado, creado, actualizado) VALUES (?, ?, ?, ?, ?)",
+                (job_id, json.dumps(datos, ensure_ascii=False), PENDIENTE, ahora, ahora)
+            )
+            self._emitir(conexion, job_id, "encolado", {})
+
+        self._transaccion(insertar)
+
+    def reservar(self, trabajador):
+        ahora = time.time()
+
+        def tomar(conexion):
+            # Reservas vencidas sin intentos restantes: el trabajo se da por perdido
+            agotados = conexion.execute(
+                "SELECT job_id FROM trabajos WHERE estado = ? AND vence < ? AND intentos >= ?",
+                (RESERVADO, ahora, self.config["max_intentos"])
+            ).fetchall()
+            for (job_id,) in agotados:
+                mensaje = f"El trabajo se interrumpió {self.config['max_intentos']} veces"
+                conexion.execute("UPDATE trabajos SET estado = ?, error = ?, actualizado = ? WHERE job_id = ?",
+                                 (ERROR, mensaje, ahora, job_id))
+                self._emitir(conexion, job_id, "error", {"mensaje": mensaje})
+
+            fila = conexion.execute(
+                "SELECT job_id, datos, intentos, estado FROM trabajos "
+                "WHERE estado = ? OR (estado = ? AND vence < ?) ORDER BY creado LIMIT 1",
+                (PENDIENTE, RESERVADO, ahora)
+            ).fetchone()
+            if fila is None:
+                return None
+            job_id, datos, intentos, estado = fila
+            if estado == RESERVADO:
+                print(f"Reserva vencida del trabajo {job_id}; se reintenta en {trabajador}")
+            token = uuid.uuid4().hex
+            conexion.execute(
+                "UPDATE trabajos SET estado = ?, intentos = ?, trabajador = ?, token = ?, vence = ?, actualizado = ? "
+                "WHERE job_id = ?",
+                (RESERVADO, intentos + 1, trabajador, token, ahora + self.config["visibilidad"], ahora, job_id)
+            )
+            return Reserva(job_id, token, json.loads(datos), intentos + 1)
+
+        return self._transaccion(tomar)
+
+    def _actualizar_si_reservado(self, job_id, token, asignaciones, valores):
+        def actualizar(conexion):
+            cursor = conexion.execute(
+                f"UPDATE trabajos SET {asignaciones}, actualizado = ? WHERE job_id = ? AND token = ? AND estado = ?",
+                (*valores, time.time(), job_id, token, RESERVADO)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaccion(actualizar)
+
+    def renovar(self, job_id, token):
+        return self._actualizar_si_reservado(job_id, token, "vence = ?", (time.time() + self.config["visibilidad"],))
+
+    def completar(self, job_id, token):
+        return self._actualizar_si_reservado(job_id, token, "estado = ?, token = NULL", (TERMINADO,))
+
+    def fallar(self, job_id, token, error, reintentar=False):
+        def actualizar(conexion):
+            fila = conexion.execute("SELECT intentos FROM trabajos WHERE job_id = ? AND token = ? AND estado = ?",
+                                    (job_id, token, RESERVADO)).fetchone()
+            if fila is None:
+                return False
+            estado = PENDIENTE if reintentar and fila[0] < self.config["max_intentos"] else ERROR
+            conexion.execute("UPDATE trabajos SET estado = ?, token = NULL, error = ?, actualizado = ? WHERE job_id = ?",
+                             (estado, str(error), time.time(), job_id))
+            return True
+
+        return self._transaccion(actualizar)
+
+    def cancelar(self, job_id):
+        def actualizar(conexion):
+            cursor = conexion.execute("UPDATE trabajos SET estado = ?, error = ?, actualizado = ? WHERE job_id = ? AND estado = ?",
+                                      (ERROR, "cancelado", time.time(), job_id, PENDIENTE))
+            if cursor.rowcount:
+                self._emitir(conexion, job_id, "error", {"mensaje": "Trabajo cancelado"})
+            return cursor.rowcount == 1
+
+        return self._transaccion(actualizar)
+
+    def emitir(self, job_id, etapa, **datos):
+        return self._transaccion(lambda conexion: self._emitir(conexion, job_id, etapa, datos))
+
+    def eventos(self, job_id, desde=0):
+        with self._conectar() as conexion:
+            filas = conexion.execute("SELECT evento FROM eventos WHERE job_id = ? AND id > ? ORDER BY id",
+                                     (job_id, desde)).fetchall()
+        return [json.loads(f[0]) for f in filas]
+
+    def existe(self, job_id):
+        with self._conectar() as conexion:
+            return conexion.execute("SELECT 1 FROM trabajos WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def resumen(self):
+        with self._conectar() as conexion:
+            return dict(conexion.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall())
+
+# Pasa un trabajo de pendientes a reservados en un solo paso: si el worker
+# muere a mitad de la reserva, el trabajo no queda fuera de ambas colas
+RESERVAR_LUA = """
+local job_id = redis.call('RPOP', KEYS[1])
+if not job_id then return nil end
+redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+local trabajo = ARGV[2] .. job_id
+local intentos = redis.call('HINCRBY', trabajo, 'intentos', 1)
+redis.call('HSET', trabajo, 'estado', ARGV[3], 'token', ARGV[4], 'trabajador', ARGV[5], 'actualizado', ARGV[6])
+return {job_id, intentos, redis.call('HGET', trabajo, 'datos')}
+"""
+
+# Devuelve a pendientes una reserva vencida, o la marca como error si no
+# quedan intentos. 1: reencolado, 0: agotado, -1: otro worker la recuperó
+RECUPERAR_LUA = """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then return -1 end
+local trabajo = ARGV[2] .. ARGV[1]
+if tonumber(redis.call('HGET', trabajo, 'intentos') or '0') >= tonumber(ARGV[3]) then
+    redis.call('HSET', trabajo, 'estado', ARGV[5], 'token', '', 'error', ARGV[6], 'actualizado', ARGV[7])
+    return 0
+end
+redis.call('HSET', trabajo, 'estado', ARGV[4], 'token', '')
+redis.call('RPUSH', KEYS[1], ARGV[1])
+return 1
+"""
+
+class ColaRedis(ColaTrabajos):
+    """
+    Cola sobre Redis (o un broker compatible) para workers en varias
+    máquinas. Requiere el paquete opcional `redis`.
+
+    Claves: una lista de pendientes, un conjunto ordenado de reservas cuyo
+    puntaje es el vencimiento, un hash por trabajo y una lista de eventos
+    por trabajo. Los pasos de un trabajo entre pendientes y reservados son
+    atómicos (scripts Lua o transacciones MULTI/EXEC).
+    """
+
+    def __init__(self, url=None, config=None, prefijo="tarifas:cola:"):
+        super().__init__(config)
+        if redis is None:
+            raise ImportError("El backend de cola 'redis' requiere el paquete redis (pip install redis)")
+        self.cliente = redis.Redis.from_url(url or self.config["url_redis"], decode_responses=True)
+        self.prefijo = prefijo
+        self._reservar = self.cliente.register_script(RESERVAR_LUA)
+        self._recuperar = self.cliente.register_script(RECUPERAR_LUA)
+
+    def _clave(self, *partes):
+        return self.prefijo + ":".join(partes)
+
+    def encolar(self, job_id, datos):
+        ahora = time.time()
+        self.cliente.hset(self._clave("trabajo", job_id), mapping={
+            "datos": json.dumps(datos, ensure_ascii=False), "estado": PENDIENTE,
+            "intentos": 0, "creado": ahora, "actualizado": ahora
+        })
+        self.emitir(job_id, "encolado")
+        self.cliente.lpush(self._clave("pendientes"), job_id)
+
+    def _recuperar_vencidos(self, ahora):
+        mensaje = f"El trabajo se interrumpió {self.config['max_intentos']} veces"
+        for job_id in self.cliente.zrangebyscore(self._clave("reservados"), 0, ahora):
+            # Solo quien consigue quitar la reserva la procesa
+            recuperado = self._recuperar(
+                keys=[self._clave("pendientes"), self._clave("reservados")],
+                args=[job_id, self._clave("trabajo", ""), self.config["max_intentos"], PENDIENTE, ERROR,
+                      mensaje, ahora])
+            if recuperado == 0:
+                self._terminar(job_id, ERROR, mensaje)
+                self.emitir(job_id, "error", mensaje=mensaje)
+
+    def reservar(self, trabajador):
+        ahora = time.time()
+        self._recuperar_vencidos(ahora)
+        token = uuid.uuid4().hex
+        reservado = self._reservar(
+            keys=[self._clave("pendientes"), self._clave("reservados")],
+            args=[ahora + self.config["visibilidad"], self._clave("trabajo", ""), RESERVADO, token, trabajador,
+                  ahora])
+        if reservado is None:
+            return None
+        job_id, intentos, datos = reservado
+        return Reserva(job_id, token, json.loads(datos), int(intentos))
+
+    def _es_propietario(self, job_id, token):
+        return self.cliente.hget(self._clave("trabajo", job_id), "token") == token
+
+    def _terminar(self, job_id, estado, error=""):
+        trabajo = self._clave("trabajo", job_id)
+        with self.cliente.pipeline(transaction=True) as pipeline:
+            pipeline.zrem(self._clave("reservados"), job_id)
+            pipeline.hset(trabajo, mapping={"estado": estado, "token": "", "error": error, "actualizado": time.time()})
+            for clave in (trabajo, self._clave("eventos", job_id), self._clave("ultimo_evento", job_id)):
+                pipeline.expire(clave, self.config["retencion"])
+            pipeline.execute()
+
+    def renovar(self, job_id, token):
+        if not self._es_propietario(job_id, token):
+            return False
+        self.cliente.zadd(self._clave("reservados"), {job_id: time.time() + self.config["visibilidad"]}, xx=True)
+        return True
+
+    def completar(self, job_id, token):
+        if not self._es_propietario(job_id, token):
+            return False
+        self._terminar(job_id, TERMINADO)
+        return True
+
+    def fallar(self, job_id, token, error, reintentar=False):
+        if not self._es_propietario(job_id, token):
+            return False
+        trabajo = self._clave("trabajo", job_id)
+        if reintentar and int(self.cliente.hget(trabajo, "intentos") or 0) < self.config["max_intentos"]:
+            with self.cliente.pipeline(transaction=True) as pipeline:
+                pipeline.zrem(self._clave("reservados"), job_id)
+                pipeline.hset(trabajo, mapping={"estado": PENDIENTE, "token": "", "error": str(error)})
+                pipeline.rpush(self._clave("pendientes"), job_id)
+                pipeline.execute()
+        else:
+            self._terminar(job_id, ERROR, str(error))
+        return True
+
+    def cancelar(self, job_id):
+        if not self.cliente.lrem(self._clave("pendientes"), 0, job_id):
+            return False
+        self._terminar(job_id, ERROR, "cancelado")
+        self.emitir(job_id, "error", mensaje="Trabajo cancelado")
+        return True
+
+    def emitir(self, job_id, etapa, **datos):
+        evento = self._evento(self.cliente.incr(self._clave("ultimo_evento", job_id)), etapa, datos)
+        self.cliente.rpush(self._clave("eventos", job_id), json.dumps(evento, ensure_ascii=False))
+        return evento
+
+    def eventos(self, job_id, desde=0):
+        # Los ids son consecutivos desde 1, así que coinciden con la posición en la lista
+        return [json.loads(e) for e in self.cliente.lrange(self._clave("eventos", job_id), desde, -1)]
+
+    def existe(self, job_id):
+        return bool(self.cliente.exists(self._clave("trabajo", job_id)))
+
+    def resumen(self):
+        return {
+            PENDIENTE: self.cliente.llen(self._clave("pendientes")),
+            RESERVADO: self.cliente.zcard(self._clave("reservados"))
+        }
+
+def obtener_cola(config=None):
+    """Crea la cola del backend configurado en COLA_CONFIG"""
+    config = dict(COLA_CONFIG, **(config or {}))
+    if config["backend"] == "redis":
+        return ColaRedis(config=config)
+    if config["backend"] == "sqlite":
+        return ColaSQLite(config=config)
+    raise ValueError(f"Backend de cola desconocido: {config['backend']}")
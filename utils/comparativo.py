@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from config.config import COMPARATIVO_CONFIG
+from utils.bloqueo import bloqueo_archivo
+from utils.normalizacion import normalizar_comercializador, normalizar_mercado, normalizar_nivel, parsear_numero
+
+SEPARADOR = "|"
+
+class ComparativoTarifas:
+    """
+    Tabla consolidada mercado × nivel de tensión × comercializador con el
+    CU + COT de cada publicación. Se actualiza en el lugar con cada archivo
+    procesado (solo se tocan las celdas del comercializador que publica) y
+    mantiene precalculado el comercializador más barato de cada celda.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or COMPARATIVO_CONFIG["ruta"]
+        self._lock = threading.RLock()
+        self._mtime = None
+        self.valores = {}
+        self.mas_barato_por_clave = {}
+        self.claves_por_comercializador = {}
+        self._cargar()
+
+    @staticmethod
+    def clave(mercado, nivel):
+        return f"{normalizar_mercado(mercado)}{SEPARADOR}{normalizar_nivel(nivel)}"
+
+    def _cargar(self):
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        self._mtime = os.path.getmtime(self.ruta)
+        self.valores = datos.get("valores", {})
+        self.mas_barato_por_clave = datos.get("mas_barato", {})
+        self.claves_por_comercializador = {}
+        for clave, celdas in self.valores.items():
+            for comercializador in celdas:
+                self.claves_por_comercializador.setdefault(comercializador, set()).add(clave)
+
+    def _refrescar(self):
+        """Recarga la tabla si otro proceso la modificó en disco"""
+        if os.path.exists(self.ruta) and os.path.getmtime(self.ruta) != self._mtime:
+            self._cargar()
+
+    def _guardar(self):
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        # Temporal único por escritura: varios procesos guardan el mismo archivo
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directorio or ".", suffix=".tmp",
+                                         delete=False) as f:
+            json.dump({"valores": self.valores, "mas_barato": self.mas_barato_por_clave},
+                      f, ensure_ascii=False)
+        os.replace(f.name, self.ruta)
+        self._mtime = os.path.getmtime(self.ruta)
+
+    def _recalcular(self, clave):
+        """Actualiza el más barato de una celda (a lo sumo un valor por comercializador)"""
+        celdas = self.valores.get(clave)
+        if not celdas:
+            self.valores.pop(clave, None)
+            self.mas_barato_por_clave.pop(clave, None)
+            return
+        self.mas_barato_por_clave[clave] = min(celdas, key=lambda c: celdas[c]["CU + COT"])
+
+    def actualizar_desde_csv(self, csv_path, archivo=None):
+        """Incorpora un CSV procesado (formato de 12 columnas)"""
+        with open(csv_path, "r", encoding="utf-8") as f:
+            return self.actualizar(csv.DictReader(f), archivo or os.path.basename(csv_path))
+
+    def actualizar(self, filas, archivo=""):
+        """
+        Incorpora las filas de una publicación. Los valores anteriores de los
+        comercializadores presentes se reemplazan por los nuevos.
+
+        Returns:
+            set: comercializadores actualizados
+        """
+        nuevos = {}
+        for fila in filas:
+            try:
+                comercializador = normalizar_comercializador(fila["Comercializador"])
+                clave = self.clave(fila["Mercado"], fila["Nivel de Tensión"])
+                valores = {c: parsear_numero(fila[c]) for c in ("CU", "COT", "CU + COT")}
+                if any(v != v for v in valores.values()):
+                    raise ValueError(f"valor no numérico en {clave}")
+                nuevos.setdefault(comercializador, {})[clave] = {
+                    **valores,
+                    "archivo": archivo,
+                    "actualizado": time.strftime("%Y-%m-%dT%H:%M:%S")
+                }
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Fila omitida en el comparativo: {e}")
+
+        if not nuevos:
+            return set()
+        # El bloqueo de archivo serializa a los demás procesos; bajo él se
+        # relee la tabla del disco para no pisar sus actualizaciones
+        with self._lock, bloqueo_archivo(self.ruta):
+            self._cargar()
+            for comercializador, celdas in nuevos.items():
+                anteriores = self.claves_por_comercializador.get(comercializador, set())
+                for clave in anteriores - set(celdas):
+                    self.valores.get(clave, {}).pop(comercializador, None)
+                for clave, valor in celdas.items():
+                    self.valores.setdefault(clave, {})[comercializador] = valor
+                for clave in anteriores | set(celdas):
+                    self._recalcular(clave)
+                self.claves_por_comercializador[comercializador] = set(celdas)
+            self._guardar()
+        return set(nuevos)
+
+    def mas_barato(self, mercado, nivel=None):
+        """
+        Comercializador más barato (CU + COT) de un mercado y nivel, o de
+        todos los niveles del mercado si no se indica el nivel.
+        """
+        with self._lock:
+            self._refrescar()
+            if nivel is not None:
+                clave = self.clave(mercado, nivel)
+                comercializador = self.mas_barato_por_clave.get(clave)
+                if not comercializador:
+                    return None
+                return {"nivel": normalizar_nivel(nivel), "comercializador": comercializador,
+                        "CU + COT": self.valores[clave][comercializador]["CU + COT"]}
+
+            prefijo = normalizar_mercado(mercado) + SEPARADOR
+            return [
+                self.mas_barato(mercado, clave[len(prefijo):])
+                for clave in sorted(self.mas_barato_por_clave) if clave.startswith(prefijo)
+            ]
+
+    def como_filas(self, mercado=None, nivel=None):
+        """Filas de la tabla pivote, opcionalmente filtradas"""
+        with self._lock:
+            self._refrescar()
+            return self._filas(mercado, nivel)
+
+    def _filas(self, mercado, nivel):
+        filas = []
+        for clave in sorted(self.valores):
+            mercado_fila, nivel_fila = clave.split(SEPARADOR, 1)
+            if mercado and mercado_fila != normalizar_mercado(mercado):
+                continue
+            if nivel and nivel_fila != normalizar_nivel(nivel):
+                continue
+            celdas = self.valores[clave]
+            filas.append({
+                "Mercado": mercado_fila,
+                "Nivel de Tensión": nivel_fila,
+                "valores": {c: v["CU + COT"] for c, v in sorted(celdas.items())},
+                "mas_barato": self.mas_barato_por_clave.get(clave)
+            })
+        return filas
+
+    def exportar_csv(self):
+        """Exporta la tabla pivote como texto CSV (una columna por comercializador)"""
+        filas = self.como_filas()
+        comercializadores = sorted({c for fila in filas for c in fila["valores"]})
+        salida = io.StringIO()
+        escritor = csv.writer(salida)
+        escritor.writerow(["Mercado", "Nivel de Tensión"] + comercializadores + ["Más barato"])
+        for fila in filas:
+            escritor.writerow(
+                [fila["Mercado"], fila["Nivel de Tensión"]]
+                + [fila["valores"].get(c, "") for c in comercializadores]
+                + [fila["mas_barato"]]
+            )
+        return salida.getvalue()
@@ -4,6 +4,9 @@ import os
 from datetime import datetime
 from config.example_json import MERCADOS, NIVELES_TENSION, OPERADORES
 
+COLUMNAS_TEXTO = ['Comercializador', 'Mercado', 'Nivel de Tensión']
+COLUMNAS_NUMERICAS = ['G', 'T', 'D', 'C', 'COT', 'P', 'R', 'CU', 'CU + COT']
+
 class CSVToJSONConverter:
     """Clase para convertir archivos CSV de tarifas a formato JSON"""
     
@@ -19,6 +22,25 @@ class CSVToJSONConverter:
             return None
         return float(cu_cot) - float(comercializacion)
     
+    def convertir_df(self, df):
+        """
+        Convierte un DataFrame de tarifas (formato de 12 columnas) a la
+        estructura JSON, sin pasar por disco.
+
+        Raises:
+            ValueError: si falta alguna columna requerida
+        """
+        for col in COLUMNAS_TEXTO + COLUMNAS_NUMERICAS:
+            if col not in df.columns:
+                raise ValueError(f"Columna requerida no encontrada: {col}")
+
+        datos = pd.concat([df[COLUMNAS_TEXTO].astype(str), df[COLUMNAS_NUMERICAS].astype(float)], axis=1)
+        return {"datos": datos.to_dict(orient="records")}
+
+    def serializar(self, json_data):
+        """Bytes del JSON compacto, listos para escribirse o publicarse"""
+        return json.dumps(json_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
     def convertir_csv_a_json(self, csv_path):
         """
         Convierte un archivo CSV de tarifas eléctricas a formato JSON estructurado.
@@ -30,55 +52,19 @@ class CSVToJSONConverter:
             str: Ruta al archivo JSON generado
         """
         try:
-            # Leer el CSV
-            df = pd.read_csv(csv_path)
-            
-            # Verificar que las columnas requeridas existen
-            required_columns = [
-                'Comercializador', 'Mercado', 'Nivel de Tensión',
-                'G', 'T', 'D', 'C', 'COT', 'P', 'R', 'CU', 'CU + COT'
-            ]
-            
-            for col in required_columns:
-                if col not in df.columns:
-                    raise ValueError(f"Columna requerida no encontrada: {col}")
-            
-            # Crear estructura base del JSON
-            json_data = {
-                "datos": []
-            }
-            
-            # Procesar cada fila del CSV
-            for _, row in df.iterrows():
-                # Crear entrada de tarifa
-                rate_entry = {
-                    "Comercializador": str(row['Comercializador']),
-                    "Mercado": str(row['Mercado']),
-                    "Nivel de Tensión": str(row['Nivel de Tensión']),
-                    "G": float(row['G']),
-                    "T": float(row['T']),
-                    "D": float(row['D']),
-                    "C": float(row['C']),
-                    "COT": float(row['COT']),
-                    "P": float(row['P']),
-                    "R": float(row['R']),
-                    "CU": float(row['CU']),
-                    "CU + COT": float(row['CU + COT'])
-                }
-                
-                json_data["datos"].append(rate_entry)
+            json_data = self.convertir_df(pd.read_csv(csv_path))
             
             # Generar nombre del archivo JSON
             base_name = os.path.splitext(os.path.basename(csv_path))[0]
             json_path = os.path.join(os.path.dirname(csv_path), f"{base_name}.json")
             
             # Guardar el JSON
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, indent=2, ensure_ascii=False)
+            with open(json_path, 'wb') as f:
+                f.write(self.serializar(json_data))
             
             print(f"JSON guardado exitosamente en {json_path}")
             return json_path
             
         except Exception as e:
             print(f"Error al convertir CSV a JSON: {e}")
-            return None 
\ No newline at end of file
+            return None
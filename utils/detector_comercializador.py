@@ -0,0 +1,199 @@
+import csv
+import io
+import math
+import os
+import re
+from collections import namedtuple
+from config.comercializadores import COMERCIALIZADORES
+from config.config import DETECCION_CONFIG, get_tesseract_path
+
+Deteccion = namedtuple("Deteccion", ["comercializador", "confianza", "puntajes"])
+
+# Pesos de cada tipo de huella
+PESO_TEXTO = 3.0
+PESO_COLUMNA_CSV = 2.0
+PESO_NOMBRE_ARCHIVO = 4.0
+PESO_ETIQUETA = 1.0
+# Un CSV procesado declara su comercializador en cada fila; sus etiquetas
+# ya canónicas coinciden con las de muchos comercializadores
+PESO_COMERCIALIZADOR_DECLARADO = 10.0
+
+# Columna de los CSV procesados con el comercializador de cada fila
+COLUMNA_COMERCIALIZADOR = "comercializador"
+
+# Texto que devuelve ImageProcessor cuando el OCR falla
+ERROR_OCR = "ERROR EN OCR"
+
+class DetectorComercializador:
+    """
+    Clasificador local que identifica el comercializador de un documento a
+    partir de huellas de texto, columnas del CSV, nombre del archivo, el
+    comercializador declarado en los CSV procesados y las etiquetas de
+    mercado y nivel de tensión propias de cada comercializador. Los PDF sin
+    capa de texto se leen con OCR.
+    """
+
+    def __init__(self, comercializadores=None, config=None, image_processor=None):
+        self.comercializadores = comercializadores or COMERCIALIZADORES
+        self.config = config or DETECCION_CONFIG
+        self._image_processor = image_processor
+        self._compilar()
+
+    def _compilar(self):
+        """Precompila las expresiones regulares de todas las huellas"""
+        self._huellas = {}
+        frecuencia = {}
+        for codigo, info in self.comercializadores.items():
+            huellas = info.get("huellas", {})
+            etiquetas = set(info.get("mercado_mapping", {})) | set(info.get("tension_mapping", {}))
+            # Las etiquetas cortas ("2", "3") no aportan información
+            etiquetas = {e for e in etiquetas if len(e) > 3}
+            for etiqueta in etiquetas:
+                frecuencia[etiqueta] = frecuencia.get(etiqueta, 0) + 1
+            texto = [re.compile(p, re.IGNORECASE) for p in huellas.get("texto", [])]
+            nombres = {codigo, info.get("name", codigo)}
+            self._huellas[codigo] = {
+                "texto": texto,
+                # Valores de la columna Comercializador que corresponden a este código
+                "declarado": [re.compile(rf"(?<!\w){re.escape(n)}(?!\w)", re.IGNORECASE) for n in nombres] + texto,
+                "nombre_archivo": [re.compile(p, re.IGNORECASE) for p in huellas.get("nombre_archivo", [])],
+                "columnas_csv": [c.lower() for c in huellas.get("columnas_csv", [])],
+                "etiquetas": etiquetas
+            }
+
+        # Una etiqueta compartida por varios comercializadores pesa menos
+        for huellas in self._huellas.values():
+            huellas["etiquetas"] = {e: PESO_ETIQUETA / frecuencia[e] for e in huellas["etiquetas"]}
+
+        # Todas las etiquetas se buscan con una sola expresión (las más largas primero)
+        todas = sorted(frecuencia, key=len, reverse=True)
+        self._patron_etiquetas = re.compile(
+            r"(?<!\w)(?:" + "|".join(re.escape(e) for e in todas) + r")(?!\w)"
+        ) if todas else None
+
+    def puntuar(self, texto, nombre_archivo="", columnas=None, declarados=None):
+        """
+        Calcula el puntaje de cada comercializador para el contenido dado.
+        declarados son los valores de la columna Comercializador de un CSV
+        ya procesado.
+        """
+        columnas = {c.strip().lower() for c in (columnas or [])}
+        declarados = {d.strip() for d in (declarados or []) if d and d.strip()}
+        nombre_archivo = os.path.basename(nombre_archivo or "")
+        texto = texto[:self.config["max_caracteres"]]
+        encontradas = set(self._patron_etiquetas.findall(texto)) if self._patron_etiquetas else set()
+        puntajes = {}
+        for codigo, huellas in self._huellas.items():
+            puntaje = 0.0
+            puntaje += PESO_TEXTO * sum(1 for p in huellas["texto"] if p.search(texto))
+            puntaje += PESO_NOMBRE_ARCHIVO * sum(1 for p in huellas["nombre_archivo"] if p.search(nombre_archivo))
+            puntaje += PESO_COLUMNA_CSV * sum(1 for c in huellas["columnas_csv"] if c in columnas)
+            puntaje += sum(peso for e, peso in huellas["etiquetas"].items() if e in encontradas)
+            if any(p.search(d) for d in declarados for p in huellas["declarado"]):
+                puntaje += PESO_COMERCIALIZADOR_DECLARADO
+            puntajes[codigo] = round(puntaje, 3)
+        return puntajes
+
+    def detectar(self, texto, nombre_archivo="", columnas=None, declarados=None):
+        """
+        Devuelve una Deteccion con el comercializador más probable y una
+        confianza entre 0 y 1. Si ninguno alcanza los umbrales configurados,
+        el comercializador es None.
+        """
+        puntajes = self.puntuar(texto, nombre_archivo, columnas, declarados)
+        ordenados = sorted(puntajes.items(), key=lambda item: item[1], reverse=True)
+        mejor, puntaje_mejor = ordenados[0]
+
+        if puntaje_mejor <= 0:
+            return Deteccion(None, 0.0, puntajes)
+
+        # Confianza: probabilidad softmax del mejor puntaje, atenuada si hay poca evidencia
+        temperatura = self.config["temperatura"]
+        exponentes = [math.exp((p - puntaje_mejor) / temperatura) for p in puntajes.values()]
+        evidencia = min(1.0, puntaje_mejor / self.config["puntaje_minimo"])
+        confianza = round(evidencia / sum(exponentes), 3)
+
+        if confianza < self.config["confianza_minima"]:
+            return Deteccion(None, confianza, puntajes)
+        return Deteccion(mejor, confianza, puntajes)
+
+    def detectar_archivo(self, ruta, nombre_archivo=None, datos=None):
+        """
+        Detecta el comercializador leyendo solo el inicio de un PDF o CSV.
+        Con datos (bytes del archivo ya en memoria) no se lee el disco.
+        """
+        nombre_archivo = nombre_archivo or ruta
+        if nombre_archivo.lower().endswith(".csv"):
+            texto, columnas, declarados = self._leer_inicio_csv(ruta, datos)
+        else:
+            texto, columnas, declarados = self._leer_inicio_pdf(ruta, datos), None, None
+        return self.detectar(texto, nombre_archivo, columnas, declarados)
+
+    def _leer_inicio_csv(self, ruta, datos=None):
+        max_filas = self.config["max_filas_csv"]
+        if datos is not None:
+            origen = io.TextIOWrapper(io.BytesIO(datos), encoding="utf-8", errors="replace")
+        else:
+            origen = open(ruta, "r", encoding="utf-8", errors="replace")
+        with origen as f:
+            lineas = []
+            for i, linea in enumerate(f):
+                if i > max_filas:
+                    break
+                lineas.append(linea)
+        filas = list(csv.reader(lineas))
+        columnas = filas[0] if filas else []
+        indices = [i for i, c in enumerate(columnas) if c.strip().lower() == COLUMNA_COMERCIALIZADOR]
+        declarados = {fila[indices[0]] for fila in filas[1:] if indices and len(fila) > indices[0]}
+        return "".join(lineas), columnas, declarados
+
+    def _leer_inicio_pdf(self, ruta, datos=None):
+        # PyMuPDF extrae el texto mucho más rápido que pdfplumber; para la
+        # detección basta con el texto sin la disposición de las tablas
+        import fitz
+
+        textos = []
+        try:
+            documento = fitz.open(stream=datos, filetype="pdf") if datos is not None else fitz.open(ruta)
+            with documento:
+                paginas = range(min(len(documento), self.config["max_paginas_pdf"]))
+                for num_pagina in paginas:
+                    textos.append(documento[num_pagina].get_text())
+                # PDF escaneado o de imágenes: sin capa de texto no hay huellas que buscar
+                if len("".join(textos).strip()) < self.config["min_caracteres_texto"] and self.config["ocr"]:
+                    textos.append(self._ocr_paginas(documento, paginas))
+        except Exception as e:
+            print(f"No se pudo leer el PDF para detectar el comercializador: {e}")
+        return "\n".join(textos)
+
+    def _ocr_paginas(self, documento, paginas):
+        """Texto de las páginas renderizadas, con el motor de OCR compartido del proceso"""
+        import fitz
+        import numpy as np
+
+        if self._image_processor is None:
+            from utils.image_processor import ImageProcessor
+            self._image_processor = ImageProcessor(get_tesseract_path())
+
+        textos = []
+        for num_pagina in paginas:
+            pixmap = documento[num_pagina].get_pixmap(dpi=self.config["dpi_ocr"], colorspace=fitz.csGRAY)
+            imagen = np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.height, pixmap.width)
+            texto = self._image_processor.extraer_texto_de_imagen(imagen)
+            if texto != ERROR_OCR:
+                textos.append(texto)
+        return "\n".join(textos)
+
+_detector = None
+
+def detectar_comercializador(ruta, nombre_archivo=None, datos=None):
+    """Atajo que reutiliza un detector compartido con las huellas ya compiladas"""
+    global _detector
+    if _detector is None:
+        _detector = DetectorComercializador()
+    return _detector.detectar_archivo(ruta, nombre_archivo, datos)
+
+def reiniciar_detector():
+    """Descarta el detector compartido para que el siguiente compile las huellas actuales"""
+    global _detector
+    _detector = None
@@ -0,0 +1,176 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import time
+from config.comercializadores import COMERCIALIZADORES
+from config.config import DIFF_CONFIG
+
+PREAMBULO = "__preambulo__"
+
+def _hash_seccion(texto):
+    """Hash del texto de una sección ignorando diferencias de espacios"""
+    normalizado = " ".join(texto.split())
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+class HistorialMercados:
+    """
+    Almacena por comercializador y periodo el texto, las secciones por
+    mercado y el CSV generado, para compararlos con la siguiente publicación.
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or DIFF_CONFIG["directorio"]
+
+    def _ruta(self, comercializador, periodo=""):
+        return os.path.join(self.directorio, comercializador, periodo)
+
+    def ultimo(self, comercializador):
+        """Devuelve los artefactos guardados más recientes o None"""
+        base = self._ruta(comercializador)
+        if not os.path.isdir(base):
+            return None
+
+        candidatos = []
+        for periodo in os.listdir(base):
+            meta_path = os.path.join(base, periodo, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    candidatos.append(json.load(f))
+        if not candidatos:
+            return None
+
+        meta = max(candidatos, key=lambda m: m["guardado"])
+        carpeta = self._ruta(comercializador, meta["periodo"])
+        with open(os.path.join(carpeta, "salida.csv"), "r", encoding="utf-8") as f:
+            meta["csv"] = f.read()
+        return meta
+
+    def guardar(self, comercializador, periodo, secciones, texto, csv_content):
+        carpeta = self._ruta(comercializador, periodo)
+        os.makedirs(carpeta, exist_ok=True)
+        with open(os.path.join(carpeta, "texto.txt"), "w", encoding="utf-8") as f:
+            f.write(texto)
+        with open(os.path.join(carpeta, "salida.csv"), "w", encoding="utf-8") as f:
+            f.write(csv_content)
+        meta = {
+            "periodo": periodo,
+            "guardado": time.time(),
+            "secciones": {mercado: _hash_seccion(t) for mercado, t in secciones.items()}
+        }
+        with open(os.path.join(carpeta, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+class DiffMercados:
+    """
+    Divide el texto de un documento en secciones por mercado usando las
+    etiquetas de mercado_mapping del comercializador y lo compara con la
+    publicación anterior para enviar a Claude solo los mercados modificados.
+    """
+
+    def __init__(self, comercializador, comercializadores=None):
+        comercializadores = comercializadores or COMERCIALIZADORES
+        self.comercializador = comercializador
+        self.mapping = comercializadores[comercializador].get("mercado_mapping", {})
+        # Las etiquetas más largas primero para que "NORTE DE SANTANDER" no se
+        # confunda con "SANTANDER"
+        etiquetas = sorted(self.mapping, key=len, reverse=True)
+        self._patron = re.compile(
+            r"(?<!\w)(" + "|".join(re.escape(e) for e in etiquetas) + r")(?!\w)"
+        ) if etiquetas else None
+
+    def seccionar(self, texto):
+        """
+        Devuelve un diccionario {mercado: texto} en el orden del documento. El
+        texto anterior al primer mercado (valores comunes como T y R) queda en
+        la sección PREAMBULO.
+        """
+        secciones = {PREAMBULO: ""}
+        coincidencias = list(self._patron.finditer(texto)) if self._patron else []
+        if not coincidencias:
+            secciones[PREAMBULO] = texto
+            return secciones
+
+        secciones[PREAMBULO] = texto[:coincidencias[0].start()]
+        for actual, siguiente in zip(coincidencias, coincidencias[1:] + [None]):
+            fin = siguiente.start() if siguiente else len(texto)
+            mercado = self.mapping[actual.group(1)]
+            secciones[mercado] = secciones.get(mercado, "") + texto[actual.start():fin]
+        return secciones
+
+    def seccionar_csv(self, csv_text, columna_mercado):
+        """Agrupa las filas de un CSV de entrada por mercado; el encabezado es el preámbulo"""
+        lineas = csv_text.splitlines(keepends=True)
+        if not lineas:
+            return {PREAMBULO: ""}
+        encabezado = next(csv.reader(lineas[:1]))
+        if columna_mercado not in encabezado:
+            return {PREAMBULO: csv_text}
+
+        idx = encabezado.index(columna_mercado)
+        secciones = {PREAMBULO: lineas[0]}
+        for linea, fila in zip(lineas[1:], csv.reader(lineas[1:])):
+            if len(fila) <= idx:
+                continue
+            mercado = self.mapping.get(fila[idx], fila[idx])
+            secciones[mercado] = secciones.get(mercado, "") + linea
+        return secciones
+
+    def comparar(self, secciones, anterior):
+        """
+        Clasifica los mercados en modificados y sin cambios respecto a los
+        artefactos anteriores. Si cambia el preámbulo todo se considera
+        modificado, porque contiene valores que aplican a todos los mercados.
+        """
+        mercados = [m for m in secciones if m != PREAMBULO]
+        if not anterior:
+            return mercados, []
+
+        hashes = anterior["secciones"]
+        if hashes.get(PREAMBULO) != _hash_seccion(secciones[PREAMBULO]):
+            return mercados, []
+
+        mercados_previos = {fila["Mercado"] for fila in csv.DictReader(io.StringIO(anterior["csv"]))}
+        modificados, sin_cambios = [], []
+        for mercado in mercados:
+            if hashes.get(mercado) == _hash_seccion(secciones[mercado]) and mercado in mercados_previos:
+                sin_cambios.append(mercado)
+            else:
+                modificados.append(mercado)
+        return modificados, sin_cambios
+
+    @staticmethod
+    def texto_parcial(secciones, mercados):
+        """Reconstruye el texto con el preámbulo y solo las secciones indicadas"""
+        return secciones[PREAMBULO] + "".join(secciones[m] for m in secciones if m in mercados)
+
+    @staticmethod
+    def combinar_csv(csv_nuevo, csv_anterior, sin_cambios, orden):
+        """
+        Une las filas nuevas con las filas anteriores de los mercados sin
+        cambios, respetando el orden de los mercados en el documento.
+        """
+        lector_nuevo = csv.reader(io.StringIO(csv_nuevo)) if csv_nuevo else iter(())
+        lector_anterior = csv.reader(io.StringIO(csv_anterior))
+        encabezado = next(lector_anterior)
+        next(lector_nuevo, None)
+        idx = encabezado.index("Mercado")
+
+        filas = {}
+        for fila in lector_nuevo:
+            if fila:
+                filas.setdefault(fila[idx], []).append(fila)
+        # Si Claude devolvió igualmente un mercado sin cambios, prevalecen sus filas
+        nuevos = set(filas)
+        for fila in lector_anterior:
+            if fila and fila[idx] in sin_cambios and fila[idx] not in nuevos:
+                filas.setdefault(fila[idx], []).append(fila)
+
+        salida = io.StringIO()
+        escritor = csv.writer(salida, lineterminator="\n")
+        escritor.writerow(encabezado)
+        for mercado in [m for m in orden if m in filas] + [m for m in filas if m not in orden]:
+            escritor.writerows(filas[mercado])
+        return salida.getvalue().strip()
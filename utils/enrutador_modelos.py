@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from config.config import MODELOS_CONFIG
+from utils.bloqueo import bloqueo_archivo
+from utils.pronostico import obtener_pronosticador
+
+# Latencias recientes que se conservan por modelo para los percentiles
+MAX_LATENCIAS = 200
+
+def es_estructurado(texto, lineas_muestra=20):
+    """
+    Indica si el texto es tabular (CSV): las primeras líneas tienen el mismo
+    número de comas y al menos tres columnas.
+    """
+    lineas = [l for l in texto.splitlines()[:lineas_muestra] if l.strip()]
+    if len(lineas) < 2:
+        return False
+    columnas = {l.count(",") for l in lineas}
+    return len(columnas) == 1 and columnas.pop() >= 2
+
+class EstadisticasModelos:
+    """
+    Éxitos, fallos y latencias de cada modelo, persistidos en JSON para
+    ajustar los umbrales del enrutamiento.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or MODELOS_CONFIG["estadisticas"]
+        self._lock = threading.Lock()
+        self.datos = self._leer()
+
+    def _leer(self):
+        if not self.ruta or not os.path.exists(self.ruta):
+            return {}
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def registrar(self, modelo, exito, latencia, motivo=None):
+        if not self.ruta:
+            with self._lock:
+                self._sumar(modelo, exito, latencia, motivo)
+            return
+        # La web y los workers registran en el mismo archivo: bajo el bloqueo
+        # se parte de lo que hay en disco y se suma solo esta llamada
+        with self._lock, bloqueo_archivo(self.ruta):
+            self.datos = self._leer()
+            self._sumar(modelo, exito, latencia, motivo)
+            self._guardar()
+
+    def _sumar(self, modelo, exito, latencia, motivo):
+        entrada = self.datos.setdefault(modelo, {
+            "intentos": 0, "exitos": 0, "fallos": {}, "latencias": []
+        })
+        entrada["intentos"] += 1
+        if exito:
+            entrada["exitos"] += 1
+            entrada["latencias"] = (entrada["latencias"] + [round(latencia, 3)])[-MAX_LATENCIAS:]
+        else:
+            entrada["fallos"][motivo or "error"] = entrada["fallos"].get(motivo or "error", 0) + 1
+        entrada["actualizado"] = time.time()
+
+    def _guardar(self):
+        directorio = os.path.dirname(self.ruta)
+        # Temporal único por escritura y os.replace: los lectores nunca ven un archivo a medias
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directorio or ".", suffix=".tmp",
+                                         delete=False) as f:
+            json.dump(self.datos, f, ensure_ascii=False)
+        os.replace(f.name, self.ruta)
+
+    def resumen(self):
+        """Tasa de éxito y percentiles de latencia por modelo"""
+        with self._lock:
+            resumen = {}
+            for modelo, entrada in self.datos.items():
+                latencias = sorted(entrada["latencias"])
+                percentil = lambda p: latencias[min(len(latencias) - 1, int(p * len(latencias)))] if latencias else None
+                resumen[modelo] = {
+                    "intentos": entrada["intentos"],
+                    "tasa_exito": round(entrada["exitos"] / entrada["intentos"], 3) if entrada["intentos"] else None,
+                    "fallos": dict(entrada["fallos"]),
+                    "latencia_p50": percentil(0.5),
+                    "latencia_p95": percentil(0.95)
+                }
+            return resumen
+
+class EnrutadorModelos:
+    """
+    Elige la secuencia de modelos para una petición: los niveles baratos solo
+    se usan si la entrada es lo bastante pequeña (con un límite mayor para
+    entradas tabulares) y si la salida pronosticada cabe en su max_tokens;
+    el último nivel siempre está disponible.
+    """
+
+    def __init__(self, config=None, estadisticas=None, pronosticador=None):
+        self.config = config or MODELOS_CONFIG
+        self.estadisticas = estadisticas or EstadisticasModelos(self.config.get("estadisticas"))
+        self.pronosticador = pronosticador
+
+    def _cabe(self, nivel, texto):
+        """La salida pronosticada, con el margen de seguridad, cabe en el max_tokens del nivel"""
+        pronosticador = self.pronosticador or obtener_pronosticador()
+        return pronosticador.tokens_salida(texto) * pronosticador.config["margen_salida"] <= nivel["max_tokens"]
+
+    def niveles_para(self, texto):
+        niveles = self.config["niveles"]
+        if not self.config.get("habilitado", True):
+            return niveles[-1:]
+
+        estructurado = es_estructurado(texto)
+        elegidos = []
+        for nivel in niveles[:-1]:
+            limite = nivel["max_caracteres_estructurado" if estructurado else "max_caracteres_texto"]
+            # Una salida que no cabe se truncaría y obligaría a escalar de todos modos
+            if len(texto) <= limite and self._cabe(nivel, texto):
+                elegidos.append(nivel)
+        return elegidos + niveles[-1:]
+
+_enrutador = None
+
+def obtener_enrutador():
+    """Enrutador compartido del proceso, con las estadísticas de todos los clientes"""
+    global _enrutador
+    if _enrutador is None:
+        _enrutador = EnrutadorModelos()
+    return _enrutador
@@ -0,0 +1,187 @@
+"""
+Exportador masivo de CSV procesados al esquema de EXAMPLE_JSON (rates con IDs).
+
+Uso:
+    python -m utils.exportador_rates <csv ...> [--salida DIR] [--periodo AAAA-MM-DD] [--workers N]
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config.example_json import MERCADOS, NIVELES_TENSION, OPERADORES
+from utils.normalizacion import normalizar_comercializador, normalizar_df, por_valores
+
+# Columnas del CSV procesado -> campos de cada rate
+CAMPOS_RATES = {
+    "G": "generation",
+    "T": "transmission",
+    "D": "distribution",
+    "C": "commercialization",
+    "COT": "operation_transaction",
+    "P": "losses",
+    "R": "restrictions",
+    "CU": "unit_cost",
+    "CU + COT": "unit_cost_with_contribution"
+}
+
+class TablaIds:
+    """Tabla de nombre -> ID precompilada como índice para búsquedas vectorizadas"""
+
+    def __init__(self, mapeo):
+        self.nombres = list(mapeo)
+        self.claves = pd.Index([self.normalizar(n) for n in self.nombres])
+        self.ids = np.array([mapeo[n] for n in self.nombres], dtype=np.int64)
+
+    @staticmethod
+    def normalizar(valor):
+        return " ".join(str(valor).upper().split())
+
+    def buscar(self, serie):
+        """
+        Devuelve (ids, nombres canónicos, valores sin mapear). Los ids sin
+        correspondencia quedan en -1.
+        """
+        originales = serie.astype(str)
+        normalizada = originales.str.upper().str.split().str.join(" ")
+        codigos = self.claves.get_indexer(normalizada)
+        mapeados = codigos >= 0
+        ids = np.where(mapeados, self.ids[codigos], -1)
+        # Los valores sin correspondencia conservan su nombre original
+        nombres = np.where(mapeados, np.array(self.nombres, dtype=object)[codigos], originales.to_numpy())
+        sin_mapear = sorted(set(originales[~mapeados]))
+        return ids, nombres, sin_mapear
+
+class ExportadorRates:
+    """Convierte CSV de tarifas de 12 columnas al JSON de carga de rates"""
+
+    def __init__(self, user_email="", status="active"):
+        self.user_email = user_email
+        self.status = status
+        self.mercados = TablaIds(MERCADOS)
+        self.niveles = TablaIds(NIVELES_TENSION)
+
+    def construir(self, df, periodo):
+        """
+        Construye la estructura de EXAMPLE_JSON a partir de un DataFrame.
+
+        Returns:
+            tuple: (diccionario JSON, reporte de valores sin mapear)
+        """
+        ahora = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        comercializadores = por_valores(df["Comercializador"], normalizar_comercializador)
+        operador = comercializadores.mode().iloc[0] if len(comercializadores) else None
+        operator_id = OPERADORES.get(operador)
+
+        # Etiquetas del operador ("NORTE DE SANTANDER", "TULUÁ") a los nombres de MERCADOS
+        # y componentes con formato local a float, antes de buscar los IDs
+        df = normalizar_df(df.copy(), operador)
+        region_ids, region_nombres, mercados_sin_mapear = self.mercados.buscar(df["Mercado"])
+        nivel_ids, nivel_nombres, niveles_sin_mapear = self.niveles.buscar(df["Nivel de Tensión"])
+
+        rates = pd.DataFrame({
+            "id": np.arange(1, len(df) + 1),
+            "rate_loading_id": None,
+            "region_id": region_ids,
+            "region_name": region_nombres,
+            "tension_level_id": nivel_ids,
+            "tension_level_name": nivel_nombres,
+        })
+        for columna, campo in CAMPOS_RATES.items():
+            rates[campo] = pd.to_numeric(df[columna], errors="coerce").astype(float)
+        rates["status"] = self.status
+        rates["created_at"] = ahora
+        rates["updated_at"] = ahora
+
+        # Los IDs sin correspondencia y los valores no numéricos se exportan como null
+        rates["region_id"] = rates["region_id"].astype(object).where(region_ids >= 0, None)
+        rates["tension_level_id"] = rates["tension_level_id"].astype(object).where(nivel_ids >= 0, None)
+        registros = rates.astype(object).where(rates.notna(), None).to_dict("records")
+
+        datos = {
+            "id": None,
+            "period": periodo,
+            "user_email": self.user_email,
+            "operator_id": operator_id,
+            "operator_name": operador,
+            "status": self.status,
+            "created_at": ahora,
+            "updated_at": ahora,
+            "rates": registros
+        }
+        reporte = {
+            "filas": len(df),
+            "mercados_sin_mapear": mercados_sin_mapear,
+            "niveles_sin_mapear": niveles_sin_mapear,
+            "operador_sin_mapear": None if operator_id else operador,
+            "otros_comercializadores": sorted(set(comercializadores) - {operador})
+        }
+        return datos, reporte
+
+    def exportar_archivo(self, csv_path, directorio_salida=None, periodo=None):
+        """Exporta un CSV y devuelve el reporte con la ruta del JSON generado"""
+        df = pd.read_csv(csv_path)
+        periodo = periodo or datetime.fromtimestamp(os.path.getmtime(csv_path)).strftime("%Y-%m-%d")
+        datos, reporte = self.construir(df, periodo)
+
+        directorio_salida = directorio_salida or os.path.dirname(csv_path)
+        os.makedirs(directorio_salida, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(csv_path))[0]
+        json_path = os.path.join(directorio_salida, f"{base_name}_rates.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+
+        reporte.update(archivo=csv_path, json=json_path)
+        return reporte
+
+def _exportar_en_proceso(argumentos):
+    csv_path, directorio_salida, periodo, user_email = argumentos
+    try:
+        return ExportadorRates(user_email).exportar_archivo(csv_path, directorio_salida, periodo)
+    except Exception as e:
+        return {"archivo": csv_path, "error": str(e)}
+
+def exportar_en_bloque(csv_paths, directorio_salida=None, periodo=None, user_email="", workers=None):
+    """Exporta muchos CSV en paralelo (un proceso por núcleo) y devuelve sus reportes"""
+    argumentos = [(ruta, directorio_salida, periodo, user_email) for ruta in csv_paths]
+    if workers == 1 or len(argumentos) < 2:
+        return [_exportar_en_proceso(a) for a in argumentos]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_exportar_en_proceso, argumentos, chunksize=8))
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta CSV de tarifas al esquema de rates con IDs")
+    parser.add_argument("archivos", nargs="+", help="CSV o patrones glob")
+    parser.add_argument("--salida", help="Directorio de salida (por defecto, junto a cada CSV)")
+    parser.add_argument("--periodo", help="Periodo AAAA-MM-DD (por defecto, fecha del archivo)")
+    parser.add_argument("--email", default="", help="user_email de la carga")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    csv_paths = sorted({ruta for patron in args.archivos for ruta in glob.glob(patron)})
+    inicio = time.perf_counter()
+    reportes = exportar_en_bloque(csv_paths, args.salida, args.periodo, args.email, args.workers)
+    duracion = time.perf_counter() - inicio
+
+    sin_mapear = {"mercados": set(), "niveles": set(), "operadores": set()}
+    for reporte in reportes:
+        if "error" in reporte:
+            print(f"❌ {reporte['archivo']}: {reporte['error']}")
+            continue
+        sin_mapear["mercados"].update(reporte["mercados_sin_mapear"])
+        sin_mapear["niveles"].update(reporte["niveles_sin_mapear"])
+        if reporte["operador_sin_mapear"]:
+            sin_mapear["operadores"].add(reporte["operador_sin_mapear"])
+        print(f"✅ {reporte['archivo']} -> {reporte['json']} ({reporte['filas']} filas)")
+
+    print(f"\n{len(reportes)} archivo(s) exportados en {duracion:.2f}s")
+    for tipo, valores in sin_mapear.items():
+        if valores:
+            print(f"Valores sin mapear ({tipo}): {sorted(valores)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Cálculo vectorizado de facturas sobre las tarifas procesadas (formato de 12
+columnas). Las tarifas se cargan en una matriz de NumPy indexada por
+(comercializador, mercado, nivel de tensión, componente) y los consumos se
+procesan como arreglos, por bloques, sin recorrer fila por fila.
+
+Uso:
+    matriz = MatrizTarifas.desde_csv(["salida/enelx_procesado.csv", "salida/vatia.csv"])
+    mercados = matriz.codificar_mercados(df["mercado"])
+    niveles = matriz.codificar_niveles(df["nivel"])
+    actual = matriz.codificar_comercializadores(df["comercializador"])
+    costos = matriz.facturar(df["kwh"].to_numpy(), mercados, niveles, actual)
+    mejor = matriz.mas_barato(df["kwh"].to_numpy(), mercados, niveles, actual)
+"""
+import csv
+from collections import namedtuple
+import numpy as np
+from utils.normalizacion import normalizar_comercializador, normalizar_mercado, normalizar_nivel, parsear_numero
+
+COMPONENTES = ["G", "T", "D", "C", "COT", "P", "R", "CU", "CU + COT"]
+TOTAL = "CU + COT"
+
+# Índice que reciben las etiquetas que no están en la matriz
+SIN_TARIFA = -1
+
+Comparacion = namedtuple("Comparacion", ["comercializador", "costo", "costo_actual", "ahorro"])
+
+class MatrizTarifas:
+    """
+    Tarifas en un arreglo denso valores[comercializador, mercado, nivel,
+    componente] (NaN donde un comercializador no publica esa celda) con los
+    diccionarios de etiquetas a índices. Los consumos se describen con
+    arreglos de índices enteros, obtenidos con codificar_*.
+    """
+
+    def __init__(self, comercializadores, mercados, niveles, valores):
+        self.comercializadores = list(comercializadores)
+        self.mercados = list(mercados)
+        self.niveles = list(niveles)
+        self.valores = valores
+        self._indice_comercializador = {c: i for i, c in enumerate(self.comercializadores)}
+        self._indice_mercado = {m: i for i, m in enumerate(self.mercados)}
+        self._indice_nivel = {n: i for i, n in enumerate(self.niveles)}
+
+    # --- Construcción ---
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Construye la matriz a partir de filas (dicts) con las 12 columnas"""
+        celdas = {}
+        for fila in filas:
+            try:
+                clave = (normalizar_comercializador(fila["Comercializador"]),
+                         normalizar_mercado(fila["Mercado"]),
+                         normalizar_nivel(fila["Nivel de Tensión"]))
+                celdas[clave] = [parsear_numero(fila[c]) if fila.get(c) not in (None, "") else np.nan
+                                 for c in COMPONENTES]
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Fila omitida en la matriz de tarifas: {e}")
+
+        comercializadores = sorted({c for c, _, _ in celdas})
+        mercados = sorted({m for _, m, _ in celdas})
+        niveles = sorted({n for _, _, n in celdas})
+        valores = np.full((len(comercializadores), len(mercados), len(niveles), len(COMPONENTES)), np.nan)
+        matriz = cls(comercializadores, mercados, niveles, valores)
+        for (comercializador, mercado, nivel), componentes in celdas.items():
+            valores[matriz._indice_comercializador[comercializador],
+                    matriz._indice_mercado[mercado],
+                    matriz._indice_nivel[nivel]] = componentes
+        return matriz
+
+    @classmethod
+    def desde_csv(cls, rutas):
+        """Construye la matriz a partir de uno o varios CSV procesados"""
+        if isinstance(rutas, str):
+            rutas = [rutas]
+        filas = []
+        for ruta in rutas:
+            with open(ruta, "r", encoding="utf-8") as f:
+                filas.extend(csv.DictReader(f))
+        return cls.desde_filas(filas)
+
+    @classmethod
+    def desde_df(cls, df):
+        return cls.desde_filas(df.to_dict(orient="records"))
+
+    @classmethod
+    def desde_comparativo(cls, comparativo):
+        """
+        Construye la matriz desde la tabla comparativa (la última publicación
+        de cada comercializador). Solo incluye CU + COT; el resto de
+        componentes queda en NaN.
+        """
+        filas = [
+            {"Comercializador": comercializador, "Mercado": fila["Mercado"],
+             "Nivel de Tensión": fila["Nivel de Tensión"], TOTAL: valor}
+            for fila in comparativo.como_filas()
+            for comercializador, valor in fila["valores"].items()
+        ]
+        return cls.desde_filas(filas)
+
+    # --- Codificación de etiquetas ---
+
+    @staticmethod
+    def _codificar(etiquetas, indice, normalizar):
+        """
+        Convierte un arreglo de etiquetas en índices. La normalización solo
+        se aplica a los valores distintos, no a cada fila.
+        """
+        import pandas as pd
+
+        codigos, unicos = pd.factorize(np.asarray(etiquetas, dtype=object))
+        traduccion = np.array([indice.get(normalizar(u), SIN_TARIFA) for u in unicos] + [SIN_TARIFA],
+                              dtype=np.int32)
+        # factorize marca los nulos con -1, que apunta al SIN_TARIFA final
+        return traduccion[codigos]
+
+    def codificar_mercados(self, etiquetas):
+        return self._codificar(etiquetas, self._indice_mercado, normalizar_mercado)
+
+    def codificar_niveles(self, etiquetas):
+        return self._codificar(etiquetas, self._indice_nivel, normalizar_nivel)
+
+    def codificar_comercializadores(self, etiquetas):
+        return self._codificar(etiquetas, self._indice_comercializador, normalizar_comercializador)
+
+    # --- Cálculo ---
+
+    @staticmethod
+    def _tarifas(valores, comercializadores, mercados, niveles):
+        """Tarifas por fila; NaN donde falta la celda o algún índice es SIN_TARIFA"""
+        validos = (comercializadores >= 0) & (mercados >= 0) & (niveles >= 0)
+        tarifas = valores[comercializadores, mercados, niveles]
+        tarifas[~validos] = np.nan
+        return tarifas
+
+    def facturar(self, consumo, mercados, niveles, comercializadores, componentes=(TOTAL,),
+                 tamano_bloque=1_000_000):
+        """
+        Costo de cada consumo (kWh) con su comercializador.
+
+        Args:
+            consumo: arreglo de kWh
+            mercados, niveles, comercializadores: índices de codificar_*,
+                o un entero para usar el mismo comercializador en todas las filas
+            componentes: componentes a calcular (por defecto solo CU + COT)
+
+        Returns:
+            np.ndarray: (filas, componentes); NaN donde no hay tarifa
+        """
+        consumo = np.asarray(consumo, dtype=np.float64)
+        # Solo los componentes pedidos, para no copiar los nueve por fila
+        valores = np.ascontiguousarray(self.valores[..., [COMPONENTES.index(c) for c in componentes]])
+        if np.isscalar(comercializadores):
+            comercializadores = np.full(len(consumo), comercializadores, dtype=np.int32)
+        resultado = np.empty((len(consumo), valores.shape[-1]))
+        for inicio in range(0, len(consumo), tamano_bloque):
+            fin = inicio + tamano_bloque
+            tarifas = self._tarifas(valores, comercializadores[inicio:fin], mercados[inicio:fin], niveles[inicio:fin])
+            np.multiply(tarifas, consumo[inicio:fin, None], out=resultado[inicio:fin])
+        return resultado
+
+    def mas_barato(self, consumo, mercados, niveles, actual=None, componente=TOTAL, tamano_bloque=1_000_000):
+        """
+        Comercializador más barato para cada consumo entre los que publican
+        tarifa en su mercado y nivel.
+
+        Returns:
+            Comparacion: índice del comercializador más barato (SIN_TARIFA si
+            ninguno publica la celda), su costo y, si se indica el
+            comercializador actual, el costo actual y el ahorro por cambiarse
+        """
+        consumo = np.asarray(consumo, dtype=np.float64)
+        columna = COMPONENTES.index(componente)
+        n = len(consumo)
+        mejor = np.empty(n, dtype=np.int16)
+        costo = np.empty(n)
+        costo_actual = np.empty(n) if actual is not None else None
+
+        # Como el costo es tarifa × kWh, el más barato de cada celda no depende
+        # del consumo: se calcula una vez por (mercado, nivel) y luego cada
+        # fila solo consulta su celda
+        por_celda = np.ascontiguousarray(np.moveaxis(self.valores[..., columna], 0, -1))
+        sin_nan = np.where(np.isnan(por_celda), np.inf, por_celda)
+        mejor_celda = sin_nan.argmin(axis=-1).astype(np.int16)
+        minima_celda = np.take_along_axis(sin_nan, mejor_celda[..., None].astype(np.intp), axis=-1)[..., 0]
+        sin_oferta = np.isinf(minima_celda)
+        mejor_celda[sin_oferta] = SIN_TARIFA
+        minima_celda[sin_oferta] = np.nan
+
+        for inicio in range(0, n, tamano_bloque):
+            fin = inicio + tamano_bloque
+            m, v = mercados[inicio:fin], niveles[inicio:fin]
+            invalidos = (m < 0) | (v < 0)
+            indices = mejor_celda[m, v]
+            indices[invalidos] = SIN_TARIFA
+            tarifas = minima_celda[m, v]
+            tarifas[invalidos] = np.nan
+            mejor[inicio:fin] = indices
+            np.multiply(tarifas, consumo[inicio:fin], out=costo[inicio:fin])
+
+            if actual is not None:
+                a = actual[inicio:fin]
+                tarifa_actual = por_celda[m, v, np.maximum(a, 0)]
+                tarifa_actual[invalidos | (a < 0)] = np.nan
+                np.multiply(tarifa_actual, consumo[inicio:fin], out=costo_actual[inicio:fin])
+
+        ahorro = costo_actual - costo if actual is not None else None
+        return Comparacion(mejor, costo, costo_actual, ahorro)
+
+    def nombres(self, indices):
+        """Nombres de comercializador para un arreglo de índices (None en SIN_TARIFA)"""
+        nombres = np.array(self.comercializadores + [None], dtype=object)
+        return nombres[np.asarray(indices)]
@@ -1,15 +1,124 @@
+import queue
+import threading
+from abc import ABC, abstractmethod
 import cv2
 import numpy as np
 import pytesseract
 from PIL import Image
+from config.config import OCR_CONFIG
+
+class OCRBackend(ABC):
+    """Interfaz común para los motores de OCR"""
+
+    nombre = "base"
+
+    @abstractmethod
+    def reconocer(self, imagen, lang, config):
+        """Devuelve el texto reconocido en una imagen (array de numpy)"""
+
+    def cerrar(self):
+        """Libera los recursos del motor"""
+        pass
+
+class PytesseractBackend(OCRBackend):
+    """Motor basado en pytesseract: lanza un proceso de tesseract por imagen"""
+
+    nombre = "pytesseract"
+
+    def __init__(self, tesseract_path=None):
+        if tesseract_path:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_path
+
+    def reconocer(self, imagen, lang, config):
+        return pytesseract.image_to_string(imagen, lang=lang, config=config)
+
+class TesserocrPoolBackend(OCRBackend):
+    """
+    Motor con un pool de instancias persistentes de tesserocr.
+
+    Cada instancia carga los datos del idioma una sola vez y recibe las
+    imágenes directamente en memoria, sin procesos ni archivos temporales.
+    """
+
+    nombre = "pool"
+
+    def __init__(self, lang='spa', pool_size=2, psm=6, oem=3, tessdata_path=None):
+        import tesserocr  # Dependencia opcional
+
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self._apis = queue.Queue()
+        self._todas = []
+        self._lock = threading.Lock()
+
+        kwargs = {"lang": lang, "psm": psm, "oem": oem}
+        if tessdata_path:
+            kwargs["path"] = tessdata_path
+
+        for _ in range(max(1, pool_size)):
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            self._todas.append(api)
+            self._apis.put(api)
+
+    def reconocer(self, imagen, lang, config):
+        # El idioma, PSM y OEM quedan fijados al crear el pool; el parámetro
+        # config solo se respeta en el motor pytesseract
+        pil_imagen = Image.fromarray(imagen)
+        api = self._apis.get()
+        try:
+            api.SetImage(pil_imagen)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._apis.put(api)
+
+    def cerrar(self):
+        with self._lock:
+            for api in self._todas:
+                api.End()
+            self._todas = []
+
+def crear_backend_ocr(tesseract_path=None, ocr_config=None):
+    """Crea el motor de OCR configurado, usando pytesseract como respaldo"""
+    ocr_config = ocr_config or OCR_CONFIG
+    backend = ocr_config.get("backend", "pytesseract")
+
+    if backend == "pool":
+        try:
+            return TesserocrPoolBackend(
+                lang=ocr_config.get("lang", "spa"),
+                pool_size=ocr_config.get("pool_size", 2),
+                psm=ocr_config.get("psm", 6),
+                oem=ocr_config.get("oem", 3),
+                tessdata_path=ocr_config.get("tessdata_path")
+            )
+        except Exception as e:
+            print(f"No se pudo iniciar el pool de OCR ({e}). Usando pytesseract.")
+
+    return PytesseractBackend(tesseract_path)
+
+_backends_compartidos = {}
+_backends_lock = threading.Lock()
+
+def obtener_backend_compartido(tesseract_path=None, ocr_config=None):
+    """Devuelve un motor de OCR compartido por todo el proceso"""
+    ocr_config = ocr_config or OCR_CONFIG
+    clave = (tesseract_path, tuple(sorted(ocr_config.items())))
+    with _backends_lock:
+        if clave not in _backends_compartidos:
+            _backends_compartidos[clave] = crear_backend_ocr(tesseract_path, ocr_config)
+        return _backends_compartidos[clave]
 
 class ImageProcessor:
     """Clase para el procesamiento de imágenes y OCR"""
     
-    def __init__(self, tesseract_path=None):
-        """Inicializar con la ruta a Tesseract"""
+    def __init__(self, tesseract_path=None, backend=None):
+        """Inicializar con la ruta a Tesseract y el motor de OCR configurado"""
         if tesseract_path:
             pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        self.lang = OCR_CONFIG.get("lang", "spa")
+        # El pool es costoso de crear, así que se reutiliza entre procesadores
+        self.backend = backend or obtener_backend_compartido(tesseract_path)
     
     def mejorar_imagen_para_ocr(self, imagen):
         """Mejora la imagen para OCR aplicando preprocesamiento"""
@@ -33,17 +142,13 @@ class ImageProcessor:
         return binario
     
     def extraer_texto_de_imagen(self, imagen, config='--oem 3 --psm 6'):
-        """Extrae texto de una imagen usando Tesseract OCR"""
+        """Extrae texto de una imagen usando el motor de OCR configurado"""
         try:
             # Preprocesar la imagen para mejorar OCR
             imagen_mejorada = self.mejorar_imagen_para_ocr(imagen)
             
-            # Extraer texto con Tesseract
-            texto = pytesseract.image_to_string(
-                imagen_mejorada, 
-                lang='spa', 
-                config=config
-            )
+            # Extraer texto con el motor configurado
+            texto = self.backend.reconocer(imagen_mejorada, self.lang, config)
             return texto
             
         except Exception as e:
@@ -0,0 +1,250 @@
+"""
+Normalización local de etiquetas y números de las publicaciones de tarifas,
+antes y después de Claude.
+
+Las tablas de búsqueda (mercados, niveles de tensión y comercializadores) se
+construyen una sola vez al importar el módulo a partir de
+config/example_json.py y config/comercializadores.py, con claves sin tildes,
+mayúsculas ni palabras de relleno ("MERCADO", "DE", "Y"...). Las series se
+normalizan por valores distintos (pd.factorize) y los números con el fast
+path de pd.to_numeric, de modo que solo las celdas con formato local
+("1.234,56", "$ 812,3") pasan por la limpieza de texto.
+
+Uso:
+    df = normalizar_df(pd.read_csv("salida/enelx.csv"), "ENELX")
+    texto = normalizar_texto(texto_pdf)
+"""
+import re
+import unicodedata
+from config.comercializadores import COMERCIALIZADORES
+from config.config import NORMALIZACION_CONFIG
+from config.example_json import MERCADOS, NIVELES_TENSION
+
+COLUMNAS_NUMERICAS = ["G", "T", "D", "C", "COT", "P", "R", "CU", "CU + COT"]
+
+# Palabras que no distinguen un mercado o un nivel de otro
+_RELLENO_MERCADO = {"MERCADO", "MCDO", "DE", "DEL", "LA", "Y"}
+_RELLENO_NIVEL = {"NIVEL", "N"}
+
+def _sin_tildes(texto):
+    texto = unicodedata.normalize("NFKD", str(texto).upper())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def _simplificar(texto):
+    """Mayúsculas sin tildes, espacios ni guiones, para comparar nombres"""
+    return "".join(c for c in _sin_tildes(texto) if c.isalnum())
+
+def normalizar_etiqueta(valor):
+    """Mayúsculas con los espacios colapsados (respaldo para valores sin tabla)"""
+    return " ".join(str(valor).upper().split())
+
+def por_valores(serie, funcion):
+    """Aplica funcion a una serie calculándola una sola vez por valor distinto"""
+    import numpy as np
+    import pandas as pd
+
+    codigos, unicos = pd.factorize(serie)
+    resultados = np.array([funcion(u) for u in unicos] + [None], dtype=object)
+    # factorize marca los nulos con -1, que apunta al None final
+    return pd.Series(resultados[codigos], index=serie.index, name=serie.name)
+
+class TablaEtiquetas:
+    """
+    Tabla precompilada clave -> nombre canónico. Los valores que no están en
+    la tabla se devuelven con normalizar_etiqueta.
+    """
+
+    def __init__(self, relleno=(), alias=None):
+        self.relleno = frozenset(relleno)
+        self.alias = dict(alias or {})
+
+    def clave(self, valor):
+        palabras = re.split(r"[^0-9A-Z]+", _sin_tildes(valor))
+        return " ".join(p for p in palabras if p and p not in self.relleno)
+
+    def agregar(self, alias, canonico, reemplazar=False):
+        clave = self.clave(alias)
+        if clave and (reemplazar or clave not in self.alias):
+            self.alias[clave] = canonico
+
+    def agregar_mapping(self, mapping, reemplazar=False):
+        """
+        Agrega un mapping de comercializador (etiqueta publicada -> destino).
+        Los destinos que coinciden con un nombre canónico se traducen a él
+        ("NORTE DE SANTANDER" -> "NORTE SANTANDER"); los demás (CESAR,
+        RISARALDA...) conservan su nombre.
+        """
+        for alias, destino in mapping.items():
+            destino = self.alias.get(self.clave(destino), normalizar_etiqueta(destino))
+            self.agregar(destino, destino)
+            self.agregar(alias, destino, reemplazar)
+
+    def derivar(self, mapping):
+        """Copia de la tabla en la que el mapping indicado manda sobre el resto"""
+        tabla = TablaEtiquetas(self.relleno, self.alias)
+        tabla.agregar_mapping(mapping, reemplazar=True)
+        return tabla
+
+    def canonico(self, valor):
+        if valor is None or valor != valor:
+            return valor
+        return self.alias.get(self.clave(valor), normalizar_etiqueta(valor))
+
+    def serie(self, serie):
+        return por_valores(serie, self.canonico)
+
+def _construir_tablas():
+    mercados = TablaEtiquetas(_RELLENO_MERCADO)
+    for mercado in MERCADOS:
+        mercados.agregar(mercado, mercado, reemplazar=True)
+    niveles = TablaEtiquetas(_RELLENO_NIVEL)
+    for nivel in NIVELES_TENSION:
+        niveles.agregar(nivel, normalizar_etiqueta(nivel), reemplazar=True)
+
+    # La tabla general conoce las etiquetas de todos los comercializadores;
+    # si dos las mapean distinto, gana el nombre canónico o el primero
+    for info in COMERCIALIZADORES.values():
+        mercados.agregar_mapping(info.get("mercado_mapping", {}))
+        niveles.agregar_mapping(info.get("tension_mapping", {}))
+
+    por_comercializador = {
+        codigo: (mercados.derivar(info.get("mercado_mapping", {})),
+                 niveles.derivar(info.get("tension_mapping", {})))
+        for codigo, info in COMERCIALIZADORES.items()
+    }
+    return mercados, niveles, por_comercializador
+
+def _construir_alias():
+    """Alias de comercializadores: código y nombre de configuración -> código"""
+    alias = {}
+    for codigo, info in COMERCIALIZADORES.items():
+        alias[_simplificar(codigo)] = codigo
+        alias[_simplificar(info.get("name", codigo))] = codigo
+    return alias
+
+TABLA_MERCADOS, TABLA_NIVELES, _TABLAS_COMERCIALIZADOR = _construir_tablas()
+ALIAS_COMERCIALIZADORES = _construir_alias()
+
+def recargar_tablas():
+    """Reconstruye las tablas tras un cambio en config/comercializadores.py"""
+    global TABLA_MERCADOS, TABLA_NIVELES, _TABLAS_COMERCIALIZADOR, ALIAS_COMERCIALIZADORES
+    TABLA_MERCADOS, TABLA_NIVELES, _TABLAS_COMERCIALIZADOR = _construir_tablas()
+    ALIAS_COMERCIALIZADORES = _construir_alias()
+
+def normalizar_comercializador(nombre):
+    """Convierte variantes como "Enel X" o "Enerbit" en el código ENELX, ENERBIT..."""
+    return ALIAS_COMERCIALIZADORES.get(_simplificar(nombre), str(nombre).strip().upper())
+
+def tablas(comercializador=None):
+    """Tablas (mercados, niveles) del comercializador, o las generales"""
+    if comercializador:
+        codigo = normalizar_comercializador(comercializador)
+        if codigo in _TABLAS_COMERCIALIZADOR:
+            return _TABLAS_COMERCIALIZADOR[codigo]
+    return TABLA_MERCADOS, TABLA_NIVELES
+
+def normalizar_mercado(valor, comercializador=None):
+    return tablas(comercializador)[0].canonico(valor)
+
+def normalizar_nivel(valor, comercializador=None):
+    return tablas(comercializador)[1].canonico(valor)
+
+# --- Números ---
+
+# Todo lo que no forma parte de un número ($, espacios, %, letras)
+_NO_NUMERICO = r"[^0-9,.\-]"
+
+def parsear_numero(valor):
+    """
+    Convierte un número con formato local en float. La coma es decimal
+    ("812,34", "1.234,56") salvo que haya varias o vaya antes del punto
+    ("1,234.56"); un solo punto es decimal. Devuelve NaN si no es un número.
+    """
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        pass
+    texto = re.sub(_NO_NUMERICO, "", str(valor).replace("−", "-"))
+    if texto.count(",") == 1 and texto.rfind(",") > texto.rfind("."):
+        texto = texto.replace(".", "").replace(",", ".")
+    else:
+        texto = texto.replace(",", "")
+        if texto.count(".") > 1:
+            texto = texto.replace(".", "")
+    try:
+        return float(texto)
+    except ValueError:
+        return float("nan")
+
+def parsear_numeros(serie):
+    """
+    Versión vectorizada de parsear_numero. Las columnas que float() ya
+    entiende se convierten de una pasada; si no, las celdas con coma se
+    pasan a punto decimal con las funciones de cadenas de NumPy y solo las
+    que siguen sin ser un número ("$ 812,3", "1.234.567") pasan por
+    parsear_numero.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if serie.dtype.kind in "iufb":
+        return serie.astype(float)
+    valores = serie.to_numpy(dtype=object)
+    try:
+        numeros = np.fromiter(map(float, valores), float, len(valores))
+    except (TypeError, ValueError):
+        texto = valores.copy()
+        con_coma = np.flatnonzero(serie.str.contains(",", regex=False, na=False).to_numpy(dtype=bool))
+        if len(con_coma) and hasattr(np, "strings"):
+            locales = valores[con_coma].astype(str)
+            coma_decimal = ((np.strings.count(locales, ",") == 1)
+                            & (np.strings.rfind(locales, ",") > np.strings.rfind(locales, ".")))
+            texto[con_coma] = np.where(
+                coma_decimal,
+                np.strings.replace(np.strings.replace(locales, ".", ""), ",", "."),
+                np.strings.replace(locales, ",", ""))
+        try:
+            numeros = np.fromiter(map(float, texto), float, len(texto))
+        except (TypeError, ValueError):
+            numeros = np.fromiter(map(parsear_numero, texto), float, len(texto))
+    return pd.Series(numeros, index=serie.index, name=serie.name)
+
+# --- DataFrames y texto ---
+
+def normalizar_df(df, comercializador=None):
+    """
+    Normaliza en el lugar un DataFrame de salida (formato de 12 columnas):
+    comercializador al código de configuración, mercado y nivel al nombre
+    canónico y componentes a float. Las columnas que falten se ignoran.
+    """
+    mercados, niveles = tablas(comercializador)
+    if "Comercializador" in df.columns:
+        df["Comercializador"] = por_valores(df["Comercializador"], normalizar_comercializador)
+    if "Mercado" in df.columns:
+        df["Mercado"] = mercados.serie(df["Mercado"])
+    if "Nivel de Tensión" in df.columns:
+        df["Nivel de Tensión"] = niveles.serie(df["Nivel de Tensión"])
+    for columna in COLUMNAS_NUMERICAS:
+        if columna in df.columns:
+            df[columna] = parsear_numeros(df[columna])
+    return df
+
+# Números con coma decimal, con o sin puntos de miles: "1.234,56", "812,3456"
+_NUMERO_LOCAL = re.compile(r"(?<![\d.,])(-?(?:\d{1,3}(?:\.\d{3})+|\d+),\d+)(?![\d,])")
+
+def _a_punto_decimal(coincidencia):
+    return coincidencia.group(1).replace(".", "").replace(",", ".")
+
+def normalizar_texto(texto):
+    """
+    Normaliza el texto extraído de un PDF antes de enviarlo a Claude: forma
+    Unicode compuesta (NFC), números con punto decimal y espacios repetidos
+    colapsados. No debe aplicarse a CSV, donde la coma separa columnas.
+    """
+    texto = unicodedata.normalize("NFC", texto)
+    texto = _NUMERO_LOCAL.sub(_a_punto_decimal, texto)
+    return re.sub(r"[ \t]+", " ", texto)
+
+def normalizar_entrada(texto):
+    """normalizar_texto si NORMALIZACION_CONFIG["texto_entrada"] está activo"""
+    return normalizar_texto(texto) if NORMALIZACION_CONFIG["texto_entrada"] else texto
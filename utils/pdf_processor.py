@@ -1,21 +1,37 @@
+import io
 import os
+import threading
 import fitz
 import pdfplumber
 import numpy as np
 from .image_processor import ImageProcessor
 import cv2
+from concurrent.futures import ThreadPoolExecutor
+from config.config import OCR_CONFIG
+from .progreso import emitir
 
 class PDFProcessor:
     """Clase para procesar archivos PDF y extraer su contenido"""
     
-    def __init__(self, image_processor=None):
-        """Inicializar con un procesador de imágenes opcional"""
+    def __init__(self, image_processor=None, progreso=None):
+        """Inicializar con un procesador de imágenes y un canal de progreso opcionales"""
         self.image_processor = image_processor
+        self.progreso = progreso
     
-    def extraer_texto_pdf(self, pdf_path):
-        """Extrae el texto completo de un archivo PDF (texto + OCR de imágenes solo si es necesario)"""
+    def extraer_texto_pdf(self, pdf_path, datos=None, guardar_texto=True):
+        """
+        Extrae el texto completo de un archivo PDF (texto + OCR de imágenes solo si es necesario).
+
+        El PDF se lee una sola vez: pdfplumber y PyMuPDF abren el mismo buffer.
+        Con datos (bytes del PDF ya en memoria) no se lee el disco, y con
+        guardar_texto=False tampoco se escribe el _text.txt (se devuelve None
+        como ruta).
+        """
         try:
             print(f"Extrayendo texto de {pdf_path}...")
+            if datos is None:
+                with open(pdf_path, "rb") as f:
+                    datos = f.read()
             
             # Directorio donde se encuentra el PDF
             pdf_dir = os.path.dirname(pdf_path)
@@ -23,7 +39,7 @@ class PDFProcessor:
             text_output_path = os.path.join(pdf_dir, f"{file_name}_text.txt")
             
             # Extraer texto que puede ser seleccionado
-            with pdfplumber.open(pdf_path) as pdf:
+            with pdfplumber.open(io.BytesIO(datos)) as pdf:
                 # Inicializar texto vacío
                 full_text = ""
                 
@@ -33,13 +49,14 @@ class PDFProcessor:
                     if text:
                         full_text += text + "\n\n"
                     print(f"  Página {i+1}/{len(pdf.pages)} procesada (texto)")
+                    emitir(self.progreso, "extraccion_texto", pagina=i+1, total=len(pdf.pages))
             
             # Solo aplicar OCR si:
             # 1. No hay texto extraído (longitud < 100 caracteres)
             # 2. El procesador de imágenes está disponible
             if len(full_text.strip()) < 100 and self.image_processor:
                 print("Detectado PDF con poco texto seleccionable. Aplicando OCR a las imágenes...")
-                imagen_text = self.extraer_imagenes_pdf(pdf_path)
+                imagen_text = self.extraer_imagenes_pdf(pdf_path, datos)
                 if imagen_text:
                     full_text += "\n\n--- INICIO DE TEXTO EXTRAÍDO POR OCR ---\n\n"
                     full_text += imagen_text
@@ -50,6 +67,9 @@ class PDFProcessor:
                 print("\n¡ALERTA! Se ha detectado 'Ruitoque' en el texto.")
                 print("Asegúrate de que los datos de Ruitoque se procesen correctamente.\n")
             
+            if not guardar_texto:
+                return full_text, None
+
             # Guardar el texto en un archivo
             with open(text_output_path, "w", encoding="utf-8") as f:
                 f.write(full_text)
@@ -61,8 +81,8 @@ class PDFProcessor:
             print(f"Error al extraer texto del PDF: {e}")
             return None, None
     
-    def extraer_imagenes_pdf(self, pdf_path):
-        """Extrae imágenes del PDF y aplica OCR para obtener texto"""
+    def extraer_imagenes_pdf(self, pdf_path, datos=None):
+        """Extrae imágenes del PDF (de datos si ya está en memoria) y aplica OCR para obtener texto"""
         try:
             if not self.image_processor:
                 print("No se puede aplicar OCR: procesador de imágenes no disponible")
@@ -71,10 +91,12 @@ class PDFProcessor:
             print(f"Extrayendo imágenes y aplicando OCR a {pdf_path}...")
             
             # Abrir el PDF con PyMuPDF
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = fitz.open(stream=datos, filetype="pdf") if datos is not None else fitz.open(pdf_path)
             num_paginas = len(pdf_document)
             
-            all_text = []
+            # Solo se guardan las referencias: cada imagen se decodifica dentro
+            # de su tarea, así que en memoria hay a lo sumo una por worker
+            imagenes = []
             img_count = 0
             
             for page_num in range(num_paginas):
@@ -86,33 +108,50 @@ class PDFProcessor:
                 # Obtener lista de imágenes en la página
                 image_list = page.get_images(full=True)
                 
-                # Si no hay imágenes en esta página, continuar con la siguiente
-                if not image_list:
-                    continue
-                
                 for img_index, img_info in enumerate(image_list):
                     img_count += 1
                     xref = img_info[0]  # Número de referencia de la imagen
-                    
-                    # Extraer imagen
-                    base_image = pdf_document.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    
-                    # Convertir bytes a formato numpy para OpenCV
-                    nparr = np.frombuffer(image_bytes, np.uint8)
-                    imagen = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    
-                    # Solo procesar imágenes lo suficientemente grandes
-                    if imagen.shape[0] > 100 and imagen.shape[1] > 100:
-                        print(f"  Extrayendo texto de imagen {img_count} (página {page_num+1})...")
-                        
-                        # Extraer texto de la imagen
-                        texto_imagen = self.image_processor.extraer_texto_de_imagen(imagen)
-                        
-                        if texto_imagen.strip():
-                            all_text.append(f"\n--- TEXTO DE IMAGEN (Página {page_num+1}, Imagen {img_index+1}) ---\n")
-                            all_text.append(texto_imagen)
-                            all_text.append("\n--- FIN TEXTO DE IMAGEN ---\n")
+                    imagenes.append((page_num, img_index, img_count, xref))
+            
+            # Con el pool de OCR las imágenes se reconocen en paralelo; con
+            # pytesseract se mantiene el procesamiento secuencial
+            workers = 1
+            if self.image_processor.backend.nombre == "pool":
+                workers = OCR_CONFIG.get("pool_size", 2)
+            
+            total_imagenes = len(imagenes)
+            completadas = [0]
+            lock = threading.Lock()
+            # PyMuPDF no admite accesos simultáneos al mismo documento
+            lock_documento = threading.Lock()
+            emitir(self.progreso, "ocr", imagen=0, total=total_imagenes)
+            
+            def reconocer(item):
+                page_num, _, num_imagen, xref = item
+                with lock_documento:
+                    image_bytes = pdf_document.extract_image(xref)["image"]
+                
+                # Convertir bytes a formato numpy para OpenCV
+                imagen = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+                texto = ""
+                # Solo procesar imágenes lo suficientemente grandes
+                if imagen is not None and imagen.shape[0] > 100 and imagen.shape[1] > 100:
+                    print(f"  Extrayendo texto de imagen {num_imagen} (página {page_num+1})...")
+                    texto = self.image_processor.extraer_texto_de_imagen(imagen)
+                with lock:
+                    completadas[0] += 1
+                    emitir(self.progreso, "ocr", imagen=completadas[0], total=total_imagenes)
+                return texto
+            
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                textos = list(executor.map(reconocer, imagenes))
+            
+            all_text = []
+            for (page_num, img_index, _, _), texto_imagen in zip(imagenes, textos):
+                if texto_imagen.strip():
+                    all_text.append(f"\n--- TEXTO DE IMAGEN (Página {page_num+1}, Imagen {img_index+1}) ---\n")
+                    all_text.append(texto_imagen)
+                    all_text.append("\n--- FIN TEXTO DE IMAGEN ---\n")
             
             pdf_document.close()
             return "\n".join(all_text)
@@ -0,0 +1,146 @@
+"""
+Perfilado bajo demanda de un trabajo: cProfile (determinista, del hilo que
+procesa) y tracemalloc (pico de memoria y principales asignaciones).
+
+Con el perfilado desactivado perfilar() devuelve un nullcontext, así que no
+se instala ningún hook ni se rastrea memoria. Solo un trabajo a la vez tiene
+perfil de CPU (desde Python 3.12 cProfile es global al proceso); los demás
+trabajos perfilados simultáneos registran solo duración y memoria. El
+perfilado nunca hace fallar el trabajo.
+
+Uso:
+    with perfilar(activo, nombre) as perfil:
+        procesar()
+    if perfil:
+        guardar_perfil(perfil, directorio, nombre)
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from config.config import PERFILADO_CONFIG
+
+# tracemalloc es global al proceso: se mantiene activo mientras haya algún perfil abierto
+_lock = threading.Lock()
+_perfiles_activos = 0
+
+# Desde Python 3.12 un segundo cProfile activo lanza ValueError y además
+# mezclaría los hilos; el perfil de CPU se reserva para un trabajo a la vez
+_lock_cpu = threading.Lock()
+
+def _iniciar_memoria(marcos):
+    global _perfiles_activos
+    with _lock:
+        if _perfiles_activos == 0:
+            tracemalloc.start(marcos)
+        else:
+            tracemalloc.reset_peak()
+        _perfiles_activos += 1
+
+def _detener_memoria():
+    global _perfiles_activos
+    with _lock:
+        _perfiles_activos -= 1
+        if _perfiles_activos == 0:
+            tracemalloc.stop()
+
+class Perfil:
+    """Captura el perfil de CPU y de memoria del bloque with"""
+
+    def __init__(self, nombre="", config=None):
+        self.nombre = nombre
+        self.config = dict(PERFILADO_CONFIG, **(config or {}))
+        self.perfil = cProfile.Profile()
+        self.duracion = None
+        self.memoria_pico = None
+        self.asignaciones = []
+        # Motivo por el que no hay perfil de CPU (None si se capturó)
+        self.sin_cpu = None
+
+    def _iniciar_cpu(self):
+        if not _lock_cpu.acquire(blocking=False):
+            self.sin_cpu = "otro trabajo se estaba perfilando"
+        else:
+            try:
+                self.perfil.enable()
+            except ValueError as e:
+                # Otra herramienta (un depurador, coverage) ya ocupa el perfilador
+                _lock_cpu.release()
+                self.sin_cpu = str(e)
+        if self.sin_cpu:
+            print(f"Perfil de CPU no disponible para {self.nombre}: {self.sin_cpu}")
+
+    def __enter__(self):
+        _iniciar_memoria(self.config["marcos"])
+        self._inicio = time.perf_counter()
+        self._iniciar_cpu()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.sin_cpu:
+            self.perfil.disable()
+            _lock_cpu.release()
+        self.duracion = time.perf_counter() - self._inicio
+        try:
+            self.memoria_pico = tracemalloc.get_traced_memory()[1]
+            self.asignaciones = tracemalloc.take_snapshot().statistics("lineno")[:self.config["asignaciones"]]
+        finally:
+            _detener_memoria()
+        return False
+
+    def datos(self):
+        """
+        Perfil en el formato binario de pstats (para snakeviz, pstats o
+        gprof2dot), o None si no hubo perfil de CPU
+        """
+        if self.sin_cpu:
+            return None
+        self.perfil.create_stats()
+        return marshal.dumps(self.perfil.stats)
+
+    def informe(self):
+        """Resumen en texto: duración, pico de memoria, funciones y asignaciones principales"""
+        salida = io.StringIO()
+        salida.write(f"Perfil de {self.nombre}\n")
+        salida.write(f"Duración: {self.duracion:.2f} s\n")
+        salida.write(f"Pico de memoria (tracemalloc, todo el proceso): {self.memoria_pico / 1024 / 1024:.1f} MB\n\n")
+
+        if self.sin_cpu:
+            salida.write(f"Perfil de CPU no disponible: {self.sin_cpu}\n\n")
+        else:
+            estadisticas = pstats.Stats(self.perfil, stream=salida)
+            estadisticas.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.config["lineas"])
+
+        salida.write("Asignaciones de memoria vivas al terminar\n")
+        for estadistica in self.asignaciones:
+            salida.write(f"{estadistica}\n")
+        return salida.getvalue()
+
+def perfilar(activo, nombre="", config=None):
+    """Perfil del bloque si activo; si no, un contexto vacío que devuelve None"""
+    return Perfil(nombre, config) if activo else nullcontext()
+
+def nombres_perfil(nombre):
+    """Nombres del informe de texto y del perfil binario de un archivo de entrada"""
+    base_name = os.path.splitext(os.path.basename(nombre))[0]
+    return f"{base_name}_perfil.txt", f"{base_name}_perfil.prof"
+
+def guardar_perfil(perfil, directorio, nombre):
+    """Escribe el informe y, si hubo perfil de CPU, el perfil binario junto a las salidas"""
+    os.makedirs(directorio, exist_ok=True)
+    rutas = [os.path.join(directorio, n) for n in nombres_perfil(nombre)]
+    with open(rutas[0], "w", encoding="utf-8") as f:
+        f.write(perfil.informe())
+    datos = perfil.datos()
+    if datos is None:
+        print(f"Perfil guardado en {rutas[0]}")
+        return rutas[:1]
+    with open(rutas[1], "wb") as f:
+        f.write(datos)
+    print(f"Perfil guardado en {rutas[0]} y {rutas[1]}")
+    return rutas
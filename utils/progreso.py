@@ -0,0 +1,15 @@
+import json
+
+ETAPAS_FINALES = ("completado", "error")
+
+def emitir(progreso, etapa, **datos):
+    """Publica un evento si hay un canal de progreso asociado"""
+    if progreso is not None:
+        progreso.emitir(etapa, **datos)
+
+def formatear_sse(evento):
+    """Serializa un evento en el formato de Server-Sent Events"""
+    if evento is None:
+        return ": keep-alive\n\n"
+    datos = json.dumps(evento, ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['etapa']}\ndata: {datos}\n\n"
@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from config.config import CLAUDE_API_CONFIG, PRONOSTICO_CONFIG
+from utils.bloqueo import bloqueo_archivo
+
+Pronostico = namedtuple("Pronostico", [
+    "tokens_entrada", "tokens_salida", "latencia", "costo", "decision", "partes", "motivo"
+])
+
+ENVIAR = "enviar"
+DIVIDIR = "dividir"
+RECHAZAR = "rechazar"
+
+def _ultimas_lineas(ruta, limite, bloque=65536):
+    """Últimas líneas de un archivo, leyéndolo desde el final por bloques"""
+    with open(ruta, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        posicion = f.tell()
+        datos = b""
+        while posicion > 0 and (limite is None or datos.count(b"\n") <= limite):
+            leido = min(bloque, posicion)
+            posicion -= leido
+            f.seek(posicion)
+            datos = f.read(leido) + datos
+    lineas = datos.decode("utf-8", errors="replace").splitlines()
+    return lineas if limite is None else lineas[-limite:]
+
+class RegistroUso:
+    """
+    Registro en JSONL del uso real de cada respuesta de Claude (campo usage
+    de la API), del tamaño de la petición y de la latencia observada. Al
+    superar max_bytes_registro se compacta a las últimas max_muestras
+    líneas, que son las únicas que usa la calibración.
+    """
+
+    def __init__(self, ruta=None, config=None):
+        self.config = config or PRONOSTICO_CONFIG
+        self.ruta = ruta or self.config["registro"]
+        self._lock = threading.Lock()
+
+    def registrar(self, **campos):
+        campos.setdefault("ts", time.time())
+        linea = json.dumps(campos, ensure_ascii=False)
+        # El bloqueo de archivo evita que un proceso escriba en el archivo
+        # que otro está reemplazando al compactarlo
+        with self._lock, bloqueo_archivo(self.ruta):
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+                tamano = f.tell()
+            if tamano > self.config["max_bytes_registro"]:
+                self._compactar()
+
+    def _compactar(self):
+        lineas = _ultimas_lineas(self.ruta, self.config["max_muestras"])
+        directorio = os.path.dirname(self.ruta)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directorio or ".", suffix=".tmp",
+                                         delete=False) as f:
+            f.write("".join(linea + "\n" for linea in lineas))
+        os.replace(f.name, self.ruta)
+
+    def leer(self, limite=None):
+        """Devuelve las últimas muestras registradas, sin leer el resto del archivo"""
+        if not os.path.exists(self.ruta):
+            return []
+        muestras = []
+        for linea in _ultimas_lineas(self.ruta, limite):
+            try:
+                muestras.append(json.loads(linea))
+            except json.JSONDecodeError:
+                continue
+        return muestras
+
+def _ajustar(filas, objetivo):
+    """Mínimos cuadrados con coeficientes no negativos (los negativos se anulan)"""
+    import numpy as np
+
+    x = np.array(filas, dtype=float)
+    y = np.array(objetivo, dtype=float)
+    coeficientes = np.linalg.lstsq(x, y, rcond=None)[0]
+    if (coeficientes < 0).any():
+        # Reajustar sin las variables con coeficiente negativo
+        activas = coeficientes >= 0
+        coeficientes = np.zeros_like(coeficientes)
+        if activas.any():
+            coeficientes[activas] = np.linalg.lstsq(x[:, activas], y, rcond=None)[0].clip(min=0)
+    return [float(c) for c in coeficientes]
+
+class PronosticadorClaude:
+    """
+    Estima tokens de entrada y salida, latencia y costo de una petición a
+    Claude antes de enviarla, con modelos lineales calibrados sobre el uso
+    registrado:
+
+    - tokens de entrada ~ caracteres del prompt
+    - tokens de salida ~ caracteres del texto del documento
+    - latencia ~ tokens de entrada + tokens de salida
+
+    Mientras no hay suficientes muestras se usan los valores iniciales de
+    PRONOSTICO_CONFIG. La calibración se rehace cuando cambia el registro.
+    """
+
+    def __init__(self, registro=None, config=None):
+        self.registro = registro or RegistroUso()
+        self.config = config or PRONOSTICO_CONFIG
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.coeficientes = self._iniciales()
+        self.muestras = 0
+
+    def _iniciales(self):
+        return {
+            "entrada": [1.0 / self.config["caracteres_por_token"], 0.0],
+            "salida": [self.config["tokens_salida_por_caracter"], 0.0],
+            "latencia": [1.0 / (self.config["tokens_salida_por_segundo"] * 20),
+                         1.0 / self.config["tokens_salida_por_segundo"],
+                         self.config["latencia_base"]]
+        }
+
+    def calibrar(self):
+        """Ajusta los modelos con las muestras del registro si este cambió"""
+        ruta = self.registro.ruta
+        mtime = os.path.getmtime(ruta) if os.path.exists(ruta) else None
+        with self._lock:
+            if mtime == self._mtime:
+                return self.coeficientes
+            self._mtime = mtime
+
+            muestras = [
+                m for m in self.registro.leer(self.config["max_muestras"])
+                if m.get("tokens_entrada") and m.get("tokens_salida") and m.get("caracteres_entrada")
+            ]
+            self.muestras = len(muestras)
+            coeficientes = self._iniciales()
+            if len(muestras) >= self.config["min_muestras"]:
+                coeficientes["entrada"] = _ajustar(
+                    [[m["caracteres_entrada"], 1] for m in muestras],
+                    [m["tokens_entrada"] for m in muestras])
+                coeficientes["salida"] = _ajustar(
+                    [[m.get("caracteres_texto", m["caracteres_entrada"]), 1] for m in muestras],
+                    [m["tokens_salida"] for m in muestras])
+                con_latencia = [m for m in muestras if m.get("latencia")]
+                if len(con_latencia) >= self.config["min_muestras"]:
+                    coeficientes["latencia"] = _ajustar(
+                        [[m["tokens_entrada"], m["tokens_salida"], 1] for m in con_latencia],
+                        [m["latencia"] for m in con_latencia])
+            self.coeficientes = coeficientes
+            return coeficientes
+
+    def tokens(self, texto):
+        """Tokens estimados de un texto suelto según la calibración de entrada"""
+        a, b = self.calibrar()["entrada"]
+        return int(math.ceil(a * len(texto) + (b if texto else 0)))
+
+    def tokens_salida(self, texto):
+        """Tokens de salida estimados para el texto de un documento"""
+        c, d = self.calibrar()["salida"]
+        return int(math.ceil(c * len(texto) + (d if texto else 0)))
+
+    def estimar(self, texto, instrucciones, modelo=None, max_tokens=None, divisible=True):
+        """
+        Pronostica una petición y decide si enviarla, dividirla en partes o
+        rechazarla porque la salida no cabría en max_tokens (o la entrada en
+        el contexto del modelo).
+        """
+        from utils.claude_api import construir_prompt
+
+        modelo = modelo or CLAUDE_API_CONFIG["model"]
+        max_tokens = max_tokens or CLAUDE_API_CONFIG["max_tokens"]
+        coeficientes = self.calibrar()
+
+        caracteres_entrada = len(construir_prompt(texto, instrucciones))
+        a, b = coeficientes["entrada"]
+        tokens_entrada = int(math.ceil(a * caracteres_entrada + b))
+        c, d = coeficientes["salida"]
+        tokens_salida = int(math.ceil(c * len(texto) + d))
+        e, f, g = coeficientes["latencia"]
+        latencia = round(e * tokens_entrada + f * tokens_salida + g, 1)
+        precio_entrada, precio_salida = self.config["precios"].get(modelo, (0.0, 0.0))
+        costo = round((tokens_entrada * precio_entrada + tokens_salida * precio_salida) / 1e6, 4)
+
+        salida_segura = tokens_salida * self.config["margen_salida"]
+        partes = max(
+            int(math.ceil(salida_segura / max_tokens)),
+            int(math.ceil(tokens_entrada / self.config["max_tokens_contexto"]))
+        )
+        if partes <= 1:
+            decision, motivo = ENVIAR, ""
+        elif divisible:
+            decision = DIVIDIR
+            motivo = f"La salida estimada ({tokens_salida} tokens) no cabe en max_tokens={max_tokens}"
+        else:
+            decision = RECHAZAR
+            motivo = (f"La salida estimada ({tokens_salida} tokens) no cabe en max_tokens={max_tokens} "
+                      "y el documento no se puede dividir")
+        return Pronostico(tokens_entrada, tokens_salida, latencia, costo, decision, max(1, partes), motivo)
+
+_pronosticador = None
+
+def obtener_pronosticador():
+    """Pronosticador compartido del proceso"""
+    global _pronosticador
+    if _pronosticador is None:
+        _pronosticador = PronosticadorClaude()
+    return _pronosticador
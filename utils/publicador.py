@@ -0,0 +1,241 @@
+"""
+Publicación de rates (esquema de EXAMPLE_JSON) en el backend de tarifas.
+
+Uso:
+    python -m utils.publicador <rates.json ...> [--url URL] [--tamano-lote N] [--concurrencia N]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from config.config import PUBLICACION_CONFIG, RETRY_CONFIG
+from utils.bloqueo import bloqueo_archivo
+
+# Códigos que vale la pena reintentar
+ESTADOS_REINTENTABLES = {408, 425, 429, 500, 502, 503, 504}
+
+def segundos_retry_after(valor, defecto, maximo=None):
+    """
+    Espera indicada por la cabecera Retry-After, en segundos o como fecha
+    HTTP (RFC 9110). Si falta o no es válida se usa el valor por defecto.
+    Con maximo, la espera nunca lo supera.
+    """
+    espera = defecto
+    if valor:
+        try:
+            espera = float(valor)
+        except ValueError:
+            try:
+                fecha = parsedate_to_datetime(valor)
+            except (TypeError, ValueError):
+                fecha = None
+            if fecha is not None:
+                if fecha.tzinfo is None:
+                    fecha = fecha.replace(tzinfo=timezone.utc)
+                espera = (fecha - datetime.now(timezone.utc)).total_seconds()
+    espera = max(0.0, espera)
+    return espera if maximo is None else min(espera, maximo)
+
+# Campos que cambian en cada exportación del mismo archivo; no forman parte
+# de la clave de idempotencia
+CAMPOS_VOLATILES = {"created_at", "updated_at"}
+
+def clave_idempotencia(payload):
+    """
+    Clave de idempotencia de un lote: hash del operador, el periodo, el
+    índice del lote y los valores de sus rates, sin las fechas de
+    exportación. Volver a exportar el mismo archivo produce las mismas claves;
+    una corrección de valores produce claves nuevas.
+    """
+    estable = {k: v for k, v in payload.items() if k not in CAMPOS_VOLATILES and k != "rates"}
+    estable["rates"] = [{k: v for k, v in rate.items() if k not in CAMPOS_VOLATILES}
+                        for rate in payload.get("rates", [])]
+    contenido = json.dumps(estable, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+class CheckpointPublicacion:
+    """
+    Registro en disco de los lotes ya aceptados, para reanudar una
+    publicación. Varios publicadores pueden compartir el archivo: cada
+    registro toma un bloqueo de archivo y fusiona lo que haya en disco.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self.enviados = self._leer()
+
+    def _leer(self):
+        if not self.ruta or not os.path.exists(self.ruta):
+            return {}
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def contiene(self, clave):
+        return clave in self.enviados
+
+    def registrar(self, clave, descripcion):
+        if not self.ruta:
+            return
+        with self._lock, bloqueo_archivo(self.ruta):
+            self.enviados = {**self.enviados, **self._leer()}
+            self.enviados[clave] = {"lote": descripcion, "enviado": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            directorio = os.path.dirname(self.ruta)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directorio or ".", suffix=".tmp",
+                                             delete=False) as f:
+                json.dump(self.enviados, f, indent=2)
+            os.replace(f.name, self.ruta)
+
+class PublicadorRates:
+    """
+    Envía los rates al backend en lotes, sobre una sesión HTTP con conexiones
+    persistentes y un límite de peticiones simultáneas. Cada lote lleva una
+    clave de idempotencia derivada de su contenido estable (clave_idempotencia),
+    de modo que un reintento, una reanudación o una nueva exportación del
+    mismo archivo nunca duplica datos.
+    """
+
+    def __init__(self, url=None, token=None, tamano_lote=None, concurrencia=None,
+                 checkpoint=None, retry_config=None, max_espera=None):
+        self.url = url or PUBLICACION_CONFIG["url"]
+        if not self.url:
+            raise ValueError("Se requiere la URL del backend de tarifas (TARIFAS_BACKEND_URL)")
+        self.tamano_lote = tamano_lote or PUBLICACION_CONFIG["tamano_lote"]
+        self.concurrencia = concurrencia or PUBLICACION_CONFIG["concurrencia"]
+        self.retry_config = retry_config or RETRY_CONFIG
+        self.max_espera = max_espera or PUBLICACION_CONFIG["max_espera"]
+        self.checkpoint = CheckpointPublicacion(
+            PUBLICACION_CONFIG["checkpoint"] if checkpoint is None else checkpoint
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrencia)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        token = token or PUBLICACION_CONFIG["token"]
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def _lotes(self, datos):
+        """Divide una carga en lotes con su clave de idempotencia"""
+        cabecera = {k: v for k, v in datos.items() if k != "rates"}
+        rates = datos.get("rates", [])
+        total = max(1, -(-len(rates) // self.tamano_lote))
+        for indice in range(total):
+            payload = dict(cabecera)
+            payload["rates"] = rates[indice * self.tamano_lote:(indice + 1) * self.tamano_lote]
+            payload["batch_index"] = indice
+            payload["batch_total"] = total
+            contenido = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+            yield clave_idempotencia(payload), payload, contenido
+
+    def _enviar_lote(self, clave, contenido):
+        """Envía un lote con reintentos y espera exponencial"""
+        max_retries = self.retry_config["max_retries"]
+        retry_delay = self.retry_config["retry_delay"]
+        timeout = self.retry_config["initial_timeout"]
+
+        for attempt in range(max_retries):
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=contenido.encode("utf-8"),
+                    headers={"Idempotency-Key": clave},
+                    timeout=timeout
+                )
+                # 409: el backend ya tenía un lote con esta clave
+                if response.status_code < 300 or response.status_code == 409:
+                    return True, response.status_code
+                if response.status_code not in ESTADOS_REINTENTABLES:
+                    return False, f"{response.status_code}: {response.text[:200]}"
+                espera = segundos_retry_after(response.headers.get("Retry-After"), retry_delay * (2 ** attempt),
+                                              self.max_espera)
+                error = f"{response.status_code}"
+            except requests.exceptions.RequestException as e:
+                espera = min(retry_delay * (2 ** attempt), self.max_espera)
+                error = str(e)
+
+            if attempt < max_retries - 1:
+                print(f"Lote {clave[:8]}: error {error}. Reintentando en {espera} segundos...")
+                time.sleep(espera)
+
+        return False, error
+
+    def publicar(self, datos, nombre=""):
+        """
+        Publica una carga completa. Los lotes registrados en el checkpoint
+        se omiten, por lo que volver a ejecutar tras un fallo solo envía los
+        pendientes.
+
+        Returns:
+            dict: resumen con lotes enviados, omitidos y fallidos
+        """
+        resumen = {"archivo": nombre, "enviados": 0, "omitidos": 0, "fallidos": []}
+        pendientes = []
+        for clave, payload, contenido in self._lotes(datos):
+            if self.checkpoint.contiene(clave):
+                resumen["omitidos"] += 1
+            else:
+                pendientes.append((clave, payload["batch_index"], contenido))
+
+        def enviar(pendiente):
+            clave, indice, contenido = pendiente
+            ok, detalle = self._enviar_lote(clave, contenido)
+            if ok:
+                self.checkpoint.registrar(clave, f"{nombre}#{indice}")
+            return indice, ok, detalle
+
+        with ThreadPoolExecutor(max_workers=self.concurrencia) as executor:
+            for indice, ok, detalle in executor.map(enviar, pendientes):
+                if ok:
+                    resumen["enviados"] += 1
+                else:
+                    resumen["fallidos"].append({"lote": indice, "error": detalle})
+        return resumen
+
+    def publicar_archivo(self, json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            return self.publicar(json.load(f), os.path.basename(json_path))
+
+    def cerrar(self):
+        self.session.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Publica archivos de rates en el backend de tarifas")
+    parser.add_argument("archivos", nargs="+", help="JSON de rates o patrones glob")
+    parser.add_argument("--url", help="URL del endpoint de carga (por defecto TARIFAS_BACKEND_URL)")
+    parser.add_argument("--tamano-lote", type=int)
+    parser.add_argument("--concurrencia", type=int)
+    parser.add_argument("--checkpoint", help="Archivo de checkpoint para reanudar")
+    args = parser.parse_args()
+
+    publicador = PublicadorRates(args.url, tamano_lote=args.tamano_lote,
+                                 concurrencia=args.concurrencia, checkpoint=args.checkpoint)
+    rutas = sorted({ruta for patron in args.archivos for ruta in glob.glob(patron)})
+    fallos = 0
+    try:
+        for ruta in rutas:
+            resumen = publicador.publicar_archivo(ruta)
+            fallos += len(resumen["fallidos"])
+            print(f"{ruta}: {resumen['enviados']} lote(s) enviados, {resumen['omitidos']} omitidos, "
+                  f"{len(resumen['fallidos'])} fallidos")
+            for fallo in resumen["fallidos"]:
+                print(f"  - lote {fallo['lote']}: {fallo['error']}")
+    finally:
+        publicador.cerrar()
+
+    if fallos:
+        print("\nHay lotes pendientes; vuelve a ejecutar el comando para reintentarlos.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Registro en memoria de los comercializadores (config/comercializadores.py)
+y de sus instrucciones.
+
+Todo se carga una sola vez: la configuración, el texto de las instrucciones
+y una versión por comercializador (hash corto de ambos), que sirve de clave
+para reutilizar resultados (coalescencia). Al cargar se validan los
+mappings: un comercializador sin instrucciones o con huellas inválidas queda
+fuera del registro; los mercados, niveles u operadores sin ID solo se
+avisan.
+
+Si INSTRUCCIONES_CONFIG["recarga"] está activo, las consultas revisan (como
+mucho cada "intervalo" segundos) la fecha de los archivos y recargan los que
+cambiaron, sin reiniciar los workers.
+
+Uso:
+    registro = obtener_registro()
+    texto = registro.instrucciones("VATIA")
+    version = registro.version("VATIA")
+"""
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+import config.comercializadores as modulo_comercializadores
+from config.config import INSTRUCCIONES_CONFIG, ROOT_DIR
+from config.example_json import MERCADOS, NIVELES_TENSION, OPERADORES
+
+Comercializador = namedtuple("Comercializador", ["codigo", "info", "instrucciones", "version"])
+
+def calcular_version(info, instrucciones):
+    """Hash corto de la configuración y las instrucciones de un comercializador"""
+    sha = hashlib.sha256(json.dumps(info, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    sha.update(instrucciones)
+    return sha.hexdigest()[:12]
+
+def validar(codigo, info, instrucciones, error_lectura=None):
+    """
+    Revisa la configuración de un comercializador. error_lectura describe
+    por qué no se pudieron leer las instrucciones (por ejemplo, codificación).
+
+    Returns:
+        tuple: (errores, avisos). Con errores el comercializador no se puede usar.
+    """
+    from utils.normalizacion import normalizar_mercado, normalizar_nivel
+
+    errores, avisos = [], []
+    if not info.get("name"):
+        errores.append("falta 'name'")
+    if not info.get("instrucciones_file"):
+        errores.append("falta 'instrucciones_file'")
+    elif error_lectura:
+        errores.append(f"{info['instrucciones_file']} {error_lectura}")
+    elif instrucciones is None:
+        errores.append(f"no se encontró {info['instrucciones_file']}")
+    elif not instrucciones.strip():
+        errores.append(f"{info['instrucciones_file']} está vacío")
+
+    for tipo, patrones in info.get("huellas", {}).items():
+        for patron in patrones:
+            try:
+                re.compile(patron)
+            except re.error as e:
+                errores.append(f"huella de {tipo} inválida {patron!r}: {e}")
+
+    mercados = sorted({normalizar_mercado(d, codigo) for d in info.get("mercado_mapping", {}).values()}
+                      - set(MERCADOS))
+    if mercados:
+        avisos.append(f"mercados sin ID en MERCADOS: {', '.join(mercados)}")
+    niveles_conocidos = {n.upper() for n in NIVELES_TENSION}
+    niveles = sorted({normalizar_nivel(d, codigo) for d in info.get("tension_mapping", {}).values()}
+                     - niveles_conocidos)
+    if niveles:
+        avisos.append(f"niveles sin ID en NIVELES_TENSION: {', '.join(niveles)}")
+    if codigo not in OPERADORES:
+        avisos.append("sin ID en OPERADORES")
+    return errores, avisos
+
+def _leer(ruta):
+    try:
+        with open(ruta, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _decodificar(contenido):
+    """Texto UTF-8 de las instrucciones y el error de lectura, si lo hubo"""
+    if contenido is None:
+        return None, None
+    try:
+        return contenido.decode("utf-8"), None
+    except UnicodeDecodeError as e:
+        return None, f"no está en UTF-8 ({e.reason} en el byte {e.start})"
+
+def _firma(ruta):
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return estado.st_mtime_ns, estado.st_size
+
+class RegistroInstrucciones:
+    """Comercializadores válidos con sus instrucciones y versiones, en memoria"""
+
+    def __init__(self, config=None):
+        self.config = dict(INSTRUCCIONES_CONFIG, **(config or {}))
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self.problemas = {}
+        self._firmas = {}
+        self._revisado = time.monotonic()
+        self._cargar()
+
+    def _rutas(self):
+        """Archivo de configuración e instrucciones de cada comercializador"""
+        rutas = [modulo_comercializadores.__file__]
+        for info in modulo_comercializadores.COMERCIALIZADORES.values():
+            if info.get("instrucciones_file"):
+                rutas.append(os.path.join(ROOT_DIR, info["instrucciones_file"]))
+        return rutas
+
+    def _cargar(self):
+        """Lee y valida todos los comercializadores y reemplaza el registro de una vez"""
+        entradas, problemas = {}, {}
+        for codigo, info in modulo_comercializadores.COMERCIALIZADORES.items():
+            ruta = info.get("instrucciones_file")
+            contenido = _leer(os.path.join(ROOT_DIR, ruta)) if ruta else None
+            texto, error_lectura = _decodificar(contenido)
+            errores, avisos = validar(codigo, info, texto, error_lectura)
+            for aviso in avisos:
+                print(f"Aviso {codigo}: {aviso}")
+            for error in errores:
+                print(f"Error {codigo}: {error}; el comercializador no estará disponible")
+            problemas[codigo] = {"errores": errores, "avisos": avisos}
+            if not errores:
+                entradas[codigo] = Comercializador(codigo, info, texto, calcular_version(info, contenido))
+        self._entradas, self.problemas = entradas, problemas
+        self._firmas = {ruta: _firma(ruta) for ruta in self._rutas()}
+
+    def _recargar_configuracion(self):
+        """
+        Vuelve a importar config/comercializadores.py. El diccionario
+        COMERCIALIZADORES se actualiza en el lugar, de modo que los módulos
+        que lo importaron ven la configuración nueva; las tablas derivadas
+        (normalización y detector) se reconstruyen.
+        """
+        from utils.detector_comercializador import reiniciar_detector
+        from utils.normalizacion import recargar_tablas
+
+        actual = modulo_comercializadores.COMERCIALIZADORES
+        try:
+            # reload reutiliza el espacio de nombres del módulo: se quita el
+            # diccionario anterior para notar si el archivo nuevo no lo define
+            del modulo_comercializadores.COMERCIALIZADORES
+            importlib.reload(modulo_comercializadores)
+            nueva = getattr(modulo_comercializadores, "COMERCIALIZADORES", None)
+            if not isinstance(nueva, dict):
+                raise ValueError("no define el diccionario COMERCIALIZADORES")
+        except Exception as e:
+            modulo_comercializadores.COMERCIALIZADORES = actual
+            print(f"No se pudo recargar config/comercializadores.py; se conserva la configuración anterior: {e}")
+            return False
+        actual.clear()
+        actual.update(nueva)
+        modulo_comercializadores.COMERCIALIZADORES = actual
+        recargar_tablas()
+        reiniciar_detector()
+        return True
+
+    def revisar(self, forzar=False):
+        """Recarga lo que haya cambiado en disco. Devuelve True si recargó"""
+        if not (forzar or self.config["recarga"]):
+            return False
+        if not forzar and time.monotonic() - self._revisado < self.config["intervalo"]:
+            return False
+        with self._lock:
+            self._revisado = time.monotonic()
+            firmas = {ruta: _firma(ruta) for ruta in self._rutas()}
+            if firmas == self._firmas:
+                return False
+            configuracion = modulo_comercializadores.__file__
+            if firmas.get(configuracion) != self._firmas.get(configuracion) and not self._recargar_configuracion():
+                # Se recuerda la firma para no reintentar hasta el siguiente cambio
+                self._firmas[configuracion] = firmas[configuracion]
+                return False
+            anteriores = {codigo: entrada.version for codigo, entrada in self._entradas.items()}
+            self._cargar()
+        cambios = [c for c, e in self._entradas.items() if anteriores.get(c) != e.version]
+        print(f"Comercializadores recargados; versiones nuevas: {', '.join(cambios) or 'ninguna'}")
+        return True
+
+    def codigos(self):
+        """Códigos de los comercializadores disponibles, en el orden de la configuración"""
+        self.revisar()
+        return list(self._entradas)
+
+    def obtener(self, codigo):
+        """Comercializador (info, instrucciones y versión). ValueError si no está disponible"""
+        self.revisar()
+        entrada = self._entradas.get(codigo)
+        if entrada is None:
+            errores = self.problemas.get(codigo, {}).get("errores")
+            if errores:
+                raise ValueError(f"El comercializador {codigo} no está disponible: {'; '.join(errores)}")
+            raise ValueError(f"Comercializador no válido: {codigo}")
+        return entrada
+
+    def instrucciones(self, codigo):
+        return self.obtener(codigo).instrucciones
+
+    def version(self, codigo):
+        return self.obtener(codigo).version
+
+    def resumen(self):
+        """Versión, nombre y problemas de validación de cada comercializador configurado"""
+        self.revisar()
+        return {
+            codigo: {
+                "nombre": info.get("name"),
+                "version": self._entradas[codigo].version if codigo in self._entradas else None,
+                "disponible": codigo in self._entradas,
+                **self.problemas.get(codigo, {})
+            }
+            for codigo, info in modulo_comercializadores.COMERCIALIZADORES.items()
+        }
+
+_registro = None
+_registro_lock = threading.Lock()
+
+def obtener_registro():
+    """Registro compartido del proceso"""
+    global _registro
+    if _registro is None:
+        with _registro_lock:
+            if _registro is None:
+                _registro = RegistroInstrucciones()
+    return _registro
@@ -0,0 +1,52 @@
+import io
+import json
+import shutil
+import zipfile
+
+class _BufferSalida(io.RawIOBase):
+    """Archivo de solo escritura que acumula los bytes hasta que se vacían"""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+class ZipEnStreaming:
+    """
+    Construye un ZIP al vuelo. Cada llamada a agregar_* devuelve los bytes
+    ya generados para enviarlos al cliente sin esperar al archivo completo
+    ni escribirlo en disco.
+    """
+
+    def __init__(self, compresion=zipfile.ZIP_DEFLATED):
+        self._buffer = _BufferSalida()
+        self._zip = zipfile.ZipFile(self._buffer, mode="w", compression=compresion)
+
+    def agregar_archivo(self, ruta, nombre, tamano_bloque=64 * 1024):
+        """Copia un archivo del disco al ZIP por bloques"""
+        with open(ruta, "rb") as origen, self._zip.open(nombre, mode="w") as destino:
+            shutil.copyfileobj(origen, destino, tamano_bloque)
+        return self._buffer.vaciar()
+
+    def agregar_datos(self, nombre, datos):
+        """Agrega un archivo a partir de bytes o texto en memoria"""
+        self._zip.writestr(nombre, datos)
+        return self._buffer.vaciar()
+
+    def agregar_json(self, nombre, objeto):
+        return self.agregar_datos(nombre, json.dumps(objeto, indent=2, ensure_ascii=False))
+
+    def cerrar(self):
+        """Escribe el directorio central del ZIP y devuelve los últimos bytes"""
+        self._zip.close()
+        return self._buffer.vaciar()